@@ -0,0 +1,106 @@
+"""
+批量识别输入模块
+将multipart上传的多个图像文件或zip/tar压缩包展开为逐张图像，
+单个图像超过大小上限时拒绝读取，避免压缩炸弹耗尽内存
+"""
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+from dotenv import load_dotenv
+from app.imaging import IMAGE_EXTENSIONS
+
+load_dotenv()
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+
+class ImageTooLargeError(ValueError):
+    """图像或压缩包成员超过大小上限"""
+
+
+def _max_image_bytes(max_bytes: Optional[int]) -> int:
+    if max_bytes is None:
+        max_bytes = int(os.getenv('BATCH_MAX_IMAGE_BYTES', str(32 * 1024 * 1024)))
+    return max(1, max_bytes)
+
+
+def _read_limited(fileobj: BinaryIO, name: str, max_bytes: int) -> bytes:
+    """最多读取max_bytes字节，超出时抛出ImageTooLargeError"""
+    data = fileobj.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ImageTooLargeError(f"{name} 超过大小上限 {max_bytes} 字节")
+    return data
+
+
+def is_archive(filename: str) -> bool:
+    """根据文件名判断是否为支持的压缩包"""
+    return (filename or '').lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_image(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+
+def iter_archive(fileobj: BinaryIO, filename: str,
+                 max_bytes: Optional[int] = None) -> Iterator[Tuple[str, bytes]]:
+    """
+    逐个读取压缩包中的图像文件
+
+    Args:
+        fileobj: 压缩包文件对象，需支持seek
+        filename: 压缩包文件名，用于判断格式
+        max_bytes: 单个成员解压后的大小上限，默认读取BATCH_MAX_IMAGE_BYTES
+
+    Yields:
+        (成员路径, 图像字节)，按压缩包内顺序
+
+    Raises:
+        ImageTooLargeError: 成员超过大小上限
+    """
+    max_bytes = _max_image_bytes(max_bytes)
+    if filename.lower().endswith('.zip'):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not _is_image(info.filename):
+                    continue
+                if info.file_size > max_bytes:
+                    raise ImageTooLargeError(
+                        f"{info.filename} 超过大小上限 {max_bytes} 字节")
+                # 目录中的大小可能被篡改，解压时再限制一次
+                with archive.open(info) as member:
+                    yield info.filename, _read_limited(member, info.filename,
+                                                       max_bytes)
+        return
+
+    # 流式读取tar，不需要先列出全部成员
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile() and _is_image(member.name):
+                if member.size > max_bytes:
+                    raise ImageTooLargeError(
+                        f"{member.name} 超过大小上限 {max_bytes} 字节")
+                yield member.name, archive.extractfile(member).read()
+
+
+def iter_uploads(uploads: Iterable[Tuple[str, BinaryIO]],
+                 max_bytes: Optional[int] = None) -> Iterator[Tuple[str, bytes]]:
+    """
+    将上传的文件展开为逐张图像，压缩包按成员展开
+
+    Args:
+        uploads: (文件名, 文件对象) 序列
+        max_bytes: 单张图像的大小上限，默认读取BATCH_MAX_IMAGE_BYTES
+
+    Yields:
+        (文件名, 图像字节)
+
+    Raises:
+        ImageTooLargeError: 图像或压缩包成员超过大小上限
+    """
+    max_bytes = _max_image_bytes(max_bytes)
+    for filename, fileobj in uploads:
+        if is_archive(filename):
+            yield from iter_archive(fileobj, filename, max_bytes)
+        else:
+            yield filename, _read_limited(fileobj, filename, max_bytes)
@@ -0,0 +1,393 @@
+"""
+性能基准模块
+用合成图像和合成特征库离线测量识别流水线各环节的性能，结果以JSON输出，
+由dvc.yaml的metrics跟踪各次提交之间的变化。
+默认使用合成检测器与合成特征模型，只测量模型以外的开销，结果可在任何机器上复现
+"""
+import asyncio
+import io
+import itertools
+import os
+import platform
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+import numpy as np
+from PIL import Image
+from app.cache import EmbeddingCache
+from app.encryption import generate_key
+from app.face_recognition import FaceRecognitionSystem
+
+# FaceNet (keras-facenet) 输出的特征维度
+EMBEDDING_DIM = 512
+
+# 构建大特征库时每次追加的行数，限制归一化时的临时内存
+_BUILD_CHUNK = 100000
+
+
+class SyntheticDetector:
+    """按网格返回固定数量人脸框的检测器，输出格式与MTCNN相同"""
+
+    name = 'synthetic'
+
+    def __init__(self, num_faces: int = 1):
+        self.num_faces = num_faces
+
+    def detect(self, img_array: np.ndarray) -> List[dict]:
+        """
+        在图像上均匀排布num_faces个人脸框
+
+        Args:
+            img_array: RGB图像数组
+
+        Returns:
+            人脸检测结果列表
+        """
+        height, width = img_array.shape[:2]
+        cols = int(np.ceil(np.sqrt(self.num_faces)))
+        rows = int(np.ceil(self.num_faces / cols)) if self.num_faces else 0
+        cell_w, cell_h = width // max(cols, 1), height // max(rows, 1)
+        faces = []
+        for i in range(self.num_faces):
+            x, y = (i % cols) * cell_w, (i // cols) * cell_h
+            w, h = max(1, cell_w * 3 // 4), max(1, cell_h * 3 // 4)
+            faces.append({
+                'box': [x, y, w, h],
+                'confidence': 0.99,
+                'keypoints': {
+                    'left_eye': (x + w // 3, y + h // 3),
+                    'right_eye': (x + 2 * w // 3, y + h // 3),
+                    'nose': (x + w // 2, y + h // 2),
+                    'mouth_left': (x + w // 3, y + 3 * h // 4),
+                    'mouth_right': (x + 2 * w // 3, y + 3 * h // 4),
+                },
+            })
+        return faces
+
+
+class SyntheticEmbedder:
+    """以固定随机投影代替FaceNet的特征模型，接口与keras_facenet.FaceNet相同"""
+
+    def __init__(self, dim: int = EMBEDDING_DIM, seed: int = 0):
+        # 从160x160x3的人脸中按步长采样后投影到dim维
+        self.projection = np.random.default_rng(seed).standard_normal(
+            (32 * 32 * 3, dim)).astype(np.float32)
+
+    def embeddings(self, crops: np.ndarray) -> np.ndarray:
+        """
+        计算一批人脸的特征
+
+        Args:
+            crops: 形状为(N, 160, 160, 3)的人脸数组
+
+        Returns:
+            形状为(N, dim)的特征矩阵
+        """
+        pixels = crops[:, ::5, ::5, :].reshape(len(crops), -1).astype(np.float32)
+        return pixels @ self.projection
+
+
+def make_embeddings(size: int, dim: int = EMBEDDING_DIM, seed: int = 0) -> np.ndarray:
+    """
+    生成带聚类结构的合成特征
+
+    Args:
+        size: 特征数量
+        dim: 特征维度
+        seed: 随机种子
+
+    Returns:
+        形状为(size, dim)的float32特征
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((256, dim)).astype(np.float32)
+    noise = rng.standard_normal((size, dim), dtype=np.float32)
+    return centers[rng.integers(0, len(centers), size)] + 0.5 * noise
+
+
+def make_image(width: int = 640, height: int = 480, seed: int = 0) -> Image.Image:
+    """生成随机噪声RGB图像"""
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+
+def image_bytes(image: Image.Image) -> bytes:
+    """将图像编码为JPEG字节"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """
+    汇总一组耗时
+
+    Args:
+        latencies: 每次调用的耗时（秒）
+
+    Returns:
+        mean_ms、p50_ms、p95_ms和每秒次数
+    """
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    mean = statistics.fmean(ordered)
+    return {
+        'mean_ms': round(mean * 1000, 4),
+        'p50_ms': round(statistics.median(ordered) * 1000, 4),
+        'p95_ms': round(p95 * 1000, 4),
+        'per_second': round(1.0 / mean, 2) if mean > 0 else 0.0,
+    }
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    """
+    重复调用函数并统计耗时
+
+    Args:
+        fn: 无参数函数
+        repeat: 计时次数
+        warmup: 计时前的预热次数
+
+    Returns:
+        summarize的结果
+    """
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+class Benchmark:
+    """基准测试套件，每个方法返回一组可序列化为JSON的指标"""
+
+    def __init__(self, workdir: Optional[str] = None, seed: int = 0,
+                 real_embedder: bool = False):
+        """
+        初始化基准测试
+
+        Args:
+            workdir: 临时数据库与图像目录，默认新建临时目录
+            seed: 随机种子，固定后结果可复现
+            real_embedder: 是否使用真实的FaceNet模型（需要模型权重）
+        """
+        self.workdir = workdir or tempfile.mkdtemp(prefix='facenet-bench-')
+        self.seed = seed
+        self.real_embedder = real_embedder
+        # 数据只写入临时目录，未配置密钥时使用临时密钥
+        os.environ.setdefault('ENCRYPTION_KEY', generate_key())
+
+    def create_system(self, name: str, num_faces: int = 1) -> FaceRecognitionSystem:
+        """
+        创建使用合成检测器（和合成特征模型）的识别系统
+
+        Args:
+            name: 数据目录名，不同测试互不影响
+            num_faces: 每张图像检测出的人脸数
+
+        Returns:
+            识别系统实例，特征缓存已禁用
+        """
+        root = os.path.join(self.workdir, name)
+        system = FaceRecognitionSystem(data_path=os.path.join(root, 'faces.npz'),
+                                       images_dir=os.path.join(root, 'images'))
+        system._detectors[system.detector_backend] = SyntheticDetector(num_faces)
+        if not self.real_embedder:
+            system._embedder = SyntheticEmbedder(seed=self.seed)
+        system.embedding_cache = EmbeddingCache(max_bytes=0)
+        return system
+
+    def fill_gallery(self, system: FaceRecognitionSystem, size: int):
+        """向特征库中加入size条合成特征（不写数据库文件）"""
+        with system.write_lock:
+            for start in range(0, size, _BUILD_CHUNK):
+                count = min(_BUILD_CHUNK, size - start)
+                names = [f'person_{i}' for i in range(start, start + count)]
+                embeddings = make_embeddings(count, seed=self.seed + start)
+                system.gallery.extend(names, embeddings)
+
+    @staticmethod
+    def close_system(system: FaceRecognitionSystem):
+        """停止识别系统的调度线程与图像写入线程，写入队列会先处理完"""
+        system.image_writer.close()
+        system.scheduler.close()
+
+    def recognize_face(self, sizes: Iterable[int], queries: int = 100) -> dict:
+        """
+        测量不同特征库规模下recognize_face的延迟
+
+        Args:
+            sizes: 特征库规模列表
+            queries: 每种规模的查询次数
+
+        Returns:
+            {规模: 耗时统计}
+        """
+        results = {}
+        probes = make_embeddings(queries, seed=self.seed + 1)
+        for size in sizes:
+            system = self.create_system(f'gallery_{size}')
+            self.fill_gallery(system, size)
+            counter = itertools.count()
+
+            def query(system=system, counter=counter):
+                return system.recognize_face(probes[next(counter) % queries])
+
+            results[str(size)] = measure(query, repeat=queries)
+            self.close_system(system)
+        return results
+
+    def recognize_image(self, face_counts: Iterable[int], gallery_size: int = 10000,
+                        repeat: int = 20) -> dict:
+        """
+        测量每帧不同人脸数时recognize_image的延迟
+
+        Args:
+            face_counts: 每帧人脸数列表
+            gallery_size: 特征库规模
+            repeat: 每种人脸数的计时次数
+
+        Returns:
+            {人脸数: 耗时统计及每秒人脸数}
+        """
+        results = {}
+        image = make_image(seed=self.seed)
+        system = self.create_system('recognize_image')
+        self.fill_gallery(system, gallery_size)
+        for count in face_counts:
+            system._detectors[system.detector_backend] = SyntheticDetector(count)
+            stats = measure(lambda: system.recognize_image(image), repeat=repeat)
+            stats['faces_per_second'] = round(stats['per_second'] * count, 2)
+            results[str(count)] = stats
+        self.close_system(system)
+        return results
+
+    def enrollment(self, count: int = 200, gallery_size: int = 10000) -> dict:
+        """
+        测量逐张录入的吞吐量，包含图像加密写入与数据库保存
+
+        Args:
+            count: 录入次数
+            gallery_size: 录入前特征库已有的规模
+
+        Returns:
+            耗时统计与每秒录入数
+        """
+        system = self.create_system('enrollment')
+        self.fill_gallery(system, gallery_size)
+        images = [make_image(160, 160, seed=self.seed + i) for i in range(8)]
+        payloads = [image_bytes(image) for image in images]
+        counter = itertools.count()
+
+        def enroll():
+            i = next(counter)
+            system.enroll_face(images[i % 8], f'enrolled_{i}', payloads[i % 8])
+
+        start = time.perf_counter()
+        stats = measure(enroll, repeat=count, warmup=0)
+        system.image_writer.flush()
+        elapsed = time.perf_counter() - start
+        self.close_system(system)
+        stats['throughput_per_second'] = round(count / elapsed, 2)
+        return stats
+
+    def database_load(self, size: int = 100000, repeat: int = 3) -> dict:
+        """
+        测量启动时加载数据库的耗时
+
+        Args:
+            size: 数据库中的特征数
+            repeat: 计时次数
+
+        Returns:
+            耗时统计与数据库文件大小
+        """
+        system = self.create_system('database_load')
+        self.fill_gallery(system, size)
+        system._save_database()
+        data_path, images_dir = system.data_path, system.images_dir
+        self.close_system(system)
+
+        def load():
+            self.close_system(FaceRecognitionSystem(data_path, images_dir))
+
+        stats = measure(load, repeat=repeat, warmup=0)
+        stats['file_bytes'] = os.path.getsize(data_path)
+        return stats
+
+    def api(self, concurrency_levels: Iterable[int], requests: int = 200,
+            num_faces: int = 3, gallery_size: int = 10000) -> dict:
+        """
+        测量/recognize在不同并发数下的端到端吞吐量
+
+        Args:
+            concurrency_levels: 同时在途的请求数列表
+            requests: 每种并发数发送的请求总数
+            num_faces: 每张图像的人脸数
+            gallery_size: 特征库规模
+
+        Returns:
+            {并发数: 每秒请求数、延迟统计、503次数和其他失败次数}
+        """
+        import httpx
+        # app.main在首次导入时按FACE_DATA_DIR打开特征库，指向临时目录以免读写真实数据
+        os.environ['FACE_DATA_DIR'] = os.path.join(self.workdir, 'api_main')
+        from app import main
+
+        system = self.create_system('api', num_faces)
+        self.fill_gallery(system, gallery_size)
+        original = main.face_system
+        main.face_system = system
+        payload = image_bytes(make_image(seed=self.seed))
+
+        async def run(concurrency: int) -> dict:
+            transport = httpx.ASGITransport(app=main.app)
+            latencies, rejected, failed = [], 0, 0
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async with httpx.AsyncClient(transport=transport,
+                                         base_url='http://bench') as client:
+                async def one():
+                    nonlocal rejected, failed
+                    async with semaphore:
+                        start = time.perf_counter()
+                        response = await client.post(
+                            '/recognize',
+                            files={'file': ('frame.jpg', payload, 'image/jpeg')})
+                        latencies.append(time.perf_counter() - start)
+                        if response.status_code == 503:
+                            rejected += 1
+                        elif response.status_code != 200:
+                            failed += 1
+
+                start = time.perf_counter()
+                await asyncio.gather(*(one() for _ in range(requests)))
+                elapsed = time.perf_counter() - start
+
+            stats = summarize(latencies)
+            # 并发时单个请求的倒数没有意义，以总吞吐量代替
+            del stats['per_second']
+            stats['requests_per_second'] = round(requests / elapsed, 2)
+            stats['rejected'] = rejected
+            stats['failed'] = failed
+            return stats
+
+        try:
+            return {str(level): asyncio.run(run(level)) for level in concurrency_levels}
+        finally:
+            main.face_system = original
+            self.close_system(system)
+
+
+def environment() -> dict:
+    """记录运行环境，便于解释不同机器上的结果差异"""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
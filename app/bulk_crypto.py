@@ -0,0 +1,143 @@
+"""
+批量加解密模块
+用进程池并行加密或解密整个目录，文件按块流式处理，
+输出文件的修改时间与源文件保持一致，重复运行时跳过未变化的文件
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+from app.encryption import EncryptionManager
+from app.imaging import IMAGE_EXTENSIONS
+
+load_dotenv()
+
+ENCRYPTED_SUFFIX = '.enc'
+
+# 工作进程内的加密管理器，由进程池初始化函数创建
+_manager = None
+
+
+def plan_directory(input_dir: str, output_dir: str,
+                   mode: str) -> Iterator[Tuple[str, str]]:
+    """
+    列出目录中需要处理的文件及其输出路径
+
+    Args:
+        input_dir: 输入目录
+        output_dir: 输出目录，保持与输入目录相同的子目录结构
+        mode: encrypt（图像 -> .enc）或 decrypt（.enc -> 原文件名）
+
+    Yields:
+        (源文件路径, 输出文件路径)
+    """
+    if mode not in ('encrypt', 'decrypt'):
+        raise ValueError(f"未知的处理模式: {mode}")
+
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            src = os.path.join(root, filename)
+            dst = os.path.join(output_dir, os.path.relpath(src, input_dir))
+            if mode == 'encrypt':
+                if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                    yield src, dst + ENCRYPTED_SUFFIX
+            elif filename.endswith(ENCRYPTED_SUFFIX):
+                yield src, dst[:-len(ENCRYPTED_SUFFIX)]
+
+
+def is_unchanged(src: str, dst: str) -> bool:
+    """输出文件存在且修改时间与源文件相同时视为未变化"""
+    try:
+        return os.stat(dst).st_mtime_ns == os.stat(src).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _init_worker():
+    """进程池初始化：每个工作进程只创建一次加密管理器"""
+    global _manager
+    _manager = EncryptionManager()
+
+
+def _process(job: Tuple[str, str, str, bool]) -> Tuple[str, str, Optional[str]]:
+    """
+    处理单个文件（在工作进程中执行）
+
+    Returns:
+        (状态, 源文件路径, 错误信息)，状态为done、skipped或failed
+    """
+    mode, src, dst, force = job
+    if not force and is_unchanged(src, dst):
+        return 'skipped', src, None
+    try:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if mode == 'encrypt':
+            _manager.encrypt_file(src, dst)
+        else:
+            _manager.decrypt_file(src, dst)
+        stat = os.stat(src)
+        os.utime(dst, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        return 'done', src, None
+    except Exception as e:
+        return 'failed', src, str(e)
+
+
+def process_directory(input_dir: str, output_dir: str, mode: str,
+                      workers: Optional[int] = None, force: bool = False,
+                      progress: Optional[Callable[[dict], None]] = None,
+                      progress_interval: float = 1.0) -> dict:
+    """
+    并行加密或解密目录中的所有文件
+
+    Args:
+        input_dir: 输入目录
+        output_dir: 输出目录
+        mode: encrypt或decrypt
+        workers: 工作进程数，默认读取CRYPTO_WORKERS，为1时在当前进程中执行
+        force: 是否忽略修改时间，重新处理所有文件
+        progress: 进度回调，约每progress_interval秒及结束时以统计信息调用一次
+        progress_interval: 进度回调的最小间隔（秒）
+
+    Returns:
+        统计信息：total、done、skipped、failed、errors（失败文件及原因）和elapsed
+    """
+    if workers is None:
+        workers = int(os.getenv('CRYPTO_WORKERS', str(os.cpu_count() or 4)))
+    workers = max(1, workers)
+
+    jobs = [(mode, src, dst, force)
+            for src, dst in plan_directory(input_dir, output_dir, mode)]
+    stats = {'total': len(jobs), 'done': 0, 'skipped': 0, 'failed': 0,
+             'errors': [], 'elapsed': 0.0}
+    errors: List[Tuple[str, str]] = stats['errors']
+
+    start = last_report = time.time()
+
+    def record(result):
+        nonlocal last_report
+        status, src, error = result
+        stats[status] += 1
+        if error is not None:
+            errors.append((src, error))
+        now = time.time()
+        stats['elapsed'] = now - start
+        if progress is not None and now - last_report >= progress_interval:
+            last_report = now
+            progress(dict(stats))
+
+    if workers == 1:
+        _init_worker()
+        for job in jobs:
+            record(_process(job))
+    else:
+        chunksize = max(1, min(64, len(jobs) // (workers * 8)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for result in pool.map(_process, jobs, chunksize=chunksize):
+                record(result)
+
+    stats['elapsed'] = time.time() - start
+    if progress is not None:
+        progress(dict(stats))
+    return stats
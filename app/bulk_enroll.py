@@ -0,0 +1,301 @@
+"""
+批量录入模块
+遍历目录树批量录入人脸（子目录名即人员姓名），解码与检测并行执行，
+FaceNet按批推理，每批只提交一次特征库，并通过进度日志支持中断后续传。
+已写入特征库的图像按内容摘要跳过，中断或重新运行不会重复录入
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from app.imaging import IMAGE_EXTENSIONS, DecodedImage
+from app.jobs import BackgroundJob, iter_batches
+
+load_dotenv()
+
+
+def iter_images(input_dir: str) -> Iterator[Tuple[str, str]]:
+    """
+    遍历目录树中的图像文件
+
+    Args:
+        input_dir: 输入目录，结构为 <姓名>/<图像文件>
+
+    Yields:
+        (姓名, 文件路径)，姓名取文件所在目录名，直接位于输入目录下的文件被忽略
+    """
+    input_dir = os.path.abspath(input_dir)
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        if os.path.abspath(root) == input_dir:
+            continue
+        name = os.path.basename(root)
+        for filename in sorted(files):
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                yield name, os.path.join(root, filename)
+
+
+class BulkEnroller:
+    """批量录入流水线"""
+
+    def __init__(self, face_system, batch_size: Optional[int] = None,
+                 workers: Optional[int] = None,
+                 progress_path: Optional[str] = None,
+                 submit: Optional[Callable[..., Future]] = None):
+        """
+        初始化批量录入
+
+        Args:
+            face_system: FaceRecognitionSystem实例
+            batch_size: 每批图像数，默认读取BULK_ENROLL_BATCH_SIZE
+            workers: 解码和检测的并行线程数，默认读取BULK_ENROLL_WORKERS
+            progress_path: 进度日志路径，默认与人脸数据库放在一起；
+                内容摘要记录保存在同目录的.bulk.digests文件中
+            submit: 任务提交函数 (fn, *args) -> Future，指定时解码、检测与特征提取
+                都经由它执行（API用它交给共享的推理执行器，受背压与优先级控制），
+                默认使用本地线程池
+        """
+        if batch_size is None:
+            batch_size = int(os.getenv('BULK_ENROLL_BATCH_SIZE', '64'))
+        if workers is None:
+            workers = int(os.getenv('BULK_ENROLL_WORKERS', str(os.cpu_count() or 4)))
+        if progress_path is None:
+            progress_path = os.path.splitext(face_system.data_path)[0] + '.bulk.log'
+
+        self.face_system = face_system
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.progress_path = progress_path
+        self.submit = submit
+        self.digests_path = os.path.splitext(face_system.data_path)[0] + '.bulk.digests'
+        self._enrolled = set()
+        self.stats = {'enrolled': 0, 'no_face': 0, 'failed': 0, 'skipped': 0}
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """在当前批次完成后停止"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def load_progress(self) -> set:
+        """读取已处理过的文件路径，处理失败的文件不计入，续传时会重试"""
+        if not os.path.exists(self.progress_path):
+            return set()
+        done = set()
+        with open(self.progress_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                status, _, path = line.rstrip('\n').partition('\t')
+                if path and status != 'failed':
+                    done.add(path)
+        return done
+
+    def load_enrolled(self) -> set:
+        """
+        读取已写入特征库的图像内容摘要
+
+        摘要记录在提交特征库之前写入，并带有预期的行号；只有该行确实存在且姓名一致时
+        才视为已录入，提交前中断留下的记录会被忽略。
+        """
+        if not os.path.exists(self.digests_path):
+            return set()
+        names = self.face_system.gallery.names
+        enrolled = set()
+        with open(self.digests_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) != 3 or not parts[2].isdigit():
+                    # 写入中断的残行
+                    continue
+                digest, name, row = parts[0], parts[1], int(parts[2])
+                if row < len(names) and names[row] == name:
+                    enrolled.add(digest)
+        return enrolled
+
+    def _prepare(self, name: str, path: str) -> tuple:
+        """
+        解码、检测并裁剪单张图像
+
+        Returns:
+            (状态, 人脸数组, 内容摘要, 原始字节)，状态为enrolled、skipped、no_face
+            或failed，内容已录入过的图像为skipped；只有enrolled带有人脸与原始字节
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha1(data).hexdigest()
+            if digest in self._enrolled:
+                return 'skipped', None, digest, None
+            image = DecodedImage(data).decode()
+
+            faces = self.face_system.detect_faces(image)
+            if not faces:
+                return 'no_face', None, digest, None
+            # 与单张录入一致，只使用第一个检测到的人脸
+            crop = self.face_system._crop_face(image.array, faces[0])
+            if crop is None:
+                return 'no_face', None, digest, None
+            return 'enrolled', crop, digest, data
+        except Exception:
+            return 'failed', None, None, None
+
+    def _store_images(self, names: List[str], paths: List[str],
+                      payloads: List[bytes]) -> List[str]:
+        """
+        加密保存一批已接受人脸的原始图像，中途失败时删除本批已写入的文件
+
+        Returns:
+            已写入的文件路径
+        """
+        written = []
+        try:
+            for name, path, data in zip(names, paths, payloads):
+                # 文件名由路径决定，续传时重复处理同一文件会覆盖而不是新增
+                path_digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+                written.append(self.face_system.store_image(
+                    name, data, filename=f"{name}_{path_digest}.enc"))
+        except BaseException:
+            self._remove_files(written)
+            raise
+        return written
+
+    @staticmethod
+    def _remove_files(paths: List[str]):
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _embed(self, crops: np.ndarray) -> np.ndarray:
+        """提取一批人脸特征，指定了submit时经由它执行"""
+        if self.submit is None:
+            return self.face_system._embed_crops(crops)
+        return self.submit(self.face_system._embed_crops, crops).result()
+
+    def _commit(self, batch: List[Tuple[str, str]], prepared: list, log, ledger):
+        """
+        提取一批人脸特征，记录内容摘要后整批写入特征库，最后记录进度
+
+        原始图像只在人脸被接受（未重复）后加密保存，提交失败时删除，不留下孤立文件。
+        """
+        statuses = []
+        names = []
+        paths = []
+        crops = []
+        digests = []
+        payloads = []
+        for (name, path), (status, crop, digest, data) in zip(batch, prepared):
+            if status == 'enrolled' and (digest in self._enrolled or digest in digests):
+                # 同一内容在本批中出现多次
+                status = 'skipped'
+            if status == 'enrolled':
+                names.append(name)
+                paths.append(path)
+                crops.append(crop)
+                digests.append(digest)
+                payloads.append(data)
+            statuses.append(status)
+
+        if crops:
+            embeddings = self._embed(np.stack(crops))
+            face_system = self.face_system
+            written = self._store_images(names, paths, payloads)
+            try:
+                with face_system.write_lock:
+                    start = len(face_system.gallery)
+                    for row, (name, digest) in enumerate(zip(names, digests), start):
+                        ledger.write(f"{digest}\t{name}\t{row}\n")
+                    ledger.flush()
+                    os.fsync(ledger.fileno())
+                    face_system.add_faces(names, embeddings)
+            except BaseException:
+                self._remove_files(written)
+                raise
+            self._enrolled.update(digests)
+
+        for (_, path), status in zip(batch, statuses):
+            self.stats[status] += 1
+            log.write(f"{status}\t{path}\n")
+        log.flush()
+        os.fsync(log.fileno())
+
+    def run(self, input_dir: str, resume: bool = True,
+            progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        批量录入目录中的所有人脸
+
+        下一批的解码与检测和当前批的特征提取重叠执行。
+
+        Args:
+            input_dir: 输入目录，结构为 <姓名>/<图像文件>
+            resume: 是否跳过进度日志中已处理的文件；内容已录入的图像总是跳过
+            progress: 每批完成后以统计信息调用的回调
+
+        Returns:
+            统计信息：enrolled、no_face、failed、skipped数量及耗时
+        """
+        done = self.load_progress() if resume else set()
+        if not resume and os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+        self._enrolled = self.load_enrolled()
+
+        def pending():
+            for name, path in iter_images(input_dir):
+                if path in done:
+                    self.stats['skipped'] += 1
+                    continue
+                yield name, path
+
+        start = time.time()
+        # 指定了submit时本地线程池不会被使用，也不会创建线程
+        with ThreadPoolExecutor(max_workers=self.workers) as pool, \
+                open(self.progress_path, 'a', encoding='utf-8') as log, \
+                open(self.digests_path, 'a', encoding='utf-8') as ledger:
+            run_task = self.submit or pool.submit
+
+            def submit(batch):
+                return batch, [run_task(self._prepare, name, path)
+                               for name, path in batch]
+
+            batches = iter_batches(pending(), self.batch_size)
+            current = next(batches, None)
+            current = submit(current) if current else None
+            while current and not self.cancelled:
+                upcoming = next(batches, None)
+                upcoming = submit(upcoming) if upcoming else None
+
+                batch, futures = current
+                self._commit(batch, [f.result() for f in futures], log, ledger)
+                self.stats['elapsed'] = time.time() - start
+                if progress is not None:
+                    progress(dict(self.stats))
+                current = upcoming
+
+            if current:
+                # 已取消：等待预取的任务结束，未提交的文件在下次运行时重新处理
+                for future in current[1]:
+                    future.cancel()
+
+        self.stats['elapsed'] = time.time() - start
+        return dict(self.stats)
+
+
+class BulkEnrollJob(BackgroundJob):
+    """在后台线程中运行的批量录入任务"""
+
+    def __init__(self, enroller: BulkEnroller, input_dir: str, resume: bool = True):
+        """
+        创建并启动任务
+
+        Args:
+            enroller: 批量录入流水线
+            input_dir: 输入目录
+            resume: 是否跳过已处理的文件
+        """
+        self.input_dir = input_dir
+        super().__init__(enroller, input_dir, resume=resume, name='bulk-enroll')
@@ -0,0 +1,149 @@
+"""
+特征缓存模块
+按解码后图像内容的哈希缓存人脸检测结果与特征，重复提交的图像跳过MTCNN和FaceNet。
+缓存按LRU淘汰并有过期时间与内存上限；识别结果带特征库版本号，特征库变化后自动重新匹配
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 除特征矩阵外，每个人脸的检测框、候选列表等对象的估计内存占用
+_FACE_OVERHEAD_BYTES = 1024
+_ENTRY_OVERHEAD_BYTES = 256
+
+
+def image_key(img_array: np.ndarray, *context) -> str:
+    """
+    计算图像内容的缓存键
+
+    Args:
+        img_array: 解码后的图像数组
+        *context: 影响检测结果的其他参数，如检测后端名称
+
+    Returns:
+        十六进制摘要
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((img_array.shape, str(img_array.dtype)) + context).encode())
+    digest.update(np.ascontiguousarray(img_array).data)
+    return digest.hexdigest()
+
+
+class CacheEntry:
+    """一张图像的检测结果、特征以及最近一次的识别结果"""
+
+    __slots__ = ('faces', 'embeddings', 'results', 'version', 'size', 'expires')
+
+    def __init__(self, faces: list, embeddings: np.ndarray, results: list,
+                 version: int):
+        self.faces = faces
+        self.embeddings = embeddings
+        self.results = results
+        self.version = version
+        self.size = (embeddings.nbytes + len(faces) * _FACE_OVERHEAD_BYTES
+                     + _ENTRY_OVERHEAD_BYTES)
+        self.expires = 0.0
+
+
+class EmbeddingCache:
+    """带过期时间和内存上限的LRU特征缓存"""
+
+    def __init__(self, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 缓存内存上限（字节），0表示禁用，默认读取EMBEDDING_CACHE_MAX_BYTES
+            ttl: 缓存项有效期（秒），默认读取EMBEDDING_CACHE_TTL
+        """
+        if max_bytes is None:
+            max_bytes = int(os.getenv('EMBEDDING_CACHE_MAX_BYTES', str(64 << 20)))
+        if ttl is None:
+            ttl = float(os.getenv('EMBEDDING_CACHE_TTL', '300'))
+        self.max_bytes = max(0, max_bytes)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        查找缓存项并标记为最近使用
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存项，不存在或已过期时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: CacheEntry):
+        """
+        写入缓存项，超出内存上限时淘汰最久未使用的项
+
+        Args:
+            key: 缓存键
+            entry: 缓存项
+        """
+        if not self.enabled or entry.size > self.max_bytes:
+            return
+        entry.expires = time.monotonic() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        """删除缓存项（调用方持有锁）"""
+        self._bytes -= self._entries.pop(key).size
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """命中率等统计信息"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
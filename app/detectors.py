@@ -0,0 +1,130 @@
+"""
+人脸检测后端模块
+提供可互换的人脸检测器，所有后端返回与MTCNN相同的 box/keypoints/confidence 格式
+"""
+import numpy as np
+from typing import List
+
+
+class MTCNNDetector:
+    """MTCNN检测器：精度高，带五点关键点"""
+
+    name = 'mtcnn'
+
+    def __init__(self):
+        """加载MTCNN模型"""
+        # 延迟导入，避免导入本模块时加载TensorFlow
+        from mtcnn import MTCNN
+        self.model = MTCNN()
+
+    def detect(self, img_array: np.ndarray) -> List[dict]:
+        """
+        检测人脸
+
+        Args:
+            img_array: RGB图像数组
+
+        Returns:
+            人脸检测结果列表，每个元素包含box、keypoints和confidence
+        """
+        return self.model.detect_faces(img_array)
+
+
+class OpenCVDetector:
+    """OpenCV Haar级联检测器：纯CPU、速度快，关键点按人脸比例估计"""
+
+    name = 'opencv'
+
+    # 关键点在人脸框内的相对位置（x比例, y比例）
+    KEYPOINT_LAYOUT = {
+        'left_eye': (0.30, 0.38),
+        'right_eye': (0.70, 0.38),
+        'nose': (0.50, 0.58),
+        'mouth_left': (0.34, 0.78),
+        'mouth_right': (0.66, 0.78),
+    }
+
+    def __init__(self, scale_factor: float = 1.1, min_neighbors: int = 5,
+                 min_size: int = 40):
+        """
+        加载Haar级联模型
+
+        Args:
+            scale_factor: 图像金字塔缩放比例，越大越快但越容易漏检
+            min_neighbors: 候选框最少邻居数，越大误检越少
+            min_size: 最小人脸边长（像素）
+        """
+        import cv2
+        self._cv2 = cv2
+        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        self.model = cv2.CascadeClassifier(cascade_path)
+        if self.model.empty():
+            raise RuntimeError(f"无法加载Haar级联模型: {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    @classmethod
+    def estimate_keypoints(cls, box: List[int]) -> dict:
+        """
+        根据人脸框估计五点关键点
+
+        Args:
+            box: [x, y, w, h]
+
+        Returns:
+            与MTCNN相同键名的关键点字典
+        """
+        x, y, w, h = box
+        return {
+            name: (int(round(x + fx * w)), int(round(y + fy * h)))
+            for name, (fx, fy) in cls.KEYPOINT_LAYOUT.items()
+        }
+
+    def detect(self, img_array: np.ndarray) -> List[dict]:
+        """
+        检测人脸
+
+        Args:
+            img_array: RGB图像数组
+
+        Returns:
+            人脸检测结果列表，每个元素包含box、keypoints和confidence
+        """
+        cv2 = self._cv2
+        gray = cv2.equalizeHist(cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY))
+        boxes, _, weights = self.model.detectMultiScale3(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+            minSize=(self.min_size, self.min_size), outputRejectLevels=True)
+
+        faces = []
+        for box, weight in zip(boxes, weights):
+            box = [int(v) for v in box]
+            faces.append({
+                'box': box,
+                # 将级联分类器的得分映射到(0, 1)，仅用于排序和阈值过滤
+                'confidence': float(1.0 / (1.0 + np.exp(-float(weight)))),
+                'keypoints': self.estimate_keypoints(box),
+            })
+        return faces
+
+
+DETECTOR_BACKENDS = {
+    MTCNNDetector.name: MTCNNDetector,
+    OpenCVDetector.name: OpenCVDetector,
+}
+
+
+def create_detector(name: str):
+    """
+    根据名称创建检测器
+
+    Args:
+        name: 检测器后端名称（mtcnn或opencv）
+
+    Returns:
+        检测器实例
+    """
+    if name not in DETECTOR_BACKENDS:
+        raise ValueError(f"未知的人脸检测后端: {name}")
+    return DETECTOR_BACKENDS[name]()
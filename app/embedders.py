@@ -0,0 +1,292 @@
+"""
+特征提取后端模块
+提供可互换的FaceNet推理后端，所有后端的embeddings接口与keras_facenet.FaceNet相同：
+    keras        keras_facenet原始实现，每次调用走model.predict（参考实现）
+    tf_function  图像标准化与模型编译为固定形状的tf.function图（可选XLA），批次补齐到2的幂
+    tflite       由scripts/export_embedder.py导出的TFLite模型，可选int8量化
+"""
+import os
+import threading
+from typing import Iterable, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDER_BACKENDS = ('keras', 'tf_function', 'tflite')
+
+# FaceNet输入尺寸
+IMAGE_SIZE = 160
+
+
+def _load_facenet():
+    """加载keras_facenet模型（延迟导入，避免导入本模块时加载TensorFlow）"""
+    from keras_facenet import FaceNet
+    return FaceNet()
+
+
+def build_inference_fn(model, fixed_standardization: bool = True,
+                       jit_compile: bool = False):
+    """
+    将图像标准化与FaceNet模型合并为一个tf.function图
+
+    Args:
+        model: keras_facenet的Keras模型
+        fixed_standardization: 是否使用固定标准化 (x - 127.5) / 127.5，
+            否则按图像做均值方差标准化，与keras_facenet的_normalize一致
+        jit_compile: 是否用XLA编译
+
+    Returns:
+        输入(N, 160, 160, 3) float32像素、输出(N, D)特征的tf.function
+    """
+    import tensorflow as tf
+
+    spec = tf.TensorSpec([None, IMAGE_SIZE, IMAGE_SIZE, 3], tf.float32)
+
+    @tf.function(input_signature=[spec], jit_compile=jit_compile)
+    def infer(pixels):
+        if fixed_standardization:
+            inputs = (pixels - 127.5) / 127.5
+        else:
+            mean = tf.reduce_mean(pixels, axis=[1, 2, 3], keepdims=True)
+            std = tf.math.reduce_std(pixels, axis=[1, 2, 3], keepdims=True)
+            std = tf.maximum(std, 1.0 / np.sqrt(IMAGE_SIZE * IMAGE_SIZE * 3))
+            inputs = (pixels - mean) / std
+        return model(inputs, training=False)
+
+    return infer
+
+
+def _bucket(size: int, max_batch: int) -> int:
+    """不小于size的2的幂，最大为max_batch"""
+    bucket = 1
+    while bucket < size and bucket < max_batch:
+        bucket *= 2
+    return min(bucket, max_batch)
+
+
+def _check_crops(crops: np.ndarray) -> np.ndarray:
+    """检查人脸数组形状并转换为float32"""
+    crops = np.asarray(crops)
+    if crops.ndim != 4 or crops.shape[1:] != (IMAGE_SIZE, IMAGE_SIZE, 3):
+        raise ValueError(f"人脸数组形状应为(N, {IMAGE_SIZE}, {IMAGE_SIZE}, 3)，"
+                         f"实际为{crops.shape}")
+    return crops.astype(np.float32, copy=False)
+
+
+class KerasEmbedder:
+    """keras_facenet原始实现（参考后端）"""
+
+    name = 'keras'
+
+    def __init__(self, facenet=None):
+        """
+        Args:
+            facenet: 已加载的keras_facenet.FaceNet实例，默认新建
+        """
+        self.facenet = facenet or _load_facenet()
+
+    def embeddings(self, crops: np.ndarray) -> np.ndarray:
+        """
+        提取一批人脸的特征
+
+        Args:
+            crops: 形状为(N, 160, 160, 3)的人脸数组
+
+        Returns:
+            形状为(N, D)的特征矩阵
+        """
+        return self.facenet.embeddings(crops)
+
+
+class CompiledEmbedder:
+    """编译为tf.function图的FaceNet，避免model.predict每次调用的Python开销"""
+
+    name = 'tf_function'
+
+    def __init__(self, facenet=None, jit_compile: Optional[bool] = None,
+                 max_batch: Optional[int] = None):
+        """
+        Args:
+            facenet: 已加载的keras_facenet.FaceNet实例，默认新建
+            jit_compile: 是否用XLA编译，默认读取FACE_EMBEDDER_XLA
+            max_batch: 单次前向计算的最大批大小，默认与INFERENCE_MAX_BATCH_SIZE一致
+        """
+        if jit_compile is None:
+            jit_compile = os.getenv('FACE_EMBEDDER_XLA', 'true').lower() == 'true'
+        if max_batch is None:
+            max_batch = int(os.getenv('INFERENCE_MAX_BATCH_SIZE', '32'))
+        facenet = facenet or _load_facenet()
+        self.max_batch = max(1, max_batch)
+        self.jit_compile = jit_compile
+        self._infer = build_inference_fn(
+            facenet.model, facenet.metadata.get('fixed_image_standardization', True),
+            jit_compile=jit_compile)
+
+    def embeddings(self, crops: np.ndarray) -> np.ndarray:
+        """
+        提取一批人脸的特征
+
+        批次补齐到2的幂，XLA只需为少数几种形状编译。
+
+        Args:
+            crops: 形状为(N, 160, 160, 3)的人脸数组
+
+        Returns:
+            形状为(N, D)的特征矩阵
+        """
+        pixels = _check_crops(crops)
+        outputs = []
+        for start in range(0, len(pixels), self.max_batch):
+            chunk = pixels[start:start + self.max_batch]
+            count = len(chunk)
+            bucket = _bucket(count, self.max_batch)
+            if bucket > count:
+                padding = np.zeros((bucket - count,) + chunk.shape[1:], np.float32)
+                chunk = np.concatenate([chunk, padding])
+            outputs.append(self._infer(chunk).numpy()[:count])
+        return np.concatenate(outputs)
+
+
+class TFLiteEmbedder:
+    """TFLite解释器上运行的FaceNet（图像标准化已包含在模型中）"""
+
+    name = 'tflite'
+
+    def __init__(self, model_path: Optional[str] = None, threads: Optional[int] = None):
+        """
+        Args:
+            model_path: 导出的.tflite文件，默认读取FACE_EMBEDDER_MODEL
+            threads: 解释器线程数，默认读取FACE_EMBEDDER_THREADS（0为自动）
+        """
+        import tensorflow as tf
+
+        if model_path is None:
+            model_path = os.getenv('FACE_EMBEDDER_MODEL', 'data/models/facenet.tflite')
+        if threads is None:
+            threads = int(os.getenv('FACE_EMBEDDER_THREADS', '0'))
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"TFLite模型不存在: {model_path}，请先运行 scripts/export_embedder.py")
+        self.model_path = model_path
+        self.interpreter = tf.lite.Interpreter(model_path=model_path,
+                                               num_threads=threads or None)
+        self._input = self.interpreter.get_input_details()[0]['index']
+        self._output = self.interpreter.get_output_details()[0]['index']
+        self._batch = None
+        # 解释器不是线程安全的，预热线程与调度线程可能同时调用
+        self._lock = threading.Lock()
+
+    def embeddings(self, crops: np.ndarray) -> np.ndarray:
+        """
+        提取一批人脸的特征
+
+        Args:
+            crops: 形状为(N, 160, 160, 3)的人脸数组
+
+        Returns:
+            形状为(N, D)的特征矩阵
+        """
+        pixels = _check_crops(crops)
+        with self._lock:
+            if self._batch != len(pixels):
+                self.interpreter.resize_tensor_input(self._input, pixels.shape)
+                self.interpreter.allocate_tensors()
+                self._batch = len(pixels)
+            self.interpreter.set_tensor(self._input, pixels)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output).copy()
+
+
+def create_embedder(backend: Optional[str] = None, facenet=None):
+    """
+    按名称创建特征提取后端
+
+    Args:
+        backend: keras、tf_function或tflite，默认读取FACE_EMBEDDER_BACKEND
+        facenet: 已加载的keras_facenet.FaceNet实例（tflite后端不需要）
+
+    Returns:
+        带embeddings方法的特征提取器
+    """
+    backend = backend or os.getenv('FACE_EMBEDDER_BACKEND', 'keras')
+    if backend == 'keras':
+        return KerasEmbedder(facenet)
+    if backend == 'tf_function':
+        return CompiledEmbedder(facenet)
+    if backend == 'tflite':
+        return TFLiteEmbedder()
+    raise ValueError(f"未知的特征提取后端: {backend}")
+
+
+def export_tflite(model, path: str, fixed_standardization: bool = True,
+                  quantize: str = 'none',
+                  calibration: Optional[Iterable[np.ndarray]] = None) -> str:
+    """
+    将FaceNet（含图像标准化）导出为TFLite模型
+
+    Args:
+        model: keras_facenet的Keras模型
+        path: 输出的.tflite文件路径
+        fixed_standardization: 与keras_facenet元数据fixed_image_standardization一致
+        quantize: none（float32）、dynamic（int8权重）或int8（权重与激活，需要校准数据）
+        calibration: int8量化的校准人脸，每个元素为(160, 160, 3)数组
+
+    Returns:
+        输出文件路径
+    """
+    import tensorflow as tf
+
+    if quantize not in ('none', 'dynamic', 'int8'):
+        raise ValueError(f"未知的量化方式: {quantize}")
+    infer = build_inference_fn(model, fixed_standardization)
+    converter = tf.lite.TFLiteConverter.from_concrete_functions(
+        [infer.get_concrete_function()], model)
+    if quantize != 'none':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == 'int8':
+        if calibration is None:
+            raise ValueError("int8量化需要校准数据")
+        samples = [np.asarray(crop, dtype=np.float32)[np.newaxis]
+                   for crop in calibration]
+
+        def representative_dataset():
+            for sample in samples:
+                yield [sample]
+
+        converter.representative_dataset = representative_dataset
+        # 无int8实现的算子回退为float32，输入输出保持float32
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+                                               tf.lite.OpsSet.TFLITE_BUILTINS]
+
+    data = converter.convert()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def parity_check(reference, candidate, crops: np.ndarray) -> dict:
+    """
+    比较两个后端在同一批人脸上的特征
+
+    Args:
+        reference: 参考后端（通常为KerasEmbedder）
+        candidate: 待验证的后端
+        crops: 形状为(N, 160, 160, 3)的人脸数组
+
+    Returns:
+        samples、min_cosine、mean_cosine和max_abs_diff（归一化后）
+    """
+    expected = np.asarray(reference.embeddings(crops), dtype=np.float32)
+    actual = np.asarray(candidate.embeddings(crops), dtype=np.float32)
+    expected /= np.maximum(np.linalg.norm(expected, axis=1, keepdims=True), 1e-12)
+    actual /= np.maximum(np.linalg.norm(actual, axis=1, keepdims=True), 1e-12)
+    cosine = np.sum(expected * actual, axis=1)
+    return {
+        'samples': int(len(crops)),
+        'min_cosine': float(cosine.min()),
+        'mean_cosine': float(cosine.mean()),
+        'max_abs_diff': float(np.abs(expected - actual).max()),
+    }
@@ -2,22 +2,44 @@
 数据加密和解密工具模块
 使用Fernet对称加密保护人脸图像数据
 """
+import hashlib
+import io
 import os
-from cryptography.fernet import Fernet
+import struct
+import tempfile
+from typing import BinaryIO, List
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# 分块加密文件格式：魔数 + 若干个 [4字节长度][Fernet令牌]，
+# 每块明文前带 8字节块序号 + 1字节结束标志，用于发现块被重排或截断
+CHUNK_MAGIC = b'FERNETC1'
+_CHUNK_LENGTH = struct.Struct('>I')
+_CHUNK_HEADER = struct.Struct('>QB')
+
 
 class EncryptionManager:
     """加密管理器"""
 
     def __init__(self):
-        """初始化加密管理器，从环境变量加载密钥"""
-        key = os.getenv('ENCRYPTION_KEY')
-        if not key:
+        """
+        初始化加密管理器，从环境变量加载密钥
+
+        ENCRYPTION_KEY可以是逗号分隔的多个密钥，按从新到旧排列：
+        第一个密钥用于加密，所有密钥都可用于解密，便于不停机轮换密钥。
+        """
+        keys = parse_keys(os.getenv('ENCRYPTION_KEY', ''))
+        if not keys:
             raise ValueError("ENCRYPTION_KEY not found in environment variables")
-        self.cipher = Fernet(key.encode())
+        self.keys = keys
+        self.cipher = MultiFernet([Fernet(key.encode()) for key in keys])
+
+    @property
+    def key_fingerprint(self) -> str:
+        """当前加密密钥的指纹，用于区分不同的轮换批次（不泄露密钥本身）"""
+        return hashlib.sha256(self.keys[0].encode()).hexdigest()[:12]
 
     def encrypt(self, data: bytes) -> bytes:
         """
@@ -36,40 +58,179 @@ class EncryptionManager:
         解密数据
 
         Args:
-            encrypted_data: 加密的字节数据
+            encrypted_data: 加密的字节数据，整体加密或分块格式均可
 
         Returns:
             解密后的原始字节数据
         """
+        if encrypted_data.startswith(CHUNK_MAGIC):
+            output = io.BytesIO()
+            self.decrypt_stream(io.BytesIO(encrypted_data), output)
+            return output.getvalue()
         return self.cipher.decrypt(encrypted_data)
 
-    def encrypt_file(self, input_path: str, output_path: str):
+    def encrypt_stream(self, src: BinaryIO, dst: BinaryIO, chunk_size: int = None):
+        """
+        分块加密数据流，内存占用只与块大小有关
+
+        Args:
+            src: 明文输入流
+            dst: 密文输出流
+            chunk_size: 每块明文字节数，默认读取ENCRYPTION_CHUNK_SIZE
+        """
+        if chunk_size is None:
+            chunk_size = int(os.getenv('ENCRYPTION_CHUNK_SIZE', str(1 << 20)))
+        dst.write(CHUNK_MAGIC)
+        index = 0
+        chunk = src.read(chunk_size)
+        while True:
+            following = src.read(chunk_size)
+            final = not following
+            token = self.cipher.encrypt(_CHUNK_HEADER.pack(index, final) + chunk)
+            dst.write(_CHUNK_LENGTH.pack(len(token)))
+            dst.write(token)
+            if final:
+                return
+            chunk = following
+            index += 1
+
+    def decrypt_stream(self, src: BinaryIO, dst: BinaryIO):
+        """
+        解密数据流，支持分块格式和整体加密的单个Fernet令牌
+
+        Args:
+            src: 密文输入流
+            dst: 明文输出流
+        """
+        magic = src.read(len(CHUNK_MAGIC))
+        if magic != CHUNK_MAGIC:
+            dst.write(self.cipher.decrypt(magic + src.read()))
+            return
+
+        index = 0
+        while True:
+            length = src.read(_CHUNK_LENGTH.size)
+            if len(length) < _CHUNK_LENGTH.size:
+                raise InvalidToken("加密文件被截断")
+            token = src.read(_CHUNK_LENGTH.unpack(length)[0])
+            plain = self.cipher.decrypt(token)
+            chunk_index, final = _CHUNK_HEADER.unpack_from(plain)
+            if chunk_index != index:
+                raise InvalidToken("加密文件的块顺序错误")
+            dst.write(memoryview(plain)[_CHUNK_HEADER.size:])
+            if final:
+                return
+            index += 1
+
+    def rotate(self, encrypted_data: bytes) -> bytes:
+        """
+        用当前密钥重新加密数据
+
+        Args:
+            encrypted_data: 用任一已配置密钥加密的数据，整体加密或分块格式均可
+
+        Returns:
+            用当前密钥加密的数据，格式与输入相同
+        """
+        output = io.BytesIO()
+        self.rotate_stream(io.BytesIO(encrypted_data), output)
+        return output.getvalue()
+
+    def rotate_stream(self, src: BinaryIO, dst: BinaryIO):
         """
-        加密文件
+        逐块用当前密钥重新加密数据流
+
+        Args:
+            src: 密文输入流
+            dst: 密文输出流
+        """
+        magic = src.read(len(CHUNK_MAGIC))
+        if magic != CHUNK_MAGIC:
+            dst.write(self.cipher.rotate(magic + src.read()))
+            return
+
+        dst.write(CHUNK_MAGIC)
+        index = 0
+        while True:
+            length = src.read(_CHUNK_LENGTH.size)
+            if len(length) < _CHUNK_LENGTH.size:
+                # 输入在结束块之前就已结束
+                raise InvalidToken("加密文件被截断")
+            token = src.read(_CHUNK_LENGTH.unpack(length)[0])
+            chunk_index, final = _CHUNK_HEADER.unpack_from(self.cipher.decrypt(token))
+            if chunk_index != index:
+                raise InvalidToken("加密文件的块顺序错误")
+            token = self.cipher.rotate(token)
+            dst.write(_CHUNK_LENGTH.pack(len(token)))
+            dst.write(token)
+            if final:
+                return
+            index += 1
+
+    def rotate_file(self, path: str):
+        """
+        原地用当前密钥重新加密文件，保留文件的修改时间
+
+        Args:
+            path: 加密文件路径
+        """
+        stat = os.stat(path)
+        _write_atomically(path, path, self.rotate_stream)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    def encrypt_file(self, input_path: str, output_path: str, chunk_size: int = None):
+        """
+        分块加密文件，先写临时文件再原子替换
 
         Args:
             input_path: 输入文件路径
             output_path: 输出文件路径
+            chunk_size: 每块明文字节数，默认读取ENCRYPTION_CHUNK_SIZE
         """
-        with open(input_path, 'rb') as f:
-            data = f.read()
-        encrypted_data = self.encrypt(data)
-        with open(output_path, 'wb') as f:
-            f.write(encrypted_data)
+        _write_atomically(output_path, input_path,
+                          lambda src, dst: self.encrypt_stream(src, dst, chunk_size))
 
     def decrypt_file(self, input_path: str, output_path: str):
         """
-        解密文件
+        解密文件，支持分块格式和整体加密格式
 
         Args:
             input_path: 加密文件路径
             output_path: 输出文件路径
         """
-        with open(input_path, 'rb') as f:
-            encrypted_data = f.read()
-        data = self.decrypt(encrypted_data)
-        with open(output_path, 'wb') as f:
-            f.write(data)
+        _write_atomically(output_path, input_path,
+                          lambda src, dst: self.decrypt_stream(src, dst))
+
+
+def _write_atomically(output_path: str, input_path: str, transform):
+    """
+    从input_path读取、经transform写入临时文件后原子替换output_path
+
+    临时文件名唯一，多个进程同时处理同一文件时互不覆盖对方的临时文件。
+    """
+    directory, name = os.path.split(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as dst, open(input_path, 'rb') as src:
+            transform(src, dst)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def parse_keys(value: str) -> List[str]:
+    """
+    解析逗号分隔的密钥列表
+
+    Args:
+        value: 形如 "新密钥,旧密钥" 的字符串
+
+    Returns:
+        按从新到旧排列的密钥列表
+    """
+    return [key.strip() for key in value.split(',') if key.strip()]
 
 
 def generate_key() -> str:
@@ -0,0 +1,188 @@
+"""
+推理执行器模块
+在有界线程池中运行人脸检测与识别，避免阻塞asyncio事件循环
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ExecutorBusyError(Exception):
+    """执行队列已满，无法接收新任务"""
+
+
+class InferenceExecutor:
+    """带背压的推理执行器"""
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 max_queue: Optional[int] = None):
+        """
+        初始化执行器
+
+        Args:
+            max_workers: 工作线程数，默认读取INFERENCE_WORKERS
+            max_queue: 允许排队等待的任务数，默认读取INFERENCE_QUEUE_SIZE
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv('INFERENCE_WORKERS', '4'))
+        if max_queue is None:
+            max_queue = int(os.getenv('INFERENCE_QUEUE_SIZE', '16'))
+
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                        thread_name_prefix='inference')
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._release_listeners: List[Callable[[], None]] = []
+
+    @property
+    def pending(self) -> int:
+        """正在执行和排队中的任务数"""
+        return self._pending
+
+    @property
+    def capacity(self) -> int:
+        """同时允许的最大任务数"""
+        return self.max_workers + self.max_queue
+
+    def _acquire(self) -> bool:
+        with self._lock:
+            if self._pending >= self.capacity:
+                return False
+            self._pending += 1
+            return True
+
+    def add_release_listener(self, listener: Callable[[], None]):
+        """注册任务结束、名额释放后的回调（在工作线程中调用）"""
+        self._release_listeners.append(listener)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+        for listener in self._release_listeners:
+            listener()
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """
+        在线程池中执行函数并等待结果
+
+        Args:
+            fn: 要执行的同步函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            函数返回值
+
+        Raises:
+            ExecutorBusyError: 执行中与排队中的任务已达到上限
+        """
+        if not self._acquire():
+            raise ExecutorBusyError(
+                f"推理队列已满（{self.capacity}个任务），请稍后重试")
+
+        try:
+            future = self._pool.submit(functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self._release()
+            raise
+        # 任务结束时才释放名额，即使调用方已取消等待
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池"""
+        self._pool.shutdown(wait=wait)
+
+
+class LowPriorityGate:
+    """低优先级任务的准入控制
+
+    合计在途数由信号量限制，并且只在执行器有空闲工作线程时提交，从不占用
+    交互式请求的排队名额；没有空闲线程时等待执行器释放名额的通知，先到先得。
+    """
+
+    def __init__(self, executor: InferenceExecutor, max_inflight: int):
+        """
+        初始化准入控制
+
+        Args:
+            executor: 共享的推理执行器
+            max_inflight: 低优先级任务合计的最大在途数
+        """
+        self.executor = executor
+        self.max_inflight = max(1, max_inflight)
+        self._loop = None
+        self._semaphore = None
+        self._idle = None
+        self._waiting = 0
+        self._notifiers = set()
+        executor.add_release_listener(self._on_release)
+
+    def _primitives(self):
+        """asyncio原语绑定所在的事件循环，事件循环变化时重新创建"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_inflight)
+            self._idle = asyncio.Condition()
+        return self._semaphore, self._idle
+
+    def _has_idle_worker(self) -> bool:
+        return self.executor.pending < self.executor.max_workers
+
+    def _on_release(self):
+        """执行器释放名额时唤醒等待空闲线程的任务"""
+        loop = self._loop
+        if not self._waiting or loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._schedule_notify)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def _schedule_notify(self):
+        """在事件循环线程中创建通知任务，并持有引用直到完成"""
+        task = asyncio.get_running_loop().create_task(self._notify(self._idle))
+        self._notifiers.add(task)
+        task.add_done_callback(self._notifiers.discard)
+
+    @staticmethod
+    async def _notify(idle: asyncio.Condition):
+        async with idle:
+            idle.notify_all()
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """
+        等待准入后在执行器中执行函数
+
+        Args:
+            fn: 要执行的同步函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            函数返回值
+        """
+        semaphore, idle = self._primitives()
+        async with semaphore:
+            while True:
+                async with idle:
+                    self._waiting += 1
+                    try:
+                        await idle.wait_for(self._has_idle_worker)
+                    finally:
+                        self._waiting -= 1
+                try:
+                    return await self.executor.run(fn, *args, **kwargs)
+                except ExecutorBusyError:
+                    # 交互式请求抢先占满了执行器，继续等待
+                    continue
@@ -3,14 +3,25 @@
 基于FaceNet和MTCNN实现人脸检测、特征提取和识别
 """
 import os
+import tempfile
+import threading
 import numpy as np
 from PIL import Image
-from mtcnn import MTCNN
-from keras_facenet import FaceNet
-from typing import List, Tuple, Optional
-import io
+from typing import List, Tuple, Optional, Union
 from dotenv import load_dotenv
+from app import metrics
+from app.cache import CacheEntry, EmbeddingCache, image_key
+from app.detectors import DETECTOR_BACKENDS, create_detector
+from app.embedders import EMBEDDER_BACKENDS, create_embedder
 from app.encryption import EncryptionManager
+from app.gallery import EmbeddingGallery
+from app.imaging import DecodedImage, as_decoded
+from app.index import create_index
+from app.persistence import ImageWriter, image_filename
+from app.quantization import EMBEDDING_DTYPES, QuantizedGallery
+from app.scheduler import InferenceScheduler
+from app.shared_gallery import SharedGallery
+from app.tracking import FaceTracker
 
 load_dotenv()
 
@@ -27,61 +38,263 @@ class FaceRecognitionSystem:
             data_path: 人脸特征数据库路径
             images_dir: 人脸图像存储目录
         """
-        self.detector = MTCNN()
-        self.embedder = FaceNet()
+        # 模型在首次使用或预热时才加载，构造实例不会导入TensorFlow
+        self.detector_backend = os.getenv('FACE_DETECTOR_BACKEND', 'mtcnn')
+        if self.detector_backend not in DETECTOR_BACKENDS:
+            raise ValueError(f"未知的人脸检测后端: {self.detector_backend}")
+        self._detectors = {}
+        self.embedder_backend = os.getenv('FACE_EMBEDDER_BACKEND', 'keras')
+        if self.embedder_backend not in EMBEDDER_BACKENDS:
+            raise ValueError(f"未知的特征提取后端: {self.embedder_backend}")
+        self._embedder = None
+        self._model_lock = threading.Lock()
+        # 录入、批量录入与数据库加载共用的写锁，保证特征库追加与数据库保存串行执行
+        self.write_lock = threading.RLock()
+        self.model_status = 'not_loaded'
+        self.model_error = None
+        self.scheduler = InferenceScheduler(self._run_embedder)
         self.data_path = data_path
         self.images_dir = images_dir
         self.threshold = float(os.getenv('FACE_RECOGNITION_THRESHOLD', '0.6'))
+        self.top_k = int(os.getenv('FACE_RECOGNITION_TOP_K', '1'))
+        # 检测时将图像长边缩小到该值（0表示不缩放），特征仍从原图裁剪
+        self.detection_max_side = int(os.getenv('FACE_DETECTION_MAX_SIDE', '0'))
         self.encryption_manager = EncryptionManager()
+        # 录入图像的加密与落盘在后台写入线程中完成
+        self.image_writer = ImageWriter(
+            lambda filename, data, fsync: self.store_image(
+                None, data, filename=filename, fsync=fsync))
 
         # 确保目录存在
         os.makedirs(os.path.dirname(data_path), exist_ok=True)
         os.makedirs(images_dir, exist_ok=True)
 
         # 加载已有数据
-        self.names = []
-        self.embeddings = []
+        # mmap后端：特征矩阵映射自追加写入的存储文件，录入为O(1)写入，
+        # 且多个工作进程共用同一份内存
+        self.db_backend = os.getenv('FACE_DB_BACKEND', 'npz')
+        # float16/int8：特征库以量化矩阵保存，float32原始特征只用于重排
+        self.embedding_dtype = os.getenv('FACE_EMBEDDING_DTYPE', 'float32')
+        if self.embedding_dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"未知的特征存储类型: {self.embedding_dtype}")
+        base_path = os.path.splitext(data_path)[0]
+        if self.db_backend == 'mmap':
+            if self.embedding_dtype != 'float32':
+                raise ValueError("mmap后端只支持float32特征")
+            self.gallery = SharedGallery(base_path)
+        elif self.embedding_dtype != 'float32':
+            self.gallery = QuantizedGallery(self.embedding_dtype,
+                                            originals_path=base_path + '.f32')
+        else:
+            self.gallery = EmbeddingGallery()
         self._load_database()
 
+        # 检索索引与数据库文件放在一起，新录入的人脸在下次检索时增量插入
+        self.index = create_index(base_path=base_path)
+
+        # 按图像内容缓存检测结果与特征，重复提交的图像跳过模型推理
+        self.embedding_cache = EmbeddingCache()
+
+    @property
+    def detector(self):
+        """默认人脸检测器（首次访问时加载）"""
+        return self.get_detector()
+
+    def get_detector(self, name: Optional[str] = None):
+        """
+        获取人脸检测器，每个后端只在首次使用时加载一次
+
+        Args:
+            name: 检测器后端名称，默认使用FACE_DETECTOR_BACKEND
+
+        Returns:
+            检测器实例
+        """
+        name = name or self.detector_backend
+        if name not in self._detectors:
+            if name == self.detector_backend:
+                self.load_models()
+            else:
+                with self._model_lock:
+                    if name not in self._detectors:
+                        self._detectors[name] = create_detector(name)
+        return self._detectors[name]
+
+    @property
+    def embedder(self):
+        """FaceNet特征提取模型（首次访问时加载）"""
+        if self._embedder is None:
+            self.load_models()
+        return self._embedder
+
+    @property
+    def ready(self) -> bool:
+        """模型是否已加载并完成预热"""
+        return self.model_status == 'ready'
+
+    def load_models(self):
+        """加载默认人脸检测器与FaceNet模型，多次调用只加载一次"""
+        with self._model_lock:
+            loaded = self.detector_backend in self._detectors
+            if loaded and self._embedder is not None:
+                return
+            if self.model_status != 'warming_up':
+                self.model_status = 'loading'
+            try:
+                if not loaded:
+                    self._detectors[self.detector_backend] = create_detector(
+                        self.detector_backend)
+                if self._embedder is None:
+                    self._embedder = create_embedder(self.embedder_backend)
+            except Exception as e:
+                self.model_status = 'error'
+                self.model_error = str(e)
+                raise
+            if self.model_status == 'loading':
+                self.model_status = 'ready'
+
+    def warm_up(self):
+        """加载模型并执行一次预热推理，避免第一个真实请求承担初始化开销"""
+        self.model_status = 'warming_up'
+        try:
+            self.load_models()
+            self.detect_faces(Image.new('RGB', (160, 160)))
+            self._run_embedder(np.zeros((1, 160, 160, 3), dtype=np.uint8))
+        except Exception as e:
+            self.model_status = 'error'
+            self.model_error = str(e)
+            raise
+        self.model_status = 'ready'
+
+    def start_warmup(self) -> threading.Thread:
+        """
+        在后台线程中预热模型
+
+        Returns:
+            预热线程
+        """
+        def run():
+            try:
+                self.warm_up()
+            except Exception:
+                # 错误已记录在model_status/model_error中，由/health报告
+                pass
+
+        thread = threading.Thread(target=run, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def _run_embedder(self, crops: np.ndarray) -> np.ndarray:
+        """直接调用特征提取后端提取一批人脸的特征"""
+        return self.embedder.embeddings(crops)
+
     def _load_database(self):
         """从文件加载人脸数据库"""
+        with self.write_lock:
+            self._read_database()
+
+    def _read_database(self):
+        """读取数据库文件到特征库（调用方持有写锁）"""
+        if isinstance(self.gallery, SharedGallery):
+            # 存储为空时由第一个进程导入已有的npz数据库
+            if len(self.gallery) == 0 and os.path.exists(self.data_path):
+                data = np.load(self.data_path, allow_pickle=True)
+                self.gallery.initialize(data['names'], data['embeddings'])
+            return
+
         if os.path.exists(self.data_path):
             data = np.load(self.data_path, allow_pickle=True)
-            self.names = data['names'].tolist()
-            self.embeddings = data['embeddings'].tolist()
+            if isinstance(self.gallery, QuantizedGallery):
+                self.gallery.load(data['names'], data['embeddings'],
+                                  data['scales'] if 'scales' in data else None)
+            else:
+                # 量化数据库的缩放系数只改变向量长度，归一化后即可直接使用
+                self.gallery.clear()
+                self.gallery.extend(data['names'], data['embeddings'])
 
     def _save_database(self):
         """保存人脸数据库到文件"""
-        np.savez(self.data_path,
-                 names=np.array(self.names),
-                 embeddings=np.array(self.embeddings))
+        if isinstance(self.gallery, SharedGallery):
+            # 记录在录入时已追加提交，无需重写整个数据库
+            return
+        with metrics.stage('save'):
+            if isinstance(self.gallery, QuantizedGallery):
+                np.savez(self.data_path,
+                         names=self.gallery.names.astype(str),
+                         embeddings=self.gallery.codes,
+                         scales=self.gallery.scales)
+                return
+            np.savez(self.data_path,
+                     names=self.gallery.names.astype(str),
+                     embeddings=self.gallery.matrix)
+
+    @staticmethod
+    def _decode(image: Union[Image.Image, DecodedImage]) -> DecodedImage:
+        """解码全分辨率像素，后续检测、缓存键与裁剪共享同一个数组"""
+        return as_decoded(image).decode()
+
+    @staticmethod
+    def _map_faces(faces: List[dict], scale_x: float, scale_y: float) -> List[dict]:
+        """
+        将缩小图像上的检测结果映射回原图坐标
 
-    def detect_faces(self, image: Image.Image) -> List[dict]:
+        Args:
+            faces: 缩小图像上的人脸检测结果
+            scale_x: 原图宽度 / 缩小图宽度
+            scale_y: 原图高度 / 缩小图高度
+
+        Returns:
+            原图坐标系下的人脸检测结果
+        """
+        mapped = []
+        for face in faces:
+            x, y, w, h = face['box']
+            face = dict(face)
+            face['box'] = [int(round(x * scale_x)), int(round(y * scale_y)),
+                           int(round(w * scale_x)), int(round(h * scale_y))]
+            face['keypoints'] = {
+                name: (int(round(px * scale_x)), int(round(py * scale_y)))
+                for name, (px, py) in face.get('keypoints', {}).items()
+            }
+            mapped.append(face)
+        return mapped
+
+    def detect_faces(self, image: Union[Image.Image, DecodedImage],
+                     detector: Optional[str] = None) -> List[dict]:
         """
         检测图像中的人脸
 
+        若设置了FACE_DETECTION_MAX_SIDE，检测在缩小后的图像上进行，
+        返回的坐标已映射回原图。全分辨率尚未解码的JPEG直接按缩小比例解码。
+
         Args:
-            image: PIL图像对象
+            image: PIL图像或DecodedImage
+            detector: 检测器后端名称，默认使用FACE_DETECTOR_BACKEND
 
         Returns:
-            人脸检测结果列表，每个元素包含box和keypoints
+            人脸检测结果列表，每个元素包含box、keypoints和confidence
         """
-        img_array = np.array(image)
-        faces = self.detector.detect_faces(img_array)
-        return faces
-
-    def get_embedding(self, image: Image.Image, face_box: dict) -> np.ndarray:
+        backend = self.get_detector(detector)
+        img_array, scale_x, scale_y = as_decoded(image).detection_array(
+            self.detection_max_side)
+        with metrics.stage('detect'):
+            faces = backend.detect(img_array)
+            if scale_x == scale_y == 1.0:
+                return faces
+            return self._map_faces(faces, scale_x, scale_y)
+
+    @staticmethod
+    def _crop_face(img_array: np.ndarray, face_box: dict) -> Optional[np.ndarray]:
         """
-        提取人脸特征向量
+        裁剪并对齐单个人脸到FaceNet输入尺寸
 
         Args:
-            image: PIL图像对象
+            img_array: RGB图像数组
             face_box: 人脸边界框信息
 
         Returns:
-            128维特征向量
+            160x160x3的人脸数组，边界框无效时返回None
         """
-        img_array = np.array(image)
         x, y, w, h = face_box['box']
         # 确保坐标不越界
         x, y = max(0, x), max(0, y)
@@ -90,15 +303,100 @@ class FaceRecognitionSystem:
         if face.size == 0:
             return None
 
-        # 调整大小到160x160（FaceNet要求）
-        face_img = Image.fromarray(face)
+        # 调整大小到160x160（FaceNet要求）；只复制人脸区域，
+        # 连续内存的区域转换为PIL图像比带步长的视图快
+        face_img = Image.fromarray(np.ascontiguousarray(face))
         face_img = face_img.resize((160, 160))
-        face_array = np.array(face_img)
+        return np.asarray(face_img)
+
+    def _embed_crops(self, crops: np.ndarray) -> np.ndarray:
+        """
+        提取一批已对齐人脸的特征
+
+        经由调度器与并发请求的人脸合并为一次FaceNet前向计算。被分析的请求
+        在本线程直接推理，使cProfile与inference阶段计时覆盖FaceNet。
+
+        Args:
+            crops: 形状为(N, 160, 160, 3)的人脸数组
+
+        Returns:
+            形状为(N, D)的特征矩阵
+        """
+        if metrics.thread_profiled():
+            with metrics.stage('inference'):
+                return self._run_embedder(crops)
+        return self.scheduler.embed(crops)
+
+    def get_embeddings(self, image: Union[Image.Image, DecodedImage],
+                       faces: List[dict]) -> Tuple[List[dict], np.ndarray]:
+        """
+        批量提取图像中所有人脸的特征向量
+
+        人脸从共享的全分辨率数组上按视图裁剪，堆叠为一个批次送入FaceNet。
+
+        Args:
+            image: PIL图像或DecodedImage
+            faces: 人脸检测结果列表
+
+        Returns:
+            (成功裁剪的人脸列表, 形状为(M, D)的特征矩阵)，两者按行对齐
+        """
+        if not faces:
+            return [], np.empty((0, 0), dtype=np.float32)
+        img_array = as_decoded(image).array
+        kept = []
+        crops = []
+        with metrics.stage('crop'):
+            for face in faces:
+                crop = self._crop_face(img_array, face)
+                if crop is None:
+                    continue
+                kept.append(face)
+                crops.append(crop)
+
+        if not crops:
+            return [], np.empty((0, 0), dtype=np.float32)
+
+        with metrics.stage('embed'):
+            return kept, self._embed_crops(np.stack(crops))
+
+    def get_embedding(self, image: Union[Image.Image, DecodedImage],
+                      face_box: dict) -> np.ndarray:
+        """
+        提取人脸特征向量
 
-        # 扩展维度并提取特征
-        face_array = np.expand_dims(face_array, axis=0)
-        embedding = self.embedder.embeddings(face_array)
-        return embedding[0]
+        Args:
+            image: PIL图像或DecodedImage
+            face_box: 人脸边界框信息
+
+        Returns:
+            128维特征向量
+        """
+        kept, embeddings = self.get_embeddings(image, [face_box])
+        if not kept:
+            return None
+        return embeddings[0]
+
+    def match_faces(self, embeddings: np.ndarray,
+                    top_k: Optional[int] = None) -> List[List[dict]]:
+        """
+        批量检索人脸特征，一次矩阵运算完成所有查询
+
+        Args:
+            embeddings: 形状为(D,)或(M, D)的人脸特征
+            top_k: 每个人脸返回的候选数量，默认使用FACE_RECOGNITION_TOP_K
+
+        Returns:
+            每个人脸的候选列表，按距离升序排列，元素包含name和distance
+        """
+        with metrics.stage('match'):
+            indices, distances = self.index.search(self.gallery, embeddings,
+                                                   top_k or self.top_k)
+        names = self.gallery.names_at(indices)
+        return [
+            [{'name': name, 'distance': float(d)} for name, d in zip(row, dist)]
+            for row, dist in zip(names, distances)
+        ]
 
     def recognize_face(self, embedding: np.ndarray) -> Tuple[Optional[str], float]:
         """
@@ -110,35 +408,34 @@ class FaceRecognitionSystem:
         Returns:
             (识别出的姓名, 距离) 如果无法识别则返回(None, distance)
         """
-        if len(self.embeddings) == 0:
+        matches = self.match_faces(embedding, top_k=1)[0]
+        if not matches:
             return None, float('inf')
 
-        # 计算与所有已知人脸的欧氏距离
-        distances = []
-        for known_embedding in self.embeddings:
-            distance = np.linalg.norm(embedding - known_embedding)
-            distances.append(distance)
-
-        min_distance = min(distances)
-        min_index = distances.index(min_distance)
-
+        best = matches[0]
         # 如果距离小于阈值，则认为识别成功
-        if min_distance < self.threshold:
-            return self.names[min_index], min_distance
+        if best['distance'] < self.threshold:
+            return best['name'], best['distance']
         else:
-            return None, min_distance
+            return None, best['distance']
 
-    def enroll_face(self, image: Image.Image, name: str) -> bool:
+    def enroll_face(self, image: Union[Image.Image, DecodedImage], name: str,
+                    data: Optional[bytes] = None) -> bool:
         """
         录入新人脸
 
+        图像交给后台写入队列加密保存，是否等待落盘由IMAGE_WRITE_DURABILITY决定。
+
         Args:
-            image: PIL图像对象
+            image: PIL图像或DecodedImage
             name: 人员姓名
+            data: 上传的原始图像字节，已是JPEG时直接保存而不重新编码，
+                默认使用DecodedImage的原始字节
 
         Returns:
             是否成功录入
         """
+        image = self._decode(image)
         faces = self.detect_faces(image)
         if len(faces) == 0:
             return False
@@ -151,53 +448,193 @@ class FaceRecognitionSystem:
             return False
 
         # 保存加密的图像
-        img_bytes = io.BytesIO()
-        image.save(img_bytes, format='JPEG')
-        img_data = img_bytes.getvalue()
-        encrypted_data = self.encryption_manager.encrypt(img_data)
-
-        # 生成唯一文件名
-        import time
-        timestamp = int(time.time() * 1000)
-        filename = f"{name}_{timestamp}.enc"
-        filepath = os.path.join(self.images_dir, filename)
-
-        with open(filepath, 'wb') as f:
-            f.write(encrypted_data)
+        if data is None:
+            data = image.data if image.data is not None else image.image
+        self.image_writer.submit(name, data)
 
         # 添加到数据库
-        self.names.append(name)
-        self.embeddings.append(embedding)
-        self._save_database()
+        self.add_faces([name], embedding[np.newaxis])
 
         return True
 
-    def recognize_image(self, image: Image.Image) -> List[dict]:
+    def store_image(self, name: Optional[str], data: bytes,
+                    filename: Optional[str] = None, fsync: bool = False) -> str:
+        """
+        加密并保存人脸图像
+
+        Args:
+            name: 人员姓名，指定filename时可为None
+            data: 图像文件的原始字节
+            filename: 保存的文件名，默认由image_filename按姓名生成唯一文件名
+            fsync: 是否在返回前将文件刷到磁盘
+
+        Returns:
+            加密文件路径
+        """
+        if filename is None:
+            filename = image_filename(name)
+        filepath = os.path.join(self.images_dir, filename)
+
+        encrypted_data = self.encryption_manager.encrypt(data)
+        # 先写临时文件再原子替换，读取方不会看到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{filename}.', suffix='.tmp',
+                                        dir=self.images_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encrypted_data)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if fsync:
+            # 同步目录项，保证替换后的文件名在断电后仍然存在
+            dir_fd = os.open(self.images_dir, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        return filepath
+
+    def add_faces(self, names: List[str], embeddings: np.ndarray):
+        """
+        批量加入特征库，整批只保存一次数据库
+
+        追加与保存在写锁内完成，并发录入不会丢失行或交错写入数据库文件。
+
+        Args:
+            names: 姓名列表
+            embeddings: 形状为(N, D)的特征矩阵
+        """
+        with self.write_lock:
+            self.gallery.extend(names, embeddings)
+            self._save_database()
+
+    def recognize_image(self, image: Union[Image.Image, DecodedImage],
+                        detector: Optional[str] = None,
+                        use_cache: bool = True) -> List[dict]:
         """
         识别图像中的所有人脸
 
         Args:
-            image: PIL图像对象
+            image: PIL图像或DecodedImage
+            detector: 检测器后端名称，默认使用FACE_DETECTOR_BACKEND
+            use_cache: 是否查找和写入特征缓存
 
         Returns:
             识别结果列表，每个元素包含name, box, confidence
         """
-        faces = self.detect_faces(image)
+        image = self._decode(image)
+        key = None
+        if use_cache and self.embedding_cache.enabled:
+            key = image_key(image.array, detector or self.detector_backend,
+                            self.detection_max_side)
+            entry = self.embedding_cache.get(key)
+            if entry is not None:
+                return self._cached_results(entry)
+
+        faces = self.detect_faces(image, detector)
+        metrics.observe(metrics.FACES_PER_FRAME, len(faces))
+        version = self.gallery.version
+        detected, embeddings = self.get_embeddings(image, faces)
         results = []
+        if detected:
+            all_matches = self.match_faces(embeddings)
+            results = [self._make_result(face, matches)
+                       for face, matches in zip(detected, all_matches)]
 
-        for face in faces:
-            embedding = self.get_embedding(image, face)
-            if embedding is None:
-                continue
+        if key is not None:
+            self.embedding_cache.put(key, CacheEntry(detected, embeddings,
+                                                     results, version))
+        return [dict(result) for result in results]
+
+    def _cached_results(self, entry: CacheEntry) -> List[dict]:
+        """
+        由缓存项生成识别结果，特征库变化后用缓存的特征重新匹配
+
+        Args:
+            entry: 缓存项
 
-            name, distance = self.recognize_face(embedding)
-            box = face['box']
+        Returns:
+            识别结果列表
+        """
+        version = self.gallery.version
+        if entry.version != version and entry.faces:
+            all_matches = self.match_faces(entry.embeddings)
+            entry.results = [self._make_result(face, matches)
+                             for face, matches in zip(entry.faces, all_matches)]
+            entry.version = version
+        return [dict(result) for result in entry.results]
+
+    def _make_result(self, face: dict, matches: List[dict]) -> dict:
+        """
+        根据候选列表生成单个人脸的识别结果
+
+        Args:
+            face: 人脸检测结果
+            matches: 该人脸的候选列表
+
+        Returns:
+            包含name, box, confidence, matches的结果字典
+        """
+        name, distance = None, float('inf')
+        if matches:
+            distance = matches[0]['distance']
+            if distance < self.threshold:
+                name = matches[0]['name']
+
+        return {
+            'name': name if name else 'Unknown',
+            'box': face['box'],
+            'confidence': max(0, 1 - distance),  # 转换为置信度
+            'matches': matches
+        }
+
+    def recognize_frame(self, image: Union[Image.Image, DecodedImage],
+                        tracker: FaceTracker,
+                        detector: Optional[str] = None) -> Tuple[List[dict], bool]:
+        """
+        识别视频流中的一帧
 
-            results.append({
-                'name': name if name else 'Unknown',
-                'box': box,
-                'confidence': max(0, 1 - distance)  # 转换为置信度
-            })
+        关键帧使用完整检测并重新识别所有人脸；其余帧使用跟踪器的快速检测后端，
+        与已有轨迹关联上的人脸直接复用缓存的身份，只对新出现的人脸提取特征。
+        非关键帧只在出现新人脸时才解码全分辨率图像。
 
-        return results
+        Args:
+            image: PIL图像或DecodedImage
+            tracker: 该视频流会话的跟踪器
+            detector: 关键帧使用的检测器后端名称，默认使用FACE_DETECTOR_BACKEND
 
+        Returns:
+            (识别结果列表, 是否为关键帧)，结果额外包含track_id
+        """
+        image = as_decoded(image)
+        with tracker.lock:
+            keyframe = tracker.is_keyframe()
+            if keyframe:
+                image.decode()
+            backend = detector if keyframe else tracker.track_detector
+            faces = self.detect_faces(image, backend)
+            metrics.observe(metrics.FACES_PER_FRAME, len(faces))
+            matched, unmatched = tracker.associate(faces)
+
+            results = [None] * len(faces)
+            if keyframe:
+                pending = list(range(len(faces)))
+            else:
+                pending = unmatched
+                for face_index, track in matched.items():
+                    box = faces[face_index]['box']
+                    results[face_index] = dict(track.result, box=box)
+
+            kept, embeddings = self.get_embeddings(image, [faces[i] for i in pending])
+            if kept:
+                positions = {id(faces[i]): i for i in pending}
+                for face, matches in zip(kept, self.match_faces(embeddings)):
+                    results[positions[id(face)]] = self._make_result(face, matches)
+
+            tracker.update(faces, results, matched)
+            return [result for result in results if result is not None], keyframe
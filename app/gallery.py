@@ -0,0 +1,198 @@
+"""
+人脸特征库模块
+以连续的float32矩阵保存归一化后的人脸特征，通过矩阵运算一次完成检索
+"""
+import numpy as np
+from typing import Iterable, Tuple
+
+
+def select_top_k(similarities: np.ndarray,
+                 k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    从相似度矩阵中按行选出最大的k个元素
+
+    Args:
+        similarities: 形状为(M, N)的余弦相似度
+        k: 每行保留的数量
+
+    Returns:
+        (列号, 欧氏距离)，形状均为(M, min(k, N))，按距离升序排列
+    """
+    n = similarities.shape[1]
+    k = max(1, min(k, n))
+    if k < n:
+        indices = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(n), similarities.shape)
+    top = np.take_along_axis(similarities, indices, axis=1)
+    order = np.argsort(-top, axis=1, kind='stable')
+    indices = np.take_along_axis(indices, order, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+
+    # 对归一化向量有 ||q - g||^2 = 2 - 2 q·g
+    distances = np.sqrt(np.maximum(2.0 - 2.0 * top, 0.0))
+    return indices, distances
+
+
+class EmbeddingGallery:
+    """人脸特征库：归一化特征矩阵与按行对齐的姓名数组"""
+
+    def __init__(self, capacity: int = 1024):
+        """
+        初始化特征库
+
+        Args:
+            capacity: 初始预分配的行数，不足时按倍数扩容
+        """
+        self._initial_capacity = max(1, capacity)
+        self._matrix = None
+        self._names = np.empty(0, dtype=object)
+        self._size = 0
+        self._version = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def version(self) -> int:
+        """特征库版本号，每次内容变化时递增，用于使缓存的识别结果失效"""
+        return self._version
+
+    @property
+    def dim(self) -> int:
+        """特征维度，特征库为空时为0"""
+        return 0 if self._matrix is None else self._matrix.shape[1]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """已归一化的特征矩阵 (N, D)，为内部缓冲区的连续视图"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    @property
+    def names(self) -> np.ndarray:
+        """与特征矩阵逐行对齐的姓名数组"""
+        return self._names[:self._size]
+
+    def names_at(self, indices: np.ndarray) -> np.ndarray:
+        """
+        按行号查找姓名
+
+        Args:
+            indices: 行号数组
+
+        Returns:
+            与indices形状相同的姓名数组
+        """
+        return self._names[np.asarray(indices)]
+
+    def vectors(self, rows) -> np.ndarray:
+        """
+        读取指定行的特征
+
+        Args:
+            rows: 行号数组或切片
+
+        Returns:
+            float32类型的特征
+        """
+        return self.matrix[rows]
+
+    @staticmethod
+    def normalize(embeddings: np.ndarray) -> np.ndarray:
+        """
+        将特征向量按行做L2归一化
+
+        Args:
+            embeddings: 形状为(D,)或(N, D)的特征
+
+        Returns:
+            float32类型的(N, D)归一化矩阵
+        """
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    def _reserve(self, size: int, dim: int):
+        """确保缓冲区至少能容纳size行"""
+        if self._matrix is None:
+            capacity = max(self._initial_capacity, size)
+            self._matrix = np.empty((capacity, dim), dtype=np.float32)
+            self._names = np.empty(capacity, dtype=object)
+            return
+
+        if dim != self.dim:
+            raise ValueError(f"特征维度不匹配: 期望 {self.dim}, 实际 {dim}")
+
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        matrix = np.empty((capacity, dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        names = np.empty(capacity, dtype=object)
+        names[:self._size] = self._names[:self._size]
+        self._matrix, self._names = matrix, names
+
+    def add(self, name: str, embedding: np.ndarray):
+        """
+        添加一条人脸特征
+
+        Args:
+            name: 人员姓名
+            embedding: 特征向量
+        """
+        self.extend([name], np.atleast_2d(embedding))
+
+    def extend(self, names: Iterable[str], embeddings: np.ndarray):
+        """
+        批量添加人脸特征
+
+        Args:
+            names: 姓名序列
+            embeddings: 形状为(N, D)的特征矩阵
+        """
+        names = [str(name) for name in names]
+        if len(names) == 0:
+            return
+        vectors = self.normalize(embeddings)
+        if len(names) != len(vectors):
+            raise ValueError("姓名数量与特征数量不一致")
+
+        start, end = self._size, self._size + len(names)
+        self._reserve(end, vectors.shape[1])
+        self._matrix[start:end] = vectors
+        self._names[start:end] = names
+        self._size = end
+        self._version += 1
+
+    def clear(self):
+        """清空特征库"""
+        self._matrix = None
+        self._names = np.empty(0, dtype=object)
+        self._size = 0
+        self._version += 1
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索与查询特征最接近的k条记录
+
+        对归一化向量有 ||q - g||^2 = 2 - 2 q·g，因此一次矩阵乘法即可得到
+        全部欧氏距离。
+
+        Args:
+            queries: 形状为(D,)或(M, D)的查询特征
+            k: 每个查询返回的候选数量
+
+        Returns:
+            (indices, distances)，形状均为(M, k')，按距离升序排列，
+            其中k' = min(k, 特征库大小)
+        """
+        queries = self.normalize(queries)
+        if self._size == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        return select_top_k(queries @ self.matrix.T, k)
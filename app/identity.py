@@ -0,0 +1,184 @@
+"""
+身份级检索模块
+将同一人的多条特征（模板）聚合为一个身份：每个身份有稳定的编号和归一化的质心。
+检索时先比较质心选出候选身份，再只在候选身份的模板中精确重排
+"""
+import os
+import threading
+import numpy as np
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from app.gallery import EmbeddingGallery, select_top_k
+
+load_dotenv()
+
+
+class IdentityIndex:
+    """身份索引：质心粗排 + 模板精排，每个身份只返回最相近的一条模板"""
+
+    name = 'identity'
+
+    def __init__(self, candidates: Optional[int] = None):
+        """
+        初始化身份索引
+
+        Args:
+            candidates: 质心粗排后保留的候选身份数，越大越接近精确检索，
+                默认读取FACE_IDENTITY_CANDIDATES
+        """
+        if candidates is None:
+            candidates = int(os.getenv('FACE_IDENTITY_CANDIDATES', '16'))
+        self.candidates = max(1, candidates)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """清空索引状态"""
+        self.count = 0
+        self._ids = {}
+        self._names: List[str] = []
+        self._templates: List[np.ndarray] = []
+        self._template_counts = np.zeros(0, dtype=np.int64)
+        self._sums = None
+        self.centroids = None
+
+    def __len__(self) -> int:
+        """身份数量"""
+        return len(self._names)
+
+    def identity_id(self, name: str) -> Optional[int]:
+        """
+        查询姓名对应的身份编号
+
+        编号按首次录入顺序分配，特征库只追加，因此重新加载后保持不变。
+
+        Args:
+            name: 人员姓名
+
+        Returns:
+            身份编号，未录入时返回None
+        """
+        return self._ids.get(name)
+
+    def identities(self) -> List[dict]:
+        """所有身份的编号、姓名和模板数量"""
+        return [
+            {'identity_id': i, 'name': name, 'templates': int(count)}
+            for i, (name, count) in enumerate(zip(self._names, self._template_counts))
+        ]
+
+    def save(self):
+        """质心可由特征库快速重建，无需持久化"""
+
+    def _grow(self, num_ids: int, dim: int):
+        """确保身份级数组能容纳num_ids个身份"""
+        capacity = 0 if self._sums is None else len(self._sums)
+        if num_ids <= capacity:
+            return
+        capacity = max(16, capacity)
+        while capacity < num_ids:
+            capacity *= 2
+        sums = np.zeros((capacity, dim), dtype=np.float32)
+        counts = np.zeros(capacity, dtype=np.int64)
+        centroids = np.zeros((capacity, dim), dtype=np.float32)
+        if self._sums is not None:
+            # 调用时新身份已加入_names，旧数组的全部容量即为已有身份的上界
+            old = len(self._sums)
+            sums[:old] = self._sums
+            counts[:old] = self._template_counts
+            centroids[:old] = self.centroids
+        self._sums, self._template_counts, self.centroids = sums, counts, centroids
+
+    def sync(self, gallery: EmbeddingGallery):
+        """
+        将特征库中新增的模板归入对应身份并更新质心
+
+        Args:
+            gallery: 人脸特征库
+        """
+        size = len(gallery)
+        if size == self.count:
+            return
+        with self._lock:
+            if size < self.count:
+                # 特征库被重新加载，旧索引失效
+                self._reset()
+            start = self.count
+            names = gallery.names_at(np.arange(start, size))
+            vectors = gallery.vectors(slice(start, size))
+
+            ids = np.empty(len(names), dtype=np.int64)
+            for i, name in enumerate(names):
+                identity = self._ids.get(name)
+                if identity is None:
+                    identity = self._ids[name] = len(self._names)
+                    self._names.append(name)
+                    self._templates.append(np.empty(0, dtype=np.int64))
+                ids[i] = identity
+            self._grow(len(self._names), vectors.shape[1])
+
+            # 按身份分组，一次求出各组的特征之和
+            order = np.argsort(ids, kind='stable')
+            touched, bounds = np.unique(ids[order], return_index=True)
+            self._sums[touched] += np.add.reduceat(vectors[order], bounds, axis=0)
+            ends = np.append(bounds[1:], len(order))
+            for identity, lo, hi in zip(touched, bounds, ends):
+                self._templates[identity] = np.concatenate(
+                    [self._templates[identity], order[lo:hi] + start])
+                self._template_counts[identity] += hi - lo
+            self.centroids[touched] = EmbeddingGallery.normalize(self._sums[touched])
+            self.count = size
+
+    def search(self, gallery: EmbeddingGallery, queries: np.ndarray,
+               k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索最接近的k个身份
+
+        Args:
+            gallery: 人脸特征库
+            queries: 形状为(D,)或(M, D)的查询特征
+            k: 每个查询返回的身份数量
+
+        Returns:
+            (indices, distances)，indices为各身份中最相近模板的行号，按距离升序排列
+        """
+        self.sync(gallery)
+        queries = gallery.normalize(queries)
+        # 同步会原地更新质心与模板计数，在锁内取快照，之后只使用快照
+        with self._lock:
+            num_ids, count = len(self._names), self.count
+            templates = list(self._templates)
+            counts = self._template_counts[:num_ids].copy()
+            centroids = None if self.centroids is None else \
+                self.centroids[:num_ids].copy()
+        if num_ids == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        if count > len(gallery):
+            # 同步之后特征库被重新加载，快照中的行号已失效，本次退化为精确检索
+            return gallery.search(queries, k)
+
+        k = max(1, min(k, num_ids))
+        num_candidates = min(max(self.candidates, k), num_ids)
+        similarities = queries @ centroids.T
+        if num_candidates < num_ids:
+            candidates = np.argpartition(-similarities, num_candidates - 1,
+                                         axis=1)[:, :num_candidates]
+        else:
+            candidates = np.broadcast_to(np.arange(num_ids), similarities.shape)
+
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        for i, query in enumerate(queries):
+            sizes = counts[candidates[i]]
+            rows = np.concatenate([templates[j] for j in candidates[i]])
+            scores = gallery.vectors(rows) @ query
+            # 每个候选身份取最相近的一条模板
+            segments = np.repeat(np.arange(len(sizes)), sizes)
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            best = np.lexsort((-scores, segments))[starts]
+            top, dist = select_top_k(scores[best][np.newaxis], k)
+            indices[i] = rows[best[top[0]]]
+            distances[i] = dist[0]
+
+        return indices, distances
@@ -0,0 +1,114 @@
+"""
+图像解码模块
+每个请求的图像只解码一次：全分辨率RGB数组在首次使用时生成并在检测、缓存键与人脸裁剪间共享；
+只需要检测分辨率时（如视频流的非关键帧），JPEG以draft模式按1/2、1/4或1/8比例直接解码
+"""
+import io
+from typing import Dict, Tuple, Union
+import numpy as np
+from PIL import Image
+from app import metrics
+from app.persistence import JPEG_MAGIC
+
+# 按扩展名识别的图像文件格式（批量录入、批量识别与加解密工具共用）
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+
+class DecodedImage:
+    """按需解码并缓存像素数组的图像"""
+
+    def __init__(self, source: Union[bytes, Image.Image]):
+        """
+        只读取图像头，像素在首次使用时解码
+
+        Args:
+            source: 上传的原始图像字节或PIL图像
+        """
+        if isinstance(source, bytes):
+            self.data = source
+            self._image = Image.open(io.BytesIO(source))
+        else:
+            self.data = None
+            self._image = source
+        self.size = self._image.size
+        self._array = None
+        self._reduced: Dict[int, Tuple[np.ndarray, float, float]] = {}
+
+    @property
+    def is_jpeg(self) -> bool:
+        return self.data is not None and self.data.startswith(JPEG_MAGIC)
+
+    @property
+    def decoded(self) -> bool:
+        return self._array is not None
+
+    @property
+    def image(self) -> Image.Image:
+        """全分辨率RGB图像"""
+        self.decode()
+        return self._image
+
+    @property
+    def array(self) -> np.ndarray:
+        """全分辨率RGB数组（只读，各处理阶段共享）"""
+        self.decode()
+        return self._array
+
+    def __array__(self, dtype=None):
+        return self.array if dtype is None else self.array.astype(dtype)
+
+    def decode(self) -> 'DecodedImage':
+        """解码全分辨率像素、转换为RGB并生成数组，多次调用只解码一次"""
+        if self._array is None:
+            with metrics.stage('decode'):
+                self._image.load()
+                if self._image.mode != 'RGB':
+                    self._image = self._image.convert('RGB')
+                array = np.asarray(self._image)
+                array.flags.writeable = False
+            self._array = array
+        return self
+
+    def detection_array(self, max_side: int) -> Tuple[np.ndarray, float, float]:
+        """
+        检测用的图像数组，长边不超过max_side
+
+        全分辨率尚未解码的JPEG以draft模式缩小解码，否则由全分辨率图像缩小。
+
+        Args:
+            max_side: 长边上限，0表示不缩放
+
+        Returns:
+            (图像数组, 原图宽度 / 数组宽度, 原图高度 / 数组高度)
+        """
+        width, height = self.size
+        if max_side <= 0 or max(width, height) <= max_side:
+            return self.array, 1.0, 1.0
+        if max_side in self._reduced:
+            return self._reduced[max_side]
+
+        ratio = max_side / max(width, height)
+        size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+        if not self.decoded and self.is_jpeg:
+            with metrics.stage('decode'):
+                small = Image.open(io.BytesIO(self.data))
+                # draft选择不小于目标尺寸的最小缩放比例，由解码器直接输出缩小的图像
+                small.draft('RGB', size)
+                small.load()
+                if small.mode != 'RGB':
+                    small = small.convert('RGB')
+        else:
+            small = self.image
+        if small.size != size:
+            # reducing_gap=1.0先按整数倍盒式缩小，再对小图双线性插值
+            small = small.resize(size, Image.BILINEAR, reducing_gap=1.0)
+        reduced = self._reduced[max_side] = (np.asarray(small), width / size[0],
+                                             height / size[1])
+        return reduced
+
+
+def as_decoded(image: Union[DecodedImage, Image.Image, bytes]) -> DecodedImage:
+    """将PIL图像或图像字节包装为DecodedImage，已包装的对象原样返回"""
+    if isinstance(image, DecodedImage):
+        return image
+    return DecodedImage(image)
@@ -0,0 +1,444 @@
+"""
+人脸特征索引模块
+在特征库之上提供可替换的检索后端：精确检索、IVF倒排索引以及可选的HNSW图索引
+"""
+import hashlib
+import os
+import threading
+import numpy as np
+from scipy import sparse
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+from app.gallery import EmbeddingGallery, select_top_k
+
+load_dotenv()
+
+# 计算特征库指纹时均匀抽样的行数
+_FINGERPRINT_SAMPLES = 64
+
+
+def _empty_result(num_queries: int) -> Tuple[np.ndarray, np.ndarray]:
+    """特征库为空时的检索结果"""
+    empty = np.empty((num_queries, 0))
+    return empty.astype(np.int64), empty.astype(np.float32)
+
+
+def gallery_fingerprint(gallery: EmbeddingGallery, rows: int) -> str:
+    """
+    特征库前rows行的指纹
+
+    均匀抽样若干行的姓名与特征求哈希。行数相同但内容不同（如重建后的特征库）
+    时指纹不同，持久化的索引据此判断是否仍然有效。
+
+    Args:
+        gallery: 人脸特征库
+        rows: 参与计算的前缀行数
+
+    Returns:
+        十六进制哈希，rows为0时为空字符串
+    """
+    if rows <= 0:
+        return ''
+    sample = np.unique(np.linspace(0, rows - 1, _FINGERPRINT_SAMPLES).astype(np.int64))
+    digest = hashlib.sha1()
+    for name in gallery.names_at(sample):
+        digest.update(str(name).encode('utf-8') + b'\0')
+    digest.update(np.ascontiguousarray(gallery.vectors(sample), dtype=np.float32))
+    return digest.hexdigest()
+
+
+class ExactIndex:
+    """精确检索：对全部特征做一次矩阵乘法"""
+
+    name = 'exact'
+
+    def search(self, gallery: EmbeddingGallery, queries: np.ndarray,
+               k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索最接近的k条记录
+
+        Args:
+            gallery: 人脸特征库
+            queries: 形状为(D,)或(M, D)的查询特征
+            k: 每个查询返回的候选数量
+
+        Returns:
+            (indices, distances)，按距离升序排列
+        """
+        return gallery.search(queries, k)
+
+    def save(self):
+        """精确检索无需持久化"""
+
+
+class IVFIndex:
+    """IVF倒排索引：先找最近的nprobe个聚类中心，只在这些簇内精确比较
+
+    新录入的特征直接归入最近的簇；特征库增长到上次训练规模的数倍后
+    在后台线程重新训练，训练完成前继续使用旧索引。
+    """
+
+    name = 'ivf'
+
+    def __init__(self, path: Optional[str] = None, nprobe: Optional[int] = None,
+                 nlist: Optional[int] = None, min_train_size: Optional[int] = None):
+        """
+        初始化IVF索引
+
+        Args:
+            path: 索引持久化路径，为None时不保存
+            nprobe: 每次检索访问的簇数，越大召回率越高、延迟越大，
+                默认读取FACE_INDEX_NPROBE
+            nlist: 聚类中心数量，0表示按sqrt(N)自动选择，默认读取FACE_INDEX_NLIST
+            min_train_size: 特征数达到此值才训练，此前退化为精确检索，
+                默认读取FACE_INDEX_MIN_TRAIN
+        """
+        if nprobe is None:
+            nprobe = int(os.getenv('FACE_INDEX_NPROBE', '8'))
+        if nlist is None:
+            nlist = int(os.getenv('FACE_INDEX_NLIST', '0'))
+        if min_train_size is None:
+            min_train_size = int(os.getenv('FACE_INDEX_MIN_TRAIN', '4096'))
+
+        self.path = path
+        self.nprobe = max(1, nprobe)
+        self.nlist = max(0, nlist)
+        self.min_train_size = max(1, min_train_size)
+        self._lock = threading.Lock()
+        self._training = None
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        """清空索引状态"""
+        self.centroids = None
+        self.trained_size = 0
+        self.count = 0
+        self.fingerprint = ''
+        self._verified = True
+        self._lists = []
+        self._list_sizes = np.zeros(0, dtype=np.int64)
+
+    def _load(self):
+        """从文件加载已训练的聚类中心与簇分配，首次同步时再核对特征库指纹"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        data = np.load(self.path)
+        if 'fingerprint' not in data:
+            # 旧版本保存的索引无法核对内容，重新训练
+            return
+        self._install(data['centroids'], data['assignments'],
+                      str(data['fingerprint']))
+        self.trained_size = int(data['trained_size'])
+        self._verified = False
+
+    def save(self):
+        """保存聚类中心与簇分配"""
+        if not self.path or self.centroids is None:
+            return
+        with self._lock:
+            centroids = self.centroids
+            fingerprint = self.fingerprint
+            assignments = np.empty(self.count, dtype=np.int32)
+            for list_id, rows in enumerate(self._lists):
+                assignments[rows[:self._list_sizes[list_id]]] = list_id
+        tmp_path = self.path + '.tmp.npz'
+        # 指纹对应训练时的前trained_size行，即assignments的前缀
+        np.savez(tmp_path, centroids=centroids, assignments=assignments,
+                 fingerprint=fingerprint, trained_size=self.trained_size)
+        os.replace(tmp_path, self.path)
+
+    def _install(self, centroids: np.ndarray, assignments: np.ndarray,
+                 fingerprint: str):
+        """根据簇分配重建倒排表"""
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))
+        lists = [order[bounds[i]:bounds[i + 1]].astype(np.int64)
+                 for i in range(len(centroids))]
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self._lists = lists
+        self._list_sizes = np.array([len(rows) for rows in lists], dtype=np.int64)
+        self.count = len(assignments)
+        self.trained_size = len(assignments)
+        self.fingerprint = fingerprint
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray,
+                chunk: int = 65536) -> np.ndarray:
+        """分块计算每个向量最近的聚类中心"""
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk):
+            block = np.asarray(vectors[start:start + chunk], dtype=np.float32)
+            assignments[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def _train(self, matrix: np.ndarray,
+               iterations: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """在特征子集上做球面k-means，并为全部特征分配簇"""
+        size = len(matrix)
+        nlist = self.nlist or int(np.sqrt(size))
+        nlist = max(1, min(nlist, size))
+        rng = np.random.default_rng(0)
+        sample_size = min(size, nlist * 64)
+        sample = np.asarray(matrix[np.sort(rng.choice(size, sample_size,
+                                                      replace=False))])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = self._assign(sample, centroids)
+            # 用稀疏的one-hot矩阵一次求出各簇向量之和
+            membership = sparse.csr_matrix(
+                (np.ones(sample_size, dtype=np.float32),
+                 (labels, np.arange(sample_size))), shape=(nlist, sample_size))
+            sums = np.asarray(membership @ sample)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            # 空簇重新随机初始化
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = EmbeddingGallery.normalize(sums)
+
+        return centroids, self._assign(matrix, centroids)
+
+    def _train_async(self, matrix: np.ndarray, fingerprint: str):
+        """在后台线程训练，完成后替换当前索引"""
+        def run():
+            centroids, assignments = self._train(matrix)
+            with self._lock:
+                self._install(centroids, assignments, fingerprint)
+                self._training = None
+            self.save()
+
+        self._training = threading.Thread(target=run, name='ivf-train', daemon=True)
+        self._training.start()
+
+    def wait_for_training(self):
+        """等待后台训练结束"""
+        thread = self._training
+        if thread is not None:
+            thread.join()
+
+    def _append(self, start: int, vectors: np.ndarray):
+        """将从start行开始新增的特征归入最近的簇"""
+        assignments = self._assign(vectors, self.centroids)
+        for list_id in np.unique(assignments):
+            rows = np.flatnonzero(assignments == list_id) + start
+            size = self._list_sizes[list_id]
+            buffer = self._lists[list_id]
+            if size + len(rows) > len(buffer):
+                grown = np.empty(max(16, (size + len(rows)) * 2), dtype=np.int64)
+                grown[:size] = buffer[:size]
+                buffer = grown
+            buffer[size:size + len(rows)] = rows
+            self._lists[list_id] = buffer
+            self._list_sizes[list_id] = size + len(rows)
+        self.count = start + len(vectors)
+
+    def sync(self, gallery: EmbeddingGallery):
+        """
+        将特征库中新增的记录插入索引
+
+        Args:
+            gallery: 人脸特征库
+        """
+        size = len(gallery)
+        if size == self.count and self._verified:
+            return
+        with self._lock:
+            if size < self.count:
+                # 特征库被重新加载，旧索引失效
+                self._reset()
+            if not self._verified:
+                # 从文件加载的索引只在训练时的行内容未变时沿用
+                if gallery_fingerprint(gallery, self.trained_size) != self.fingerprint:
+                    self._reset()
+                self._verified = True
+            if self.centroids is not None and size > self.count:
+                self._append(self.count, gallery.vectors(slice(self.count, size)))
+
+            untrained = self.centroids is None and size >= self.min_train_size
+            outgrown = self.trained_size and size >= self.trained_size * 4
+            if (untrained or outgrown) and self._training is None:
+                self._train_async(gallery.vectors(slice(0, size)),
+                                  gallery_fingerprint(gallery, size))
+
+    def search(self, gallery: EmbeddingGallery, queries: np.ndarray,
+               k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索最接近的k条记录
+
+        Args:
+            gallery: 人脸特征库
+            queries: 形状为(D,)或(M, D)的查询特征
+            k: 每个查询返回的候选数量
+
+        Returns:
+            (indices, distances)，按距离升序排列；索引尚未训练时为精确结果
+        """
+        self.sync(gallery)
+        # 后台训练与增量插入会替换或原地修改倒排表，在锁内取快照，之后只使用快照
+        with self._lock:
+            centroids, count = self.centroids, self.count
+            lists, sizes = list(self._lists), self._list_sizes.copy()
+        if centroids is None or count > len(gallery):
+            return gallery.search(queries, k)
+
+        queries = gallery.normalize(queries)
+        nprobe = min(self.nprobe, len(centroids))
+        probes = np.argpartition(-(queries @ centroids.T), nprobe - 1,
+                                 axis=1)[:, :nprobe]
+
+        k = max(1, min(k, count))
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([lists[j][:sizes[j]] for j in probes[i]])
+            if len(candidates) < k:
+                # 探测到的簇中候选不足，退化为精确检索
+                exact_indices, exact_distances = gallery.search(query, k)
+                indices[i], distances[i] = exact_indices[0], exact_distances[0]
+                continue
+            top, dist = select_top_k(query[np.newaxis] @ gallery.vectors(candidates).T,
+                                     k)
+            indices[i] = candidates[top[0]]
+            distances[i] = dist[0]
+
+        return indices, distances
+
+
+class HNSWIndex:
+    """HNSW图索引（需要安装可选依赖hnswlib）"""
+
+    name = 'hnsw'
+
+    def __init__(self, path: Optional[str] = None, ef: Optional[int] = None,
+                 m: int = 16, ef_construction: int = 200,
+                 save_every: Optional[int] = None):
+        """
+        初始化HNSW索引
+
+        Args:
+            path: 索引持久化路径，为None时不保存
+            ef: 检索时的候选队列长度，越大召回率越高、延迟越大，
+                默认读取FACE_INDEX_EF
+            m: 图中每个节点的邻居数
+            ef_construction: 建图时的候选队列长度
+            save_every: 每新增多少条记录保存一次，默认读取FACE_INDEX_SAVE_EVERY
+        """
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("HNSW索引需要安装hnswlib: pip install hnswlib") from e
+
+        if ef is None:
+            ef = int(os.getenv('FACE_INDEX_EF', '64'))
+        if save_every is None:
+            save_every = int(os.getenv('FACE_INDEX_SAVE_EVERY', '1000'))
+
+        self._hnswlib = hnswlib
+        self.path = path
+        self.ef = max(1, ef)
+        self.m = m
+        self.ef_construction = ef_construction
+        self.save_every = max(1, save_every)
+        self._lock = threading.Lock()
+        self._index = None
+        self._saved_count = 0
+        self.count = 0
+
+    def _create(self, dim: int, capacity: int, load: bool):
+        """创建图索引，load为True且存在持久化文件时从文件加载"""
+        index = self._hnswlib.Index(space='ip', dim=dim)
+        if load and self.path and os.path.exists(self.path):
+            index.load_index(self.path, max_elements=capacity)
+        else:
+            index.init_index(max_elements=capacity, M=self.m,
+                             ef_construction=self.ef_construction)
+        index.set_ef(self.ef)
+        self._index = index
+        self.count = index.get_current_count()
+        self._saved_count = self.count
+
+    def save(self):
+        """保存图索引"""
+        if not self.path or self._index is None:
+            return
+        with self._lock:
+            self._index.save_index(self.path)
+            self._saved_count = self.count
+
+    def sync(self, gallery: EmbeddingGallery):
+        """
+        将特征库中新增的记录插入图索引
+
+        Args:
+            gallery: 人脸特征库
+        """
+        size = len(gallery)
+        if self._index is not None and size == self.count:
+            return
+        with self._lock:
+            if size == 0:
+                return
+            if self._index is None:
+                self._create(gallery.dim, max(1024, size * 2), load=True)
+            if size < self.count:
+                # 特征库被重新加载，旧索引失效
+                self._create(gallery.dim, max(1024, size * 2), load=False)
+            if size > self._index.get_max_elements():
+                self._index.resize_index(size * 2)
+            if size > self.count:
+                rows = np.asarray(gallery.vectors(slice(self.count, size)))
+                self._index.add_items(rows, np.arange(self.count, size))
+                self.count = size
+
+        if self.count - self._saved_count >= self.save_every:
+            self.save()
+
+    def search(self, gallery: EmbeddingGallery, queries: np.ndarray,
+               k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索最接近的k条记录
+
+        Args:
+            gallery: 人脸特征库
+            queries: 形状为(D,)或(M, D)的查询特征
+            k: 每个查询返回的候选数量
+
+        Returns:
+            (indices, distances)，按距离升序排列
+        """
+        queries = gallery.normalize(queries)
+        self.sync(gallery)
+        if self.count == 0:
+            return _empty_result(len(queries))
+
+        k = max(1, min(k, self.count))
+        self._index.set_ef(max(self.ef, k))
+        labels, ip_distances = self._index.knn_query(queries, k=k)
+        # hnswlib的内积距离为 1 - q·g，换算为归一化向量的欧氏距离
+        distances = np.sqrt(np.maximum(2.0 * ip_distances, 0.0))
+        return labels.astype(np.int64), distances.astype(np.float32)
+
+
+def create_index(backend: Optional[str] = None, base_path: Optional[str] = None):
+    """
+    根据配置创建特征索引
+
+    Args:
+        backend: exact、ivf、hnsw或identity，默认读取FACE_INDEX_BACKEND
+        base_path: 索引文件路径前缀（与人脸数据库同目录同名）
+
+    Returns:
+        特征索引实例
+    """
+    if backend is None:
+        backend = os.getenv('FACE_INDEX_BACKEND', 'exact')
+    if backend == 'exact':
+        return ExactIndex()
+    if backend == 'ivf':
+        return IVFIndex(path=base_path + '.ivf.npz' if base_path else None)
+    if backend == 'hnsw':
+        return HNSWIndex(path=base_path + '.hnsw.bin' if base_path else None)
+    if backend == 'identity':
+        # 延迟导入，避免循环依赖
+        from app.identity import IdentityIndex
+        return IdentityIndex()
+    raise ValueError(f"未知的索引后端: {backend}")
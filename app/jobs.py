@@ -0,0 +1,74 @@
+"""
+后台任务模块
+在后台线程中运行批量录入、密钥轮换等长时间任务，并提供进度查询与取消
+"""
+import threading
+import uuid
+from typing import Iterable, Iterator, Optional
+
+
+def iter_batches(items: Iterable, size: int) -> Iterator[list]:
+    """将可迭代对象按固定大小分批"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BackgroundJob:
+    """
+    在后台线程中运行的任务
+
+    worker需提供 run(*args, **kwargs)、cancel()、cancelled 和 stats。
+    """
+
+    def __init__(self, worker, *args, name: str = 'background-job', **kwargs):
+        """
+        创建并启动任务
+
+        Args:
+            worker: 执行任务的对象
+            *args: 传给worker.run的位置参数
+            name: 线程名称
+            **kwargs: 传给worker.run的关键字参数
+        """
+        self.job_id = uuid.uuid4().hex
+        self.worker = worker
+        self.status = 'running'
+        self.error = None
+        self._thread = threading.Thread(target=self._run, args=args, kwargs=kwargs,
+                                        name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self, *args, **kwargs):
+        try:
+            self.worker.run(*args, **kwargs)
+            self.status = 'cancelled' if self.worker.cancelled else 'completed'
+        except Exception as e:
+            self.status = 'error'
+            self.error = str(e)
+
+    @property
+    def running(self) -> bool:
+        return self.status == 'running'
+
+    def cancel(self):
+        """请求在当前批次完成后停止"""
+        self.worker.cancel()
+
+    def join(self, timeout: Optional[float] = None):
+        """等待任务结束"""
+        self._thread.join(timeout)
+
+    def to_dict(self) -> dict:
+        """任务状态，用于API响应"""
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'error': self.error,
+            'stats': dict(self.worker.stats),
+        }
@@ -0,0 +1,163 @@
+"""
+密钥轮换模块
+用当前密钥在后台并行、限速地重新加密图像库中的所有加密文件。
+文件原子替换，轮换期间新旧密钥都能解密，API无需停机；进度日志按密钥指纹区分，
+中断后再次运行会从上次进度继续
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+from dotenv import load_dotenv
+from app.bulk_crypto import ENCRYPTED_SUFFIX
+from app.encryption import EncryptionManager
+from app.jobs import BackgroundJob, iter_batches
+
+load_dotenv()
+
+
+class RateLimiter:
+    """线程安全的速率限制器，按固定间隔放行"""
+
+    def __init__(self, rate: float):
+        """
+        Args:
+            rate: 每秒最多放行的次数，0表示不限速
+        """
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """等待直到允许下一次操作"""
+        if self.interval == 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(self._next, now) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def iter_encrypted_files(root: str) -> Iterator[str]:
+    """按固定顺序遍历目录中的加密文件"""
+    for current, dirs, files in os.walk(root):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.endswith(ENCRYPTED_SUFFIX):
+                yield os.path.join(current, filename)
+
+
+class KeyRotator:
+    """加密文件的密钥轮换"""
+
+    def __init__(self, manager: EncryptionManager, workers: Optional[int] = None,
+                 rate: Optional[float] = None, progress_path: Optional[str] = None):
+        """
+        初始化密钥轮换
+
+        Args:
+            manager: 已配置新旧密钥的加密管理器，第一个密钥为目标密钥
+            workers: 并行线程数，默认读取KEY_ROTATION_WORKERS
+            rate: 每秒最多处理的文件数（0为不限速），默认读取KEY_ROTATION_RATE
+            progress_path: 进度日志路径，默认在图像目录旁按密钥指纹命名
+        """
+        if workers is None:
+            workers = int(os.getenv('KEY_ROTATION_WORKERS', '4'))
+        if rate is None:
+            rate = float(os.getenv('KEY_ROTATION_RATE', '0'))
+
+        self.manager = manager
+        self.workers = max(1, workers)
+        # 每批完成后记录一次进度并检查是否取消
+        self.batch_size = self.workers * 16
+        self.limiter = RateLimiter(rate)
+        self.progress_path = progress_path
+        self.stats = {'rotated': 0, 'failed': 0, 'skipped': 0, 'elapsed': 0.0}
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """在当前批次完成后停止"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def default_progress_path(self, images_dir: str) -> str:
+        """进度日志默认路径，不同目标密钥的轮换互不影响"""
+        parent = os.path.dirname(os.path.abspath(images_dir))
+        return os.path.join(parent, f"key_rotation_{self.manager.key_fingerprint}.log")
+
+    def _rotate(self, path: str) -> str:
+        """轮换单个文件，返回状态rotated或failed"""
+        self.limiter.acquire()
+        try:
+            self.manager.rotate_file(path)
+            return 'rotated'
+        except Exception:
+            return 'failed'
+
+    def run(self, images_dir: str, resume: bool = True,
+            progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        轮换目录中的所有加密文件
+
+        Args:
+            images_dir: 加密图像目录
+            resume: 是否跳过进度日志中已轮换的文件
+            progress: 每批完成后以统计信息调用的回调
+
+        Returns:
+            统计信息：rotated、failed、skipped数量及耗时
+        """
+        progress_path = self.progress_path or self.default_progress_path(images_dir)
+        done = set()
+        if resume and os.path.exists(progress_path):
+            with open(progress_path, 'r', encoding='utf-8') as f:
+                done = {line.rstrip('\n') for line in f}
+        elif not resume and os.path.exists(progress_path):
+            os.remove(progress_path)
+
+        def pending():
+            for path in iter_encrypted_files(images_dir):
+                if path in done:
+                    self.stats['skipped'] += 1
+                    continue
+                yield path
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool, \
+                open(progress_path, 'a', encoding='utf-8') as log:
+            for batch in iter_batches(pending(), self.batch_size):
+                if self.cancelled:
+                    break
+                for path, status in zip(batch, pool.map(self._rotate, batch)):
+                    self.stats[status] += 1
+                    if status == 'rotated':
+                        log.write(path + '\n')
+                log.flush()
+                os.fsync(log.fileno())
+                self.stats['elapsed'] = time.time() - start
+                if progress is not None:
+                    progress(dict(self.stats))
+
+        self.stats['elapsed'] = time.time() - start
+        return dict(self.stats)
+
+
+class KeyRotationJob(BackgroundJob):
+    """在后台线程中运行的密钥轮换任务"""
+
+    def __init__(self, rotator: KeyRotator, images_dir: str, resume: bool = True):
+        """
+        创建并启动任务
+
+        Args:
+            rotator: 密钥轮换
+            images_dir: 加密图像目录
+            resume: 是否跳过已轮换的文件
+        """
+        super().__init__(rotator, images_dir, resume=resume, name='key-rotation')
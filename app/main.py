@@ -2,26 +2,109 @@
 FastAPI主应用
 提供人脸识别和录入的Web API
 """
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import (Depends, FastAPI, File, UploadFile, Form, Header,
+                     HTTPException, WebSocket, WebSocketDisconnect)
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
-from PIL import Image
-import io
+from fastapi.responses import (HTMLResponse, JSONResponse, PlainTextResponse,
+                               StreamingResponse)
 import base64
+import hmac
+from app import metrics
+from app.batch import iter_uploads
+from app.bulk_enroll import BulkEnroller, BulkEnrollJob
+from app.detectors import DETECTOR_BACKENDS
 from app.face_recognition import FaceRecognitionSystem
+from app.imaging import DecodedImage
+from app.executor import ExecutorBusyError, InferenceExecutor, LowPriorityGate
+from app.key_rotation import KeyRotationJob, KeyRotator
+from app.profiling import ProfilerBusyError, RequestProfiler
+from app.tracking import FaceTracker, StreamSessions
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-app = FastAPI(title="FaceNet人脸识别系统", version="1.0.0")
 
-# 初始化人脸识别系统
-face_system = FaceRecognitionSystem()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时在后台预热模型，服务可立即响应/health"""
+    if os.getenv('MODEL_WARMUP', 'true').lower() == 'true':
+        face_system.start_warmup()
+    yield
+    executor.shutdown(wait=False)
+    # 写完队列中尚未落盘的录入图像
+    face_system.image_writer.close()
+
+
+app = FastAPI(title="FaceNet人脸识别系统", version="1.0.0", lifespan=lifespan)
+
+# 初始化人脸识别系统（模型延迟加载），特征数据库与加密图像保存在FACE_DATA_DIR下
+data_dir = os.getenv('FACE_DATA_DIR', 'data')
+face_system = FaceRecognitionSystem(data_path=os.path.join(data_dir, 'faces.npz'),
+                                    images_dir=os.path.join(data_dir, 'images'))
+
+# 推理任务在有界线程池中执行，避免阻塞事件循环
+executor = InferenceExecutor()
+
+# 单请求分析，只有携带PROFILING_TOKEN的/recognize请求才会被分析
+profiler = RequestProfiler()
+
+# 视频流会话，每个客户端保存独立的人脸跟踪状态
+stream_sessions = StreamSessions()
+
+# 批量录入与密钥轮换端点要求携带该令牌（X-Admin-Token请求头），留空则禁用，
+# 此时只能使用scripts/bulk_enroll.py与scripts/rotate_keys.py
+admin_token = os.getenv('ADMIN_TOKEN', '')
+
+# 批量录入任务，同一时间只运行一个；API只能读取该根目录下的子目录
+bulk_jobs = {}
+bulk_enroll_root = os.getenv('BULK_ENROLL_ROOT', 'data/incoming')
+
+# 密钥轮换任务，同一时间只运行一个
+rotation_jobs = {}
+
+# 批量识别时每个请求同时处理的图像数，人脸特征由调度器跨图像合并推理
+batch_concurrency = max(1, int(os.getenv('BATCH_RECOGNIZE_CONCURRENCY', '8')))
+# 所有批量请求合计占用的推理线程上限，其余容量留给交互式请求
+batch_max_inflight = max(1, int(os.getenv('BATCH_RECOGNIZE_MAX_INFLIGHT',
+                                          str(max(1, executor.max_workers // 2)))))
+batch_gate = LowPriorityGate(executor, batch_max_inflight)
+
+# WebSocket连接允许排队等待处理的帧数，超出时丢弃最旧的帧
+ws_max_pending = max(1, int(os.getenv('FACE_STREAM_MAX_PENDING', '2')))
 
 # 挂载静态文件目录
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# 请求耗时与各阶段耗时直方图，队列深度等在抓取/metrics时读取
+app.add_middleware(metrics.RequestMetricsMiddleware)
+metrics.registry.gauge('face_gallery_size', 'Enrolled face templates',
+                       lambda: len(face_system.gallery))
+metrics.registry.gauge('face_executor_pending', 'Running and queued inference tasks',
+                       lambda: executor.pending)
+metrics.registry.gauge('face_scheduler_pending',
+                       'Embedding requests waiting to be batched',
+                       lambda: face_system.scheduler.pending)
+metrics.registry.gauge('face_image_writer_pending',
+                       'Enrolled images waiting to be written',
+                       lambda: face_system.image_writer.pending)
+metrics.registry.gauge('face_stream_sessions', 'Active video stream sessions',
+                       lambda: len(stream_sessions))
+metrics.registry.gauge('face_embedding_cache_bytes', 'Embedding cache memory usage',
+                       lambda: face_system.embedding_cache.stats()['bytes'])
+metrics.registry.gauge('face_model_ready', 'Whether models are loaded and warmed up',
+                       lambda: face_system.ready)
+
+
+def _check_detector(detector: Optional[str]):
+    """校验请求指定的人脸检测后端"""
+    if detector is not None and detector not in DETECTOR_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"未知的人脸检测后端: {detector}")
+
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -31,30 +114,54 @@ async def read_root():
 
 
 @app.post("/recognize")
-async def recognize(file: UploadFile = File(...)):
+async def recognize(file: UploadFile = File(...), detector: Optional[str] = None,
+                    profile: Optional[str] = None,
+                    x_profile_token: Optional[str] = Header(None)):
     """
     识别图像中的人脸
 
+    携带管理员令牌（X-Profile-Token请求头或profile查询参数）时，本次请求在
+    cProfile下执行，响应额外包含各阶段耗时与最耗时的函数。
+
     Args:
         file: 上传的图像文件
+        detector: 可选的人脸检测后端（mtcnn或opencv）
+        profile: 可选的分析令牌
+        x_profile_token: 可选的分析令牌（请求头）
 
     Returns:
         识别结果列表
     """
     try:
+        _check_detector(detector)
+
         # 读取图像
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
 
-        # 转换为RGB（如果需要）
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        token = x_profile_token or profile
+        if token is not None:
+            if not profiler.authorize(token):
+                raise HTTPException(status_code=403, detail="无效的分析令牌")
+            results, report = await executor.run(profiler.run, _profile_recognition,
+                                                 contents, detector)
+            return JSONResponse(content={"results": results, "profile": report})
+
+        # 只读取图像头，像素在推理线程中解码
+        image = _decode_image(contents)
 
-        # 执行识别
-        results = face_system.recognize_image(image)
+        # 在线程池中执行识别，使并发请求的人脸能被调度器合并为同一批次
+        results = await executor.run(face_system.recognize_image, image, detector)
 
         return JSONResponse(content={"results": results})
 
+    except HTTPException:
+        raise
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": "1"})
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -65,33 +172,254 @@ async def recognize_base64(data: dict):
     识别Base64编码的图像中的人脸
 
     Args:
-        data: 包含base64图像数据的字典
+        data: 包含base64图像数据和可选detector字段的字典
 
     Returns:
         识别结果列表
     """
     try:
+        detector = data.get('detector')
+        _check_detector(detector)
+
         # 解码Base64图像
         image_data = data.get('image', '')
         if ',' in image_data:
             image_data = image_data.split(',')[1]
 
         image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
-
-        # 转换为RGB
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        image = _decode_image(image_bytes)
 
-        # 执行识别
-        results = face_system.recognize_image(image)
+        # 在线程池中执行识别，使并发请求的人脸能被调度器合并为同一批次
+        results = await executor.run(face_system.recognize_image, image, detector)
 
         return JSONResponse(content={"results": results})
 
+    except HTTPException:
+        raise
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/recognize_stream")
+async def recognize_stream(data: dict):
+    """
+    识别视频流中的一帧
+
+    同一session_id的帧共享跟踪状态：只在关键帧做完整检测与识别，
+    其余帧对稳定的人脸轨迹复用已识别的身份。
+
+    Args:
+        data: 包含base64图像数据、可选session_id和detector字段的字典
+
+    Returns:
+        会话ID、是否为关键帧以及带track_id的识别结果列表
+    """
+    try:
+        detector = data.get('detector')
+        _check_detector(detector)
+        session_id, tracker = stream_sessions.get(data.get('session_id'))
+
+        # 解码Base64图像
+        image_data = data.get('image', '')
+        if ',' in image_data:
+            image_data = image_data.split(',')[1]
+
+        image_bytes = base64.b64decode(image_data)
+        image = _decode_image(image_bytes)
+
+        results, keyframe = await executor.run(
+            face_system.recognize_frame, image, tracker, detector)
+
+        return JSONResponse(content={
+            "session_id": session_id,
+            "keyframe": keyframe,
+            "results": results
+        })
+
+    except HTTPException:
+        raise
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.delete("/recognize_stream/{session_id}")
+async def close_stream(session_id: str):
+    """结束视频流会话并释放跟踪状态"""
+    return {"closed": stream_sessions.close(session_id)}
+
+
+def _decode_image(data: bytes) -> DecodedImage:
+    """读取图像头，像素在首次使用时解码（在线程池中进行）"""
+    return DecodedImage(data)
+
+
+def _recognize_bytes(data: bytes, detector: Optional[str]) -> List[dict]:
+    """解码图像字节并识别（在线程池中执行）"""
+    return face_system.recognize_image(_decode_image(data), detector)
+
+
+def _profile_recognition(data: bytes, detector: Optional[str]) -> List[dict]:
+    """被分析的识别：解码也在分析范围内，并跳过特征缓存以反映真实开销"""
+    return face_system.recognize_image(_decode_image(data), detector, use_cache=False)
+
+
+async def _recognize_batch_item(index: int, filename: str, data: bytes,
+                                detector: Optional[str]) -> dict:
+    """
+    识别批量请求中的一张图像
+
+    批量任务优先级低于交互式请求：只在有空闲推理线程且批量在途数未达到
+    batch_max_inflight时提交，从不占用排队名额，否则等待而不是失败。
+    """
+    try:
+        results = await batch_gate.run(_recognize_bytes, data, detector)
+        return {"index": index, "filename": filename, "results": results}
+    except Exception as e:
+        return {"index": index, "filename": filename, "error": str(e)}
+
+
+async def _stream_batch_results(items, detector: Optional[str]):
+    """
+    按完成顺序逐行输出NDJSON结果，同时在途的图像数不超过batch_concurrency
+
+    压缩包成员的解压在默认线程池中进行，不阻塞事件循环。
+    """
+    loop = asyncio.get_running_loop()
+    pending = set()
+    index = 0
+    exhausted = False
+    while True:
+        if not exhausted and len(pending) < batch_concurrency:
+            try:
+                item = await loop.run_in_executor(None, next, items, None)
+            except Exception as e:
+                yield json.dumps({"index": index, "error": f"无法读取压缩包: {e}"},
+                                 ensure_ascii=False) + "\n"
+                item = None
+            if item is None:
+                exhausted = True
+            else:
+                filename, data = item
+                pending.add(asyncio.ensure_future(
+                    _recognize_batch_item(index, filename, data, detector)))
+                index += 1
+                continue
+
+        if not pending:
+            break
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield json.dumps(task.result(), ensure_ascii=False) + "\n"
+
+
+@app.post("/recognize_batch")
+async def recognize_batch(files: List[UploadFile] = File(...),
+                          detector: Optional[str] = None):
+    """
+    批量识别多张图像
+
+    接受多个图像文件或zip/tar压缩包，多张图像并行解码和检测，人脸特征由调度器
+    跨图像合并为批量推理。每张图像完成后立即输出一行NDJSON结果
+    {"index", "filename", "results"}，顺序为完成顺序。
+
+    Args:
+        files: 上传的图像文件或压缩包
+        detector: 可选的人脸检测后端（mtcnn或opencv）
+
+    Returns:
+        application/x-ndjson流式响应
+    """
+    _check_detector(detector)
+    items = iter_uploads((upload.filename or '', upload.file) for upload in files)
+    return StreamingResponse(_stream_batch_results(items, detector),
+                             media_type="application/x-ndjson")
+
+
+def _recognize_frame_bytes(data: bytes, tracker: FaceTracker,
+                           detector: Optional[str]):
+    """解码二进制图像帧并识别（在线程池中执行）"""
+    return face_system.recognize_frame(_decode_image(data), tracker, detector)
+
+
+@app.websocket("/ws/recognize")
+async def recognize_ws(websocket: WebSocket, detector: Optional[str] = None):
+    """
+    通过WebSocket识别视频流
+
+    客户端直接发送JPEG/PNG二进制帧，可以不等结果连续发送多帧；服务端按接收顺序
+    逐帧返回JSON结果 {"frame", "keyframe", "results"}。连接内共享人脸跟踪状态，
+    处理不过来时丢弃最旧的排队帧并返回 {"frame", "dropped": true}。
+
+    Args:
+        websocket: WebSocket连接
+        detector: 可选的关键帧人脸检测后端（mtcnn或opencv）
+    """
+    if detector is not None and detector not in DETECTOR_BACKENDS:
+        await websocket.close(code=1008, reason=f"未知的人脸检测后端: {detector}")
+        return
+
+    await websocket.accept()
+    tracker = FaceTracker()
+    frames = asyncio.Queue()
+    dropped = []
+    arrived = asyncio.Event()
+
+    async def receive_frames():
+        """持续接收帧，使下一帧的传输与当前帧的推理重叠"""
+        seq = 0
+        try:
+            while True:
+                message = await websocket.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if frames.qsize() >= ws_max_pending:
+                    dropped.append(frames.get_nowait()[0])
+                frames.put_nowait((seq, message.get('bytes')))
+                seq += 1
+                arrived.set()
+        finally:
+            frames.put_nowait((None, None))
+            arrived.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            if frames.empty():
+                arrived.clear()
+                await arrived.wait()
+            for seq in dropped:
+                await websocket.send_json({"frame": seq, "dropped": True})
+            dropped.clear()
+            if frames.empty():
+                continue
+
+            seq, data = frames.get_nowait()
+            if seq is None:
+                break
+            if data is None:
+                await websocket.send_json({"frame": seq, "error": "只接受二进制图像帧"})
+                continue
+
+            try:
+                results, keyframe = await executor.run(
+                    _recognize_frame_bytes, data, tracker, detector)
+                reply = {"frame": seq, "keyframe": keyframe, "results": results}
+            except Exception as e:
+                reply = {"frame": seq, "error": str(e)}
+            await websocket.send_json(reply)
+    except (WebSocketDisconnect, RuntimeError):
+        # 客户端在结果返回前断开连接
+        pass
+    finally:
+        receiver.cancel()
+
+
 @app.post("/enroll")
 async def enroll(name: str = Form(...), file: UploadFile = File(...)):
     """
@@ -107,14 +435,10 @@ async def enroll(name: str = Form(...), file: UploadFile = File(...)):
     try:
         # 读取图像
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-
-        # 转换为RGB
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        image = _decode_image(contents)
 
         # 执行录入
-        success = face_system.enroll_face(image, name)
+        success = await executor.run(face_system.enroll_face, image, name, contents)
 
         if success:
             return JSONResponse(content={
@@ -127,6 +451,11 @@ async def enroll(name: str = Form(...), file: UploadFile = File(...)):
                 "message": "未检测到人脸，请重试"
             }, status_code=400)
 
+    except HTTPException:
+        raise
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -153,14 +482,11 @@ async def enroll_base64(data: dict):
             image_data = image_data.split(',')[1]
 
         image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
-
-        # 转换为RGB
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        image = _decode_image(image_bytes)
 
         # 执行录入
-        success = face_system.enroll_face(image, name)
+        success = await executor.run(face_system.enroll_face, image, name,
+                                     image_bytes)
 
         if success:
             return JSONResponse(content={
@@ -173,14 +499,142 @@ async def enroll_base64(data: dict):
                 "message": "未检测到人脸，请重试"
             }, status_code=400)
 
+    except HTTPException:
+        raise
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """校验管理员令牌，未配置ADMIN_TOKEN时管理端点总是拒绝"""
+    if not admin_token or x_admin_token is None or not hmac.compare_digest(
+            x_admin_token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=403, detail="需要有效的管理员令牌")
+
+
+def _bulk_submitter(loop: asyncio.AbstractEventLoop):
+    """
+    批量录入任务的提交函数
+
+    后台线程中的任务交回事件循环，经batch_gate在共享推理执行器中以低优先级执行，
+    与批量识别一样只使用空闲的推理线程，不挤占交互式请求。
+    """
+    def submit(fn, *args):
+        return asyncio.run_coroutine_threadsafe(batch_gate.run(fn, *args), loop)
+    return submit
+
+
+@app.post("/enroll_bulk", status_code=202,
+          dependencies=[Depends(require_admin)])
+async def enroll_bulk(data: dict):
+    """
+    启动后台批量录入任务
+
+    Args:
+        data: 包含directory（BULK_ENROLL_ROOT下的相对路径）和可选resume字段的字典
+
+    Returns:
+        任务状态
+    """
+    root = os.path.realpath(bulk_enroll_root)
+    directory = os.path.realpath(os.path.join(root, data.get('directory', '')))
+    if os.path.commonpath([root, directory]) != root:
+        raise HTTPException(status_code=400, detail="目录必须位于BULK_ENROLL_ROOT之下")
+    if not os.path.isdir(directory):
+        raise HTTPException(status_code=400, detail=f"目录不存在: {data.get('directory')}")
+    if any(job.running for job in bulk_jobs.values()):
+        raise HTTPException(status_code=409, detail="已有批量录入任务正在运行")
+
+    enroller = BulkEnroller(face_system,
+                            submit=_bulk_submitter(asyncio.get_running_loop()))
+    job = BulkEnrollJob(enroller, directory,
+                        resume=data.get('resume', True))
+    bulk_jobs[job.job_id] = job
+    return job.to_dict()
+
+
+@app.get("/enroll_bulk/{job_id}", dependencies=[Depends(require_admin)])
+async def enroll_bulk_status(job_id: str):
+    """查询批量录入任务进度"""
+    if job_id not in bulk_jobs:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return bulk_jobs[job_id].to_dict()
+
+
+@app.delete("/enroll_bulk/{job_id}", dependencies=[Depends(require_admin)])
+async def cancel_enroll_bulk(job_id: str):
+    """在当前批次完成后停止批量录入任务，之后可续传"""
+    if job_id not in bulk_jobs:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    bulk_jobs[job_id].cancel()
+    return bulk_jobs[job_id].to_dict()
+
+
+@app.post("/key_rotation", status_code=202,
+          dependencies=[Depends(require_admin)])
+async def start_key_rotation(data: Optional[dict] = None):
+    """
+    启动后台密钥轮换任务，用ENCRYPTION_KEY中的第一个密钥重新加密所有图像
+
+    Args:
+        data: 可选的resume字段，默认从上次进度继续
+
+    Returns:
+        任务状态
+    """
+    if any(job.running for job in rotation_jobs.values()):
+        raise HTTPException(status_code=409, detail="已有密钥轮换任务正在运行")
+
+    resume = (data or {}).get('resume', True)
+    job = KeyRotationJob(KeyRotator(face_system.encryption_manager),
+                         face_system.images_dir, resume=resume)
+    rotation_jobs[job.job_id] = job
+    return job.to_dict()
+
+
+@app.get("/key_rotation/{job_id}", dependencies=[Depends(require_admin)])
+async def key_rotation_status(job_id: str):
+    """查询密钥轮换任务进度"""
+    if job_id not in rotation_jobs:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return rotation_jobs[job_id].to_dict()
+
+
+@app.delete("/key_rotation/{job_id}", dependencies=[Depends(require_admin)])
+async def cancel_key_rotation(job_id: str):
+    """在当前批次完成后停止密钥轮换任务，之后可续传"""
+    if job_id not in rotation_jobs:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    rotation_jobs[job_id].cancel()
+    return rotation_jobs[job_id].to_dict()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """以Prometheus文本格式导出运行指标"""
+    return PlainTextResponse(metrics.registry.render(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/health")
 async def health_check():
     """健康检查端点"""
-    return {"status": "healthy", "enrolled_faces": len(face_system.names)}
+    return {
+        "status": "healthy",
+        "ready": face_system.ready,
+        "model_status": face_system.model_status,
+        "enrolled_faces": len(face_system.gallery),
+        "embedding_dtype": face_system.embedding_dtype,
+        "embedder_backend": face_system.embedder_backend,
+        "pending_tasks": executor.pending,
+        "pending_writes": face_system.image_writer.pending,
+        "failed_writes": face_system.image_writer.failed,
+        "embedding_cache": face_system.embedding_cache.stats(),
+        "stream_sessions": len(stream_sessions)
+    }
 
 
 if __name__ == "__main__":
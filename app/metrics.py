@@ -0,0 +1,285 @@
+"""
+运行指标模块
+在热路径上记录各阶段耗时直方图、每帧人脸数、推理批大小等指标，
+并以Prometheus文本格式导出。每次记录只有一次加锁和一次二分查找，可在生产环境常开
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 各处理阶段耗时（秒）的默认分桶
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+FACE_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 50)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _format_value(value: float) -> str:
+    """按Prometheus文本格式输出数值"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    """格式化标签，如 {stage="detect"}"""
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    ]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """指标基类：名称、说明和标签名"""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Gauge(_Metric):
+    """在抓取时通过回调读取当前值的仪表"""
+
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = float(self.fn())
+        except Exception:
+            # 数据源尚未就绪时不输出样本
+            return self.header()
+        return self.header() + [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS,
+                 labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签: [各桶计数..., +Inf桶计数, 总和]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        """
+        记录一次观测值
+
+        Args:
+            value: 观测值
+            *labels: 与labelnames对应的标签值
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels) -> int:
+        """某组标签的观测次数"""
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((labels, list(series))
+                              for labels, series in self._series.items())
+        lines = self.header()
+        bucket_names = self.labelnames + ('le',)
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_format_labels(bucket_names, labels + (_format_value(bound),))}"
+                    f" {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标已存在: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str,
+                  buckets: Iterable[float] = LATENCY_BUCKETS,
+                  labelnames: Tuple[str, ...] = ()) -> Histogram:
+        return self._register(Histogram(name, help, buckets, labelnames))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float]) -> Gauge:
+        """
+        注册或替换回调式仪表
+
+        Args:
+            name: 指标名
+            help: 说明
+            fn: 抓取时调用的取值函数
+        """
+        with self._lock:
+            gauge = self._metrics[name] = Gauge(name, help, fn)
+        return gauge
+
+    def render(self) -> str:
+        """以Prometheus文本格式导出所有指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# 正在被分析的请求线程 -> 该请求各阶段的累计耗时，为空时计时器不做额外工作
+profiled_threads: Dict[int, Dict[str, float]] = {}
+
+
+def thread_profiled() -> bool:
+    """当前线程是否正在被请求分析器分析"""
+    return bool(profiled_threads) and threading.get_ident() in profiled_threads
+
+
+class _Timer:
+    """记录阶段耗时的上下文管理器"""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        if enabled:
+            STAGE_SECONDS.observe(elapsed, self.name)
+        if profiled_threads:
+            stages = profiled_threads.get(threading.get_ident())
+            if stages is not None:
+                stages[self.name] = stages.get(self.name, 0.0) + elapsed
+        return False
+
+
+class _NullTimer:
+    """指标关闭时使用的空上下文管理器"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class RequestMetricsMiddleware:
+    """按路由模板与状态码记录HTTP请求耗时的ASGI中间件，流式响应计到最后一个字节"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not enabled:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # 路由匹配后会把route写入scope，用路由模板避免路径参数导致标签膨胀
+            route = getattr(scope.get('route'), 'path', None) or 'unmatched'
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route, str(status))
+
+
+enabled = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'face_stage_duration_seconds',
+    'Latency of each processing stage '
+    '(decode, detect, crop, embed, inference, match, save)',
+    labelnames=('stage',))
+REQUEST_SECONDS = registry.histogram(
+    'face_request_duration_seconds', 'HTTP request latency by route and status',
+    labelnames=('route', 'status'))
+FACES_PER_FRAME = registry.histogram(
+    'face_faces_per_frame', 'Number of faces detected per recognized image',
+    buckets=FACE_COUNT_BUCKETS)
+BATCH_SIZE = registry.histogram(
+    'face_inference_batch_size', 'Number of face crops per FaceNet forward pass',
+    buckets=BATCH_SIZE_BUCKETS)
+
+
+def stage(name: str):
+    """
+    统计一个处理阶段的耗时
+
+    Args:
+        name: 阶段名称
+
+    Returns:
+        上下文管理器，退出时记录耗时；指标关闭时不计时
+    """
+    if not enabled and not profiled_threads:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def observe(histogram: Histogram, value: float, *labels):
+    """指标开启时记录一次观测值"""
+    if enabled:
+        histogram.observe(value, *labels)
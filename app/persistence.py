@@ -0,0 +1,167 @@
+"""
+图像持久化模块
+录入的人脸图像经有界队列交给后台写入线程加密落盘，JPEG编码、加密和磁盘I/O
+不再占用请求路径。持久性模式决定何时返回：入队即返回，或等待写入并fsync完成
+"""
+import io
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, Optional, Union
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DURABILITY_MODES = ('queued', 'fsync')
+
+# 上传数据已是JPEG时直接保存原始字节，不再重新编码
+JPEG_MAGIC = b'\xff\xd8\xff'
+
+
+def to_jpeg_bytes(payload: Union[bytes, Image.Image]) -> bytes:
+    """
+    将待保存的图像转换为JPEG字节
+
+    Args:
+        payload: 原始上传字节或PIL图像
+
+    Returns:
+        JPEG字节，原始字节已是JPEG时原样返回
+    """
+    if isinstance(payload, bytes) and payload.startswith(JPEG_MAGIC):
+        return payload
+    if isinstance(payload, bytes):
+        payload = Image.open(io.BytesIO(payload))
+    if payload.mode != 'RGB':
+        payload = payload.convert('RGB')
+    buffer = io.BytesIO()
+    payload.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def image_filename(name: str) -> str:
+    """
+    生成加密图像的唯一文件名
+
+    Args:
+        name: 人员姓名
+
+    Returns:
+        形如 姓名_毫秒时间戳_随机后缀.enc 的文件名，同一毫秒内的多次录入也不会重名
+    """
+    return f"{name}_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}.enc"
+
+
+class ImageWriter:
+    """后台图像写入队列"""
+
+    def __init__(self, write_fn: Callable[[str, bytes, bool], str],
+                 workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 durability: Optional[str] = None):
+        """
+        初始化写入队列
+
+        Args:
+            write_fn: 写入函数 (文件名, JPEG字节, 是否fsync) -> 文件路径
+            workers: 写入线程数，默认读取IMAGE_WRITER_WORKERS
+            max_queue: 队列容量，队列满时提交方阻塞等待，默认读取IMAGE_WRITER_QUEUE_SIZE
+            durability: queued（入队即返回）或fsync（写入并fsync后返回），
+                默认读取IMAGE_WRITE_DURABILITY
+        """
+        if workers is None:
+            workers = int(os.getenv('IMAGE_WRITER_WORKERS', '2'))
+        if max_queue is None:
+            max_queue = int(os.getenv('IMAGE_WRITER_QUEUE_SIZE', '64'))
+        if durability is None:
+            durability = os.getenv('IMAGE_WRITE_DURABILITY', 'queued')
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"未知的持久性模式: {durability}")
+
+        self.write_fn = write_fn
+        self.workers = max(1, workers)
+        self.durability = durability
+        self.failed = 0
+        self.last_error = None
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._threads = []
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """等待写入的图像数"""
+        return self._queue.qsize()
+
+    def _ensure_started(self):
+        """首次提交时启动写入线程"""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'image-writer-{i}',
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, name: str, payload: Union[bytes, Image.Image],
+               filename: Optional[str] = None) -> Future:
+        """
+        提交一张待保存的图像
+
+        文件名在提交时确定，排队期间同名人员的多次录入不会写到同一个文件。
+        fsync模式下等待写入完成后返回，失败时抛出写入异常。
+
+        Args:
+            name: 人员姓名
+            payload: 原始上传字节或PIL图像
+            filename: 保存的文件名，默认由image_filename生成
+
+        Returns:
+            写入完成时得到文件路径的Future
+        """
+        if filename is None:
+            filename = image_filename(name)
+        self._ensure_started()
+        future = Future()
+        self._queue.put((filename, payload, future))
+        if self.durability == 'fsync':
+            future.result()
+        return future
+
+    def flush(self):
+        """等待队列中的所有图像写入完成"""
+        self._queue.join()
+
+    def close(self):
+        """写完队列中的图像后停止写入线程"""
+        if not self._threads:
+            return
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self):
+        """写入线程主循环"""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                filename, payload, future = item
+                try:
+                    path = self.write_fn(filename, to_jpeg_bytes(payload),
+                                         self.durability == 'fsync')
+                    future.set_result(path)
+                except Exception as e:
+                    self.failed += 1
+                    self.last_error = str(e)
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
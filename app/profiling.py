@@ -0,0 +1,167 @@
+"""
+请求分析模块
+管理员可通过请求头或查询参数为单个识别请求开启cProfile分析，
+响应中附带各阶段耗时与最耗时的函数，完整的分析数据保存为.prof文件。
+未携带分析令牌的请求走原有路径，不产生任何额外开销
+"""
+import cProfile
+import hmac
+import os
+import pstats
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Tuple
+from dotenv import load_dotenv
+from app import metrics
+
+load_dotenv()
+
+# MTCNN三级级联在分析数据中的函数名
+MTCNN_STAGES = {
+    '__stage1': 'mtcnn_pnet',
+    '__stage2': 'mtcnn_rnet',
+    '__stage3': 'mtcnn_onet',
+}
+
+
+class ProfilerBusyError(Exception):
+    """已有请求正在被分析"""
+
+
+class RequestProfiler:
+    """单请求分析器，同一时间只分析一个请求"""
+
+    def __init__(self, token: Optional[str] = None, output_dir: Optional[str] = None,
+                 top: Optional[int] = None, max_files: Optional[int] = None,
+                 max_age: Optional[float] = None):
+        """
+        初始化分析器
+
+        Args:
+            token: 开启分析所需的管理员令牌，为空时禁用，默认读取PROFILING_TOKEN
+            output_dir: .prof文件保存目录，默认读取PROFILE_DIR
+            top: 响应中列出的最耗时函数数，默认读取PROFILE_TOP_FUNCTIONS
+            max_files: 最多保留的.prof文件数，写入新文件时删除最旧的，
+                默认读取PROFILE_MAX_FILES
+            max_age: .prof文件的最长保留时间（秒，0为不限），默认读取PROFILE_MAX_AGE
+        """
+        if token is None:
+            token = os.getenv('PROFILING_TOKEN', '')
+        if output_dir is None:
+            output_dir = os.getenv('PROFILE_DIR', 'data/profiles')
+        if top is None:
+            top = int(os.getenv('PROFILE_TOP_FUNCTIONS', '25'))
+        if max_files is None:
+            max_files = int(os.getenv('PROFILE_MAX_FILES', '100'))
+        if max_age is None:
+            max_age = float(os.getenv('PROFILE_MAX_AGE', '604800'))
+        self.token = token
+        self.output_dir = output_dir
+        self.top = max(0, top)
+        self.max_files = max(1, max_files)
+        self.max_age = max(0.0, max_age)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    def authorize(self, supplied: str) -> bool:
+        """校验请求携带的令牌，分析未启用时总是拒绝"""
+        return self.enabled and hmac.compare_digest(supplied.encode(),
+                                                    self.token.encode())
+
+    def run(self, fn: Callable, *args, **kwargs) -> Tuple[object, dict]:
+        """
+        在分析下执行函数（在执行函数的线程中调用）
+
+        Args:
+            fn: 要分析的函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            (函数返回值, 分析报告)
+
+        Raises:
+            ProfilerBusyError: 已有请求正在被分析
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("已有请求正在分析，请稍后重试")
+        ident = threading.get_ident()
+        stages = metrics.profiled_threads[ident] = {}
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+        finally:
+            elapsed = time.perf_counter() - start
+            del metrics.profiled_threads[ident]
+            self._lock.release()
+        return result, self._report(profiler, stages, elapsed)
+
+    def _report(self, profiler: cProfile.Profile, stages: dict, elapsed: float) -> dict:
+        """
+        汇总分析结果并保存.prof文件
+
+        Returns:
+            包含profile_id、total_ms、stages_ms、top_functions和path的字典
+        """
+        stats = pstats.Stats(profiler)
+        profile_id = uuid.uuid4().hex[:12]
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir,
+                            f"{time.strftime('%Y%m%d-%H%M%S')}_{profile_id}.prof")
+        stats.dump_stats(path)
+        self._prune()
+
+        stages_ms = {name: round(seconds * 1000, 3) for name, seconds in stages.items()}
+        for (filename, _, function), (_, _, _, cumulative, _) in stats.stats.items():
+            if function in MTCNN_STAGES and 'mtcnn' in filename:
+                stage = MTCNN_STAGES[function]
+                stages_ms[stage] = round(stages_ms.get(stage, 0.0)
+                                         + cumulative * 1000, 3)
+
+        ranked = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        top_functions = [
+            {
+                'function': f"{os.path.basename(filename)}:{line}({function})",
+                'calls': calls,
+                'total_ms': round(total * 1000, 3),
+                'cumulative_ms': round(cumulative * 1000, 3),
+            }
+            for (filename, line, function), (_, calls, total, cumulative, _)
+            in ranked[:self.top]
+        ]
+        return {
+            'profile_id': profile_id,
+            'total_ms': round(elapsed * 1000, 3),
+            'stages_ms': stages_ms,
+            'top_functions': top_functions,
+            'path': path,
+        }
+
+    def _prune(self):
+        """删除超过保留时间的.prof文件，并只保留最新的max_files个"""
+        profiles = []
+        for filename in os.listdir(self.output_dir):
+            if not filename.endswith('.prof'):
+                continue
+            path = os.path.join(self.output_dir, filename)
+            try:
+                profiles.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        profiles.sort(reverse=True)
+        cutoff = time.time() - self.max_age if self.max_age else None
+        for index, (mtime, path) in enumerate(profiles):
+            if index >= self.max_files or (cutoff is not None and mtime < cutoff):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,333 @@
+"""
+特征量化模块
+特征库以float16或int8（每行一个缩放系数）保存在内存和数据库文件中，内存占用降为1/2或1/4。
+检索先在量化矩阵上分块计算相似度，再用float32原始特征对前若干个候选精确重排；
+原始特征追加写入旁路文件并以内存映射方式读取，只有被重排的行会进入内存
+"""
+import logging
+import os
+import numpy as np
+from typing import Iterable, Optional, Tuple, Union
+from dotenv import load_dotenv
+from app.gallery import EmbeddingGallery, select_top_k
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DTYPES = ('float32', 'float16', 'int8')
+
+# 分块反量化的行数，限制检索时临时float32缓冲区的大小
+_SCAN_BLOCK_ROWS = 16384
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    量化特征矩阵
+
+    Args:
+        vectors: 形状为(N, D)的float32特征
+        dtype: float32、float16或int8
+
+    Returns:
+        (codes, scales)，原始特征约等于 codes * scales[:, None]
+    """
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"未知的特征存储类型: {dtype}")
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.ones(len(vectors), dtype=np.float32)
+    if dtype != 'int8':
+        return vectors.astype(dtype), scales
+
+    peak = np.abs(vectors).max(axis=1)
+    nonzero = peak > 0
+    scales[nonzero] = peak[nonzero] / 127.0
+    codes = np.rint(vectors / scales[:, np.newaxis])
+    return np.clip(codes, -127, 127).astype(np.int8), scales
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """
+    还原量化特征
+
+    Args:
+        codes: 量化后的(N, D)矩阵
+        scales: 每行的缩放系数
+
+    Returns:
+        float32类型的(N, D)特征
+    """
+    return codes.astype(np.float32) * scales[:, np.newaxis]
+
+
+class QuantizedGallery(EmbeddingGallery):
+    """以量化矩阵保存特征、检索时用原始特征重排的特征库"""
+
+    def __init__(self, dtype: str, originals_path: Optional[str] = None,
+                 rerank: Optional[int] = None, capacity: int = 1024):
+        """
+        初始化量化特征库
+
+        Args:
+            dtype: float16或int8
+            originals_path: float32原始特征旁路文件路径，为None时用反量化特征重排
+            rerank: 量化检索后精确重排的候选数，默认读取FACE_QUANT_RERANK
+            capacity: 初始预分配的行数
+        """
+        if dtype not in EMBEDDING_DTYPES or dtype == 'float32':
+            raise ValueError(f"不支持的量化类型: {dtype}")
+        if rerank is None:
+            rerank = int(os.getenv('FACE_QUANT_RERANK', '32'))
+        super().__init__(capacity)
+        self.dtype = dtype
+        self.rerank = max(1, rerank)
+        self.originals_path = originals_path
+        self._scales = None
+        self._originals = None
+        self._stale_warned = False
+
+    @property
+    def codes(self) -> np.ndarray:
+        """量化后的特征矩阵 (N, D)"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=self.dtype)
+        return self._matrix[:self._size]
+
+    @property
+    def scales(self) -> np.ndarray:
+        """每行的缩放系数 (N,)"""
+        if self._scales is None:
+            return np.empty(0, dtype=np.float32)
+        return self._scales[:self._size]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """反量化后的特征矩阵，每次访问都会分配完整的float32副本"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return dequantize(self.codes, self.scales)
+
+    @property
+    def nbytes(self) -> int:
+        """量化矩阵与缩放系数占用的内存（字节）"""
+        return self.codes.nbytes + self.scales.nbytes
+
+    def vectors(self, rows: Union[np.ndarray, slice]) -> np.ndarray:
+        """
+        读取指定行的特征，优先使用float32原始特征
+
+        Args:
+            rows: 行号数组或切片
+
+        Returns:
+            float32类型的特征
+        """
+        originals = self._map_originals()
+        if originals is not None:
+            return np.asarray(originals[rows])
+        return dequantize(self._matrix[:self._size][rows],
+                          self._scales[:self._size][rows])
+
+    def _reserve(self, size: int, dim: int):
+        """确保缓冲区至少能容纳size行"""
+        if self._matrix is None:
+            capacity = max(self._initial_capacity, size)
+            self._matrix = np.empty((capacity, dim), dtype=self.dtype)
+            self._scales = np.empty(capacity, dtype=np.float32)
+            self._names = np.empty(capacity, dtype=object)
+            return
+
+        if dim != self.dim:
+            raise ValueError(f"特征维度不匹配: 期望 {self.dim}, 实际 {dim}")
+
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        matrix = np.empty((capacity, dim), dtype=self.dtype)
+        matrix[:self._size] = self._matrix[:self._size]
+        scales = np.empty(capacity, dtype=np.float32)
+        scales[:self._size] = self._scales[:self._size]
+        names = np.empty(capacity, dtype=object)
+        names[:self._size] = self._names[:self._size]
+        self._matrix, self._scales, self._names = matrix, scales, names
+
+    def _insert(self, names: list, vectors: np.ndarray):
+        """量化并追加已归一化的特征"""
+        codes, scales = quantize(vectors, self.dtype)
+        start, end = self._size, self._size + len(names)
+        self._reserve(end, vectors.shape[1])
+        self._matrix[start:end] = codes
+        self._scales[start:end] = scales
+        self._names[start:end] = names
+        self._size = end
+        self._version += 1
+
+    def _originals_rows(self, dim: int) -> int:
+        """旁路文件中完整的原始特征行数"""
+        if self.originals_path is None or not os.path.exists(self.originals_path):
+            return 0
+        return os.path.getsize(self.originals_path) // (dim * 4)
+
+    def _map_originals(self) -> Optional[np.ndarray]:
+        """映射原始特征文件，行数与特征库不一致时返回None"""
+        if self._originals is not None and len(self._originals) == self._size:
+            return self._originals
+        self._originals = None
+        if self._size and self._originals_rows(self.dim) == self._size:
+            self._originals = np.memmap(self.originals_path, dtype=np.float32,
+                                        mode='r', shape=(self._size, self.dim))
+        return self._originals
+
+    def _write_originals(self, vectors: np.ndarray, append: bool):
+        """写入原始特征，只在旁路文件与特征库对齐时追加"""
+        if self.originals_path is None:
+            return
+        if append and self._originals_rows(vectors.shape[1]) != self._size:
+            # 旁路文件已失效，停止维护，重排退化为使用反量化特征
+            self._warn_stale_originals()
+            return
+        self._originals = None
+        with open(self.originals_path, 'ab' if append else 'wb') as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+    def extend(self, names: Iterable[str], embeddings: np.ndarray):
+        """
+        批量添加人脸特征，原始特征同时追加到旁路文件
+
+        Args:
+            names: 姓名序列
+            embeddings: 形状为(N, D)的特征矩阵
+        """
+        names = [str(name) for name in names]
+        if len(names) == 0:
+            return
+        vectors = self.normalize(embeddings)
+        if len(names) != len(vectors):
+            raise ValueError("姓名数量与特征数量不一致")
+        if self.dim and vectors.shape[1] != self.dim:
+            raise ValueError(f"特征维度不匹配: 期望 {self.dim}, 实际 {vectors.shape[1]}")
+        # 空库时覆盖可能残留的旧文件
+        self._write_originals(vectors, append=self._size > 0)
+        self._insert(names, vectors)
+
+    def load(self, names: Iterable[str], embeddings: np.ndarray,
+             scales: Optional[np.ndarray] = None):
+        """
+        从数据库文件恢复特征库，沿用已有的原始特征旁路文件
+
+        Args:
+            names: 姓名序列
+            embeddings: 数据库中的特征，可以是float32或量化后的矩阵
+            scales: int8特征的缩放系数
+        """
+        names = [str(name) for name in names]
+        super().clear()
+        self._scales = None
+        self._originals = None
+        if len(names) == 0:
+            return
+        embeddings = np.asarray(embeddings)
+        vectors = embeddings.astype(np.float32)
+        if scales is not None:
+            vectors *= np.asarray(scales, dtype=np.float32)[:, np.newaxis]
+        vectors = self.normalize(vectors)
+        if len(names) != len(vectors):
+            raise ValueError("姓名数量与特征数量不一致")
+
+        self._insert(names, vectors)
+        self._stale_warned = False
+        self._align_originals(vectors if embeddings.dtype == np.float32 else None)
+
+    def _align_originals(self, vectors: Optional[np.ndarray]):
+        """
+        加载后使旁路文件与数据库行数对齐
+
+        旁路文件先于数据库写入，保存数据库前中断时会多出未提交的尾部行，截断即可；
+        行数不足时只能由float32数据库重新生成，否则重排退化为使用反量化特征。
+
+        Args:
+            vectors: float32数据库中已归一化的特征，量化数据库为None
+        """
+        if self.originals_path is None:
+            return
+        expected = self._size * self.dim * 4
+        size = (os.path.getsize(self.originals_path)
+                if os.path.exists(self.originals_path) else 0)
+        if size > expected:
+            os.truncate(self.originals_path, expected)
+        elif size < expected:
+            if vectors is not None:
+                # 旧的float32数据库：首次以量化模式加载时生成旁路文件
+                self._write_originals(vectors, append=False)
+            else:
+                self._warn_stale_originals()
+
+    def _warn_stale_originals(self):
+        """旁路文件与特征库不一致时记录一次警告"""
+        if self._stale_warned:
+            return
+        self._stale_warned = True
+        logger.warning("原始特征文件 %s 与特征库（%d 行）不一致，重排改用反量化特征",
+                       self.originals_path, self._size)
+
+    def clear(self):
+        """清空特征库和原始特征文件"""
+        super().clear()
+        self._scales = None
+        self._originals = None
+        if self.originals_path is not None and os.path.exists(self.originals_path):
+            os.remove(self.originals_path)
+
+    def scan(self, queries: np.ndarray) -> np.ndarray:
+        """
+        在量化矩阵上分块计算相似度
+
+        Args:
+            queries: 已归一化的(M, D)查询特征
+
+        Returns:
+            (M, N)近似余弦相似度
+        """
+        codes, scales = self.codes, self.scales
+        similarities = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), _SCAN_BLOCK_ROWS):
+            end = start + _SCAN_BLOCK_ROWS
+            block = codes[start:end].astype(np.float32)
+            similarities[:, start:end] = (queries @ block.T) * scales[start:end]
+        return similarities
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        先在量化矩阵上取前rerank个候选，再用float32特征精确重排
+
+        Args:
+            queries: 形状为(D,)或(M, D)的查询特征
+            k: 每个查询返回的候选数量
+
+        Returns:
+            (indices, distances)，按距离升序排列
+        """
+        queries = self.normalize(queries)
+        if self._size == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        k = max(1, min(k, self._size))
+        similarities = self.scan(queries)
+        num_candidates = min(max(self.rerank, k), self._size)
+        if num_candidates < self._size:
+            candidates = np.argpartition(-similarities, num_candidates - 1,
+                                         axis=1)[:, :num_candidates]
+        else:
+            candidates = np.broadcast_to(np.arange(self._size), similarities.shape)
+
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        for i, query in enumerate(queries):
+            rows = np.sort(candidates[i])
+            top, dist = select_top_k(query[np.newaxis] @ self.vectors(rows).T, k)
+            indices[i] = rows[top[0]]
+            distances[i] = dist[0]
+        return indices, distances
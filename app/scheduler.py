@@ -0,0 +1,150 @@
+"""
+推理调度模块
+将并发请求中的人脸裁剪合并为一个批次送入FaceNet，减少小批量推理的开销
+"""
+import os
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+from dotenv import load_dotenv
+from app import metrics
+
+load_dotenv()
+
+
+class _Request:
+    """一次提交的人脸批次及其结果"""
+
+    __slots__ = ('crops', 'future')
+
+    def __init__(self, crops: np.ndarray):
+        self.crops = crops
+        self.future = Future()
+
+
+class InferenceScheduler:
+    """跨请求的微批推理调度器"""
+
+    def __init__(self, infer_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: Optional[int] = None,
+                 max_wait_ms: Optional[float] = None):
+        """
+        初始化调度器
+
+        Args:
+            infer_fn: 批量推理函数，输入(N, H, W, 3)的人脸数组，返回(N, D)特征
+            max_batch_size: 单次推理的最大人脸数，默认读取INFERENCE_MAX_BATCH_SIZE
+            max_wait_ms: 凑批的最长等待时间（毫秒），默认读取INFERENCE_MAX_WAIT_MS
+        """
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv('INFERENCE_MAX_BATCH_SIZE', '32'))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv('INFERENCE_MAX_WAIT_MS', '5'))
+
+        self.infer_fn = infer_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        """首次提交时启动后台调度线程"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='inference-scheduler', daemon=True)
+                self._thread.start()
+
+    def submit(self, crops: np.ndarray) -> Future:
+        """
+        提交一批人脸裁剪，异步获取其特征
+
+        Args:
+            crops: 形状为(N, H, W, 3)的人脸数组
+
+        Returns:
+            结果为(N, D)特征矩阵的Future
+        """
+        request = _Request(crops)
+        self._ensure_started()
+        self._queue.put(request)
+        return request.future
+
+    def embed(self, crops: np.ndarray) -> np.ndarray:
+        """
+        提交人脸裁剪并等待属于本次调用的特征
+
+        Args:
+            crops: 形状为(N, H, W, 3)的人脸数组
+
+        Returns:
+            形状为(N, D)的特征矩阵
+        """
+        return self.submit(crops).result()
+
+    @property
+    def pending(self) -> int:
+        """等待合并推理的请求数"""
+        return self._queue.qsize()
+
+    def close(self):
+        """停止调度线程，已入队的请求会先处理完"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        """从队列中收集请求，直到达到批大小上限或等待超时"""
+        batch = [first]
+        count = len(first.crops)
+        deadline = time.monotonic() + self.max_wait
+
+        while count < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    request = self._queue.get(timeout=remaining)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # 保留停止信号，处理完当前批次后退出
+                self._queue.put(None)
+                break
+            batch.append(request)
+            count += len(request.crops)
+
+        return batch
+
+    def _flush(self, batch: List[_Request]):
+        """对合并后的批次执行一次推理，并按提交顺序拆分结果"""
+        try:
+            crops = np.concatenate([request.crops for request in batch])
+            metrics.observe(metrics.BATCH_SIZE, len(crops))
+            with metrics.stage('inference'):
+                embeddings = self.infer_fn(crops)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in batch:
+            size = len(request.crops)
+            request.future.set_result(embeddings[offset:offset + size])
+            offset += size
+
+    def _run(self):
+        """调度线程主循环"""
+        while True:
+            request = self._queue.get()
+            if request is None:
+                break
+            self._flush(self._collect(request))
@@ -0,0 +1,169 @@
+"""
+共享人脸特征库模块
+特征矩阵直接映射自追加写入的存储文件，多个工作进程共享同一份页缓存，
+任一进程录入的人脸会被其他进程在下一次检索时看到
+"""
+import numpy as np
+from typing import Iterable, Optional, Tuple
+from app.gallery import EmbeddingGallery
+from app.storage import AppendOnlyStore, COUNT, DIM, GENERATION, LOG_BYTES
+
+
+class SharedGallery(EmbeddingGallery):
+    """基于内存映射文件、可在多个进程间共享的特征库"""
+
+    def __init__(self, base_path: str, compact_every: Optional[int] = None):
+        """
+        初始化共享特征库
+
+        Args:
+            base_path: 存储文件路径前缀，如 data/faces
+            compact_every: 姓名日志合并进索引的间隔条数
+        """
+        super().__init__()
+        self.store = AppendOnlyStore(base_path, compact_every)
+        self._header = None
+        self._generation = 0
+        self._index = self.store.load_index(0)
+        self._log_offset = 0
+        self._tail_count = 0
+        self._names_cache = None
+        self.refresh()
+
+    def __len__(self) -> int:
+        self.refresh()
+        return self._size
+
+    @property
+    def version(self) -> Tuple[int, int]:
+        """
+        (索引代数, 行数)：同一代内存储只追加，行数即可区分内容，其他进程的录入
+        同样会使其变化；清空后行数可能回到旧值，由代数区分
+        """
+        size = len(self)
+        return self._generation, size
+
+    @property
+    def names(self) -> np.ndarray:
+        """与特征矩阵逐行对齐的姓名数组，同一代内只在日志新增姓名后重新拼接"""
+        self.refresh()
+        key = (self._generation, self._tail_count)
+        if self._names_cache is None or self._names_cache[0] != key:
+            names = np.concatenate([np.asarray(self._index, dtype=object),
+                                    self._names[:self._tail_count]])
+            self._names_cache = (key, names)
+        return self._names_cache[1][:self._size]
+
+    def names_at(self, indices: np.ndarray) -> np.ndarray:
+        """
+        按行号查找姓名，只访问用到的索引项
+
+        Args:
+            indices: 行号数组
+
+        Returns:
+            与indices形状相同的姓名数组
+        """
+        indices = np.asarray(indices)
+        result = np.empty(indices.shape, dtype=object)
+        in_index = indices < len(self._index)
+        result[in_index] = self._index[indices[in_index]]
+        result[~in_index] = self._names[indices[~in_index] - len(self._index)]
+        return result
+
+    def _grow_tail(self, names: list):
+        """将姓名日志中的新姓名追加到内存数组"""
+        end = self._tail_count + len(names)
+        if end > self._names.shape[0]:
+            grown = np.empty(max(1024, end * 2), dtype=object)
+            grown[:self._tail_count] = self._names[:self._tail_count]
+            self._names = grown
+        self._names[self._tail_count:end] = names
+        self._tail_count = end
+
+    def refresh(self):
+        """检查其他进程提交的新记录，必要时重新映射文件"""
+        if self._header is None:
+            self._header = self.store.map_header()
+            if self._header is None:
+                return
+
+        header = np.array(self._header)
+        if int(header[GENERATION]) == self._generation and \
+                int(header[COUNT]) == self._size:
+            return
+        # 压缩与清空会替换姓名索引并截断姓名日志，持共享锁读取文件头、索引和日志，
+        # 保证三者属于同一次提交
+        with self.store.locked(shared=True):
+            self._sync(np.array(self._header))
+
+    def _sync(self, header: np.ndarray):
+        """按文件头同步姓名与特征映射（调用方持有共享锁）"""
+        count = int(header[COUNT])
+        generation = int(header[GENERATION])
+        if generation != self._generation:
+            # 姓名日志已被压缩进新一代索引（或存储已被清空），重新映射索引
+            self._index = self.store.load_index(generation)
+            self._generation = generation
+            self._log_offset = 0
+            self._tail_count = 0
+            self._size = 0
+
+        log_bytes = int(header[LOG_BYTES])
+        self._grow_tail(self.store.read_log(self._log_offset, log_bytes))
+        self._log_offset = max(self._log_offset, log_bytes)
+
+        if count == 0:
+            self._size = 0
+            return
+        mapped_rows = 0 if self._matrix is None else self._matrix.shape[0]
+        if count > mapped_rows:
+            self._matrix = self.store.map_rows(int(header[DIM]))
+        self._size = min(count, len(self._index) + self._tail_count,
+                         self._matrix.shape[0])
+
+    def extend(self, names: Iterable[str], embeddings: np.ndarray):
+        """
+        追加人脸特征并提交到共享文件
+
+        Args:
+            names: 姓名序列
+            embeddings: 形状为(N, D)的特征矩阵
+        """
+        names = [str(name) for name in names]
+        if len(names) == 0:
+            return
+        vectors = self.normalize(embeddings)
+        if len(names) != len(vectors):
+            raise ValueError("姓名数量与特征数量不一致")
+        self.store.append(names, vectors)
+        self.refresh()
+
+    def initialize(self, names: Iterable[str], embeddings: np.ndarray) -> bool:
+        """
+        仅在存储为空时导入初始数据，避免多个进程重复导入
+
+        Args:
+            names: 姓名序列
+            embeddings: 形状为(N, D)的特征矩阵
+
+        Returns:
+            是否执行了导入
+        """
+        names = [str(name) for name in names]
+        if len(names) == 0:
+            return False
+        imported = self.store.append(names, self.normalize(embeddings),
+                                     only_if_empty=True)
+        self.refresh()
+        return imported
+
+    def clear(self):
+        """清空共享存储，其他进程在下一次访问时同样看到空库"""
+        self.store.clear()
+        self.refresh()
+
+    def search(self, queries: np.ndarray, k: int = 1):
+        """检索前先同步其他进程的新记录"""
+        self.refresh()
+        return super().search(queries, k)
@@ -0,0 +1,257 @@
+"""
+人脸特征存储模块
+追加写入的特征文件可直接用np.memmap打开，录入只需O(1)次磁盘写入，
+启动时映射文件即可，无需逐条创建Python对象
+"""
+import fcntl
+import json
+import os
+import numpy as np
+from contextlib import contextmanager
+from typing import List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 文件头字段: 魔数、特征维度、已提交行数、姓名日志已提交字节数、
+# 姓名索引代数、姓名索引中的行数
+HEADER_FIELDS = 6
+HEADER_SIZE = HEADER_FIELDS * 8
+_MAGIC = int.from_bytes(b'FNEMB002', 'little')
+MAGIC, DIM, COUNT, LOG_BYTES, GENERATION, INDEX_COUNT = range(HEADER_FIELDS)
+
+
+class AppendOnlyStore:
+    """追加写入的人脸特征存储
+
+    由以下文件组成（以 data/faces 为前缀）:
+        faces.emb            文件头 + 按行追加的float32特征
+        faces.names.<代>.npy  紧凑的姓名索引，行号即记录ID
+        faces.names.log      上次压缩后新增的姓名，每行一个JSON字符串
+        faces.lock           跨进程写锁
+    """
+
+    def __init__(self, base_path: str, compact_every: Optional[int] = None):
+        """
+        初始化存储
+
+        Args:
+            base_path: 文件路径前缀（不含扩展名）
+            compact_every: 姓名日志累计多少条后合并进索引，
+                默认读取FACE_DB_COMPACT_EVERY
+        """
+        if compact_every is None:
+            compact_every = int(os.getenv('FACE_DB_COMPACT_EVERY', '1000'))
+        self.base_path = base_path
+        self.emb_path = base_path + '.emb'
+        self.log_path = base_path + '.names.log'
+        self.lock_path = base_path + '.lock'
+        self.compact_every = max(1, compact_every)
+
+    def index_path(self, generation: int) -> str:
+        """指定代数的姓名索引文件路径"""
+        return f"{self.base_path}.names.{generation}.npy"
+
+    @contextmanager
+    def locked(self, shared: bool = False):
+        """
+        跨进程锁
+
+        Args:
+            shared: 为True时获取共享读锁，与写锁互斥，读锁之间互不阻塞
+        """
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def map_header(self) -> Optional[np.memmap]:
+        """
+        映射文件头，其他进程的提交会直接反映在映射中
+
+        Returns:
+            长度为HEADER_FIELDS的uint64数组，文件尚未创建时返回None
+        """
+        if not os.path.exists(self.emb_path) or \
+                os.path.getsize(self.emb_path) < HEADER_SIZE:
+            return None
+        return np.memmap(self.emb_path, dtype='<u8', mode='r',
+                         shape=(HEADER_FIELDS,))
+
+    def read_header(self) -> Optional[np.ndarray]:
+        """读取文件头的副本，文件尚未创建时返回None"""
+        if not os.path.exists(self.emb_path):
+            return None
+        with open(self.emb_path, 'rb') as f:
+            header = np.frombuffer(f.read(HEADER_SIZE), dtype='<u8')
+        if len(header) != HEADER_FIELDS or int(header[MAGIC]) == 0:
+            return None
+        if int(header[MAGIC]) != _MAGIC:
+            raise ValueError(f"无效的特征存储文件: {self.emb_path}")
+        return header.copy()
+
+    def map_rows(self, dim: int) -> np.memmap:
+        """
+        只读映射文件中的全部特征行
+
+        Args:
+            dim: 特征维度
+
+        Returns:
+            形状为(rows, dim)的float32内存映射，可能包含尚未提交的行
+        """
+        rows = (os.path.getsize(self.emb_path) - HEADER_SIZE) // (dim * 4)
+        return np.memmap(self.emb_path, dtype=np.float32, mode='r',
+                         offset=HEADER_SIZE, shape=(rows, dim))
+
+    def load_index(self, generation: int) -> np.ndarray:
+        """
+        以内存映射方式打开姓名索引
+
+        Args:
+            generation: 索引代数，0表示尚无索引
+
+        Returns:
+            姓名数组
+        """
+        if generation == 0:
+            return np.empty(0, dtype=str)
+        return np.load(self.index_path(generation), mmap_mode='r')
+
+    def read_log(self, start: int, end: int) -> List[str]:
+        """
+        读取姓名日志中[start, end)字节范围内的姓名
+
+        Args:
+            start: 起始字节偏移
+            end: 结束字节偏移（文件头中已提交的长度）
+
+        Returns:
+            姓名列表
+        """
+        if end <= start:
+            return []
+        with open(self.log_path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return [json.loads(line) for line in data.decode('utf-8').splitlines()]
+
+    def append(self, names: List[str], vectors: np.ndarray,
+               only_if_empty: bool = False) -> bool:
+        """
+        追加记录，写完数据后最后更新文件头完成提交
+
+        Args:
+            names: 姓名列表
+            vectors: 形状为(N, D)的float32特征
+            only_if_empty: 仅在存储为空时写入（用于多进程启动时导入旧数据）
+
+        Returns:
+            是否写入
+        """
+        with self.locked():
+            header = self.read_header()
+            if header is None:
+                header = np.array([_MAGIC, vectors.shape[1], 0, 0, 0, 0],
+                                  dtype='<u8')
+            if only_if_empty and int(header[COUNT]) > 0:
+                return False
+            dim, count = int(header[DIM]), int(header[COUNT])
+            if vectors.shape[1] != dim:
+                raise ValueError(
+                    f"特征维度不匹配: 期望 {dim}, 实际 {vectors.shape[1]}")
+
+            # 丢弃上次未提交的姓名（写入中途崩溃时可能残留）
+            with open(self.log_path, 'ab') as log:
+                log.truncate(int(header[LOG_BYTES]))
+                for name in names:
+                    log.write((json.dumps(name, ensure_ascii=False) + '\n')
+                              .encode('utf-8'))
+                header[LOG_BYTES] = log.tell()
+
+            mode = 'r+b' if os.path.exists(self.emb_path) else 'w+b'
+            with open(self.emb_path, mode) as f:
+                f.seek(HEADER_SIZE + count * dim * 4)
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+                f.flush()
+                header[COUNT] = count + len(names)
+                self._write_header(f, header)
+
+            if int(header[COUNT]) - int(header[INDEX_COUNT]) >= self.compact_every:
+                self._compact(header)
+        return True
+
+    def clear(self):
+        """
+        清空存储：切换到空的新一代姓名索引并将已提交行数归零
+
+        特征文件不截断，其他进程可能仍映射着其中的行；之后的追加从头覆盖旧行。
+        """
+        with self.locked():
+            header = self.read_header()
+            if header is None:
+                return
+            generation = int(header[GENERATION])
+            new_path = self.index_path(generation + 1)
+            with open(new_path + '.tmp', 'wb') as f:
+                np.save(f, np.empty(0, dtype=str))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(new_path + '.tmp', new_path)
+
+            with open(self.emb_path, 'r+b') as f:
+                header[COUNT] = 0
+                header[GENERATION] = generation + 1
+                header[INDEX_COUNT] = 0
+                header[LOG_BYTES] = 0
+                self._write_header(f, header)
+
+            with open(self.log_path, 'ab') as log:
+                log.truncate(0)
+            if generation > 0:
+                os.remove(self.index_path(generation))
+
+    def compact(self):
+        """将姓名日志合并进新一代索引"""
+        with self.locked():
+            header = self.read_header()
+            if header is not None:
+                self._compact(header)
+
+    def _compact(self, header: np.ndarray):
+        """在持有写锁时执行压缩"""
+        generation = int(header[GENERATION])
+        count = int(header[COUNT])
+        names = np.concatenate([
+            np.asarray(self.load_index(generation), dtype=str),
+            np.asarray(self.read_log(0, int(header[LOG_BYTES])), dtype=str),
+        ])[:count]
+
+        # 新索引写完后才切换文件头，崩溃时旧索引与日志仍然完整
+        new_path = self.index_path(generation + 1)
+        with open(new_path + '.tmp', 'wb') as f:
+            np.save(f, names)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(new_path + '.tmp', new_path)
+
+        with open(self.emb_path, 'r+b') as f:
+            header[GENERATION] = generation + 1
+            header[INDEX_COUNT] = count
+            header[LOG_BYTES] = 0
+            self._write_header(f, header)
+
+        with open(self.log_path, 'ab') as log:
+            log.truncate(0)
+        if generation > 0:
+            # 其他进程已映射的旧索引在关闭前仍然可读
+            os.remove(self.index_path(generation))
+
+    @staticmethod
+    def _write_header(f, header: np.ndarray):
+        """写入文件头"""
+        f.seek(0)
+        f.write(header.astype('<u8').tobytes())
+        f.flush()
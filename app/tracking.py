@@ -0,0 +1,218 @@
+"""
+人脸跟踪模块
+为视频流的每个客户端保存跟踪状态，稳定的人脸轨迹复用已识别的身份，
+只在关键帧或轨迹丢失时重新做完整检测与特征提取
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def box_iou(box_a: List[int], box_b: List[int]) -> float:
+    """
+    计算两个[x, y, w, h]边界框的交并比
+
+    Args:
+        box_a: 边界框A
+        box_b: 边界框B
+
+    Returns:
+        交并比，范围[0, 1]
+    """
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    """一条人脸轨迹及其最近一次的识别结果"""
+
+    __slots__ = ('track_id', 'box', 'result', 'missed')
+
+    def __init__(self, track_id: int, box: List[int], result: dict):
+        self.track_id = track_id
+        self.box = box
+        self.result = result
+        self.missed = 0
+
+
+class FaceTracker:
+    """单个视频流客户端的人脸跟踪状态"""
+
+    def __init__(self, keyframe_interval: Optional[int] = None,
+                 track_detector: Optional[str] = None,
+                 iou_threshold: float = 0.3, max_missed: int = 2):
+        """
+        初始化跟踪器
+
+        Args:
+            keyframe_interval: 每隔多少帧做一次完整检测与识别，
+                默认读取FACE_STREAM_KEYFRAME_INTERVAL
+            track_detector: 非关键帧使用的快速检测后端，
+                默认读取FACE_STREAM_TRACK_DETECTOR
+            iou_threshold: 检测框与轨迹关联所需的最小交并比
+            max_missed: 轨迹连续多少帧未匹配后视为丢失
+        """
+        if keyframe_interval is None:
+            keyframe_interval = int(os.getenv('FACE_STREAM_KEYFRAME_INTERVAL', '5'))
+        if track_detector is None:
+            track_detector = os.getenv('FACE_STREAM_TRACK_DETECTOR', 'opencv')
+
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.track_detector = track_detector
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks: List[Track] = []
+        self.frame_index = 0
+        self.lock = threading.Lock()
+        self._next_id = 1
+        self._force_keyframe = True
+
+    def is_keyframe(self) -> bool:
+        """当前帧是否需要完整检测与识别"""
+        return (self._force_keyframe or not self.tracks
+                or self.frame_index % self.keyframe_interval == 0)
+
+    def associate(self, faces: List[dict]) -> Tuple[Dict[int, Track], List[int]]:
+        """
+        按交并比贪心地将检测结果与已有轨迹关联
+
+        Args:
+            faces: 当前帧的人脸检测结果
+
+        Returns:
+            (人脸下标到轨迹的映射, 未关联的人脸下标列表)
+        """
+        candidates = []
+        for face_index, face in enumerate(faces):
+            for track in self.tracks:
+                iou = box_iou(face['box'], track.box)
+                if iou >= self.iou_threshold:
+                    candidates.append((iou, face_index, track))
+        candidates.sort(key=lambda item: item[0], reverse=True)
+
+        matched = {}
+        used_tracks = set()
+        for _, face_index, track in candidates:
+            if face_index in matched or track.track_id in used_tracks:
+                continue
+            matched[face_index] = track
+            used_tracks.add(track.track_id)
+
+        unmatched = [i for i in range(len(faces)) if i not in matched]
+        return matched, unmatched
+
+    def update(self, faces: List[dict], results: List[Optional[dict]],
+               matched: Dict[int, Track]):
+        """
+        用当前帧的结果更新轨迹，并为每个结果写入track_id
+
+        Args:
+            faces: 当前帧的人脸检测结果
+            results: 与faces对齐的识别结果，无法识别的人脸为None
+            matched: associate返回的人脸到轨迹映射
+        """
+        seen = set()
+        for face_index, (face, result) in enumerate(zip(faces, results)):
+            if result is None:
+                continue
+            track = matched.get(face_index)
+            if track is None:
+                track = Track(self._next_id, face['box'], result)
+                self._next_id += 1
+                self.tracks.append(track)
+            track.box = face['box']
+            track.result = result
+            track.missed = 0
+            result['track_id'] = track.track_id
+            seen.add(track.track_id)
+
+        alive = []
+        for track in self.tracks:
+            if track.track_id not in seen:
+                track.missed += 1
+            if track.missed <= self.max_missed:
+                alive.append(track)
+        # 有轨迹丢失时，下一帧重新做完整检测
+        self._force_keyframe = len(alive) < len(self.tracks)
+        self.tracks = alive
+        self.frame_index += 1
+
+
+class StreamSessions:
+    """视频流会话管理，按会话ID保存跟踪器并清理过期会话"""
+
+    def __init__(self, ttl: Optional[float] = None, max_sessions: Optional[int] = None):
+        """
+        初始化会话管理器
+
+        Args:
+            ttl: 会话空闲多少秒后过期，默认读取FACE_STREAM_SESSION_TTL
+            max_sessions: 最大会话数，超出时淘汰最久未活动的会话，
+                默认读取FACE_STREAM_MAX_SESSIONS
+        """
+        if ttl is None:
+            ttl = float(os.getenv('FACE_STREAM_SESSION_TTL', '60'))
+        if max_sessions is None:
+            max_sessions = int(os.getenv('FACE_STREAM_MAX_SESSIONS', '256'))
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _purge(self, now: float):
+        """清理过期会话（调用方持有锁）"""
+        while self._sessions:
+            session_id, (_, last_seen) = next(iter(self._sessions.items()))
+            if now - last_seen <= self.ttl:
+                break
+            del self._sessions[session_id]
+
+    def get(self, session_id: Optional[str] = None) -> Tuple[str, FaceTracker]:
+        """
+        获取会话的跟踪器，不存在时创建
+
+        Args:
+            session_id: 会话ID，为空时生成新ID
+
+        Returns:
+            (会话ID, 跟踪器)
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            session_id = session_id or uuid.uuid4().hex
+            if session_id in self._sessions:
+                tracker, _ = self._sessions.pop(session_id)
+            else:
+                tracker = FaceTracker()
+                while len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions[session_id] = (tracker, now)
+            return session_id, tracker
+
+    def close(self, session_id: str) -> bool:
+        """
+        结束会话
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            会话是否存在
+        """
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
@@ -0,0 +1,89 @@
+"""
+性能基准脚本
+离线运行识别流水线的基准测试并将结果写入JSON（默认tests/metrics.json，由dvc跟踪）
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.benchmark import Benchmark, environment
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def parse_sizes(value: str):
+    """解析逗号分隔的整数列表"""
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="运行识别流水线的离线性能基准")
+    parser.add_argument('--output', default='tests/metrics.json',
+                        help="结果JSON路径（默认tests/metrics.json）")
+    parser.add_argument('--gallery-sizes', type=parse_sizes,
+                        default=[1000, 10000, 100000],
+                        help="recognize_face测试的特征库规模（默认1k到100k，"
+                             "1M需显式指定，约需数GB内存）")
+    parser.add_argument('--faces', type=parse_sizes, default=[1, 5, 10, 20],
+                        help="recognize_image测试的每帧人脸数")
+    parser.add_argument('--concurrency', type=parse_sizes, default=[1, 8, 32],
+                        help="API吞吐量测试的并发数")
+    parser.add_argument('--queries', type=int, default=100,
+                        help="每种特征库规模的查询次数")
+    parser.add_argument('--enroll-count', type=int, default=200,
+                        help="录入吞吐量测试的录入次数")
+    parser.add_argument('--load-size', type=int, default=100000,
+                        help="数据库加载测试的特征数")
+    parser.add_argument('--api-requests', type=int, default=200,
+                        help="每种并发数发送的请求数")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--real-embedder', action='store_true',
+                        help="使用真实的FaceNet模型提取特征（需要模型权重）")
+    parser.add_argument('--only', choices=['recognize_face', 'recognize_image',
+                                           'enrollment', 'database_load', 'api'],
+                        action='append', help="只运行指定的测试，可重复指定")
+    args = parser.parse_args()
+
+    bench = Benchmark(seed=args.seed, real_embedder=args.real_embedder)
+    suites = {
+        'recognize_face': lambda: bench.recognize_face(args.gallery_sizes,
+                                                       queries=args.queries),
+        'recognize_image': lambda: bench.recognize_image(args.faces),
+        'enrollment': lambda: bench.enrollment(args.enroll_count),
+        'database_load': lambda: bench.database_load(args.load_size),
+        'api': lambda: bench.api(args.concurrency, requests=args.api_requests),
+    }
+
+    results = {'environment': environment(),
+               'config': {'seed': args.seed, 'real_embedder': args.real_embedder,
+                          'embedder_backend': os.getenv('FACE_EMBEDDER_BACKEND',
+                                                        'keras')}}
+    try:
+        for name, run in suites.items():
+            if args.only and name not in args.only:
+                continue
+            print(f"运行 {name} ...")
+            start = time.time()
+            results[name] = run()
+            print(f"  完成，耗时 {time.time() - start:.1f} 秒")
+    finally:
+        shutil.rmtree(bench.workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"结果已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
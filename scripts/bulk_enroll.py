@@ -0,0 +1,65 @@
+"""
+批量录入脚本
+从目录树批量录入人脸，子目录名即人员姓名，中断后再次运行会从上次进度继续
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.bulk_enroll import BulkEnroller
+from app.face_recognition import FaceRecognitionSystem
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def print_progress(stats: dict):
+    """打印批次进度"""
+    processed = stats['enrolled'] + stats['no_face'] + stats['failed']
+    rate = processed / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+    print(f"已处理 {processed} 张 | 录入 {stats['enrolled']} | "
+          f"无人脸 {stats['no_face']} | 失败 {stats['failed']} | "
+          f"跳过 {stats['skipped']} | {rate:.1f} 张/秒")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="批量录入人脸，目录结构为 <输入目录>/<姓名>/<图像文件>")
+    parser.add_argument('input_dir', help="输入目录")
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help="每批图像数（默认BULK_ENROLL_BATCH_SIZE）")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="解码与检测线程数（默认BULK_ENROLL_WORKERS）")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="忽略进度日志，从头开始录入")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_dir):
+        print(f"错误: 输入目录不存在: {args.input_dir}")
+        sys.exit(1)
+
+    face_system = FaceRecognitionSystem()
+    enroller = BulkEnroller(face_system, batch_size=args.batch_size,
+                            workers=args.workers)
+
+    print(f"开始批量录入: {args.input_dir}")
+    print(f"进度日志: {enroller.progress_path}")
+
+    try:
+        stats = enroller.run(args.input_dir, resume=not args.no_resume,
+                             progress=print_progress)
+    except KeyboardInterrupt:
+        print("已中断，再次运行同一命令即可继续")
+        sys.exit(130)
+
+    print(f"批量录入完成! 共录入 {stats['enrolled']} 张，耗时 {stats['elapsed']:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
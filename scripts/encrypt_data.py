@@ -1,7 +1,8 @@
 """
 数据加密脚本
-用于批量加密人脸图像数据
+用于批量加密人脸图像数据，多进程并行、分块流式加密，重复运行时跳过未变化的文件
 """
+import argparse
 import os
 import sys
 from pathlib import Path
@@ -10,72 +11,68 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from app.encryption import EncryptionManager
+from app.bulk_crypto import process_directory
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
-def encrypt_directory(input_dir: str, output_dir: str):
+def print_progress(stats: dict):
+    """打印进度"""
+    processed = stats['done'] + stats['skipped'] + stats['failed']
+    rate = processed / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+    print(f"进度 {processed}/{stats['total']} | 处理 {stats['done']} | "
+          f"跳过 {stats['skipped']} | 失败 {stats['failed']} | {rate:.1f} 个/秒")
+
+
+def encrypt_directory(input_dir: str, output_dir: str, workers: int = None,
+                      force: bool = False) -> dict:
     """
     加密目录中的所有图像文件
 
     Args:
         input_dir: 输入目录路径
         output_dir: 输出目录路径
+        workers: 并行进程数，默认读取CRYPTO_WORKERS
+        force: 是否重新加密未变化的文件
+
+    Returns:
+        统计信息
     """
-    manager = EncryptionManager()
-    
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
-    
-    # 支持的图像格式
-    image_extensions = {'.jpg', '.jpeg', '.png', '.bmp'}
-    
-    # 遍历输入目录
-    for root, dirs, files in os.walk(input_dir):
-        for filename in files:
-            file_path = os.path.join(root, filename)
-            file_ext = os.path.splitext(filename)[1].lower()
-            
-            if file_ext in image_extensions:
-                # 构建输出路径
-                relative_path = os.path.relpath(file_path, input_dir)
-                output_path = os.path.join(output_dir, relative_path + '.enc')
-                
-                # 确保输出子目录存在
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                
-                # 加密文件
-                try:
-                    manager.encrypt_file(file_path, output_path)
-                    print(f"已加密: {filename} -> {os.path.basename(output_path)}")
-                except Exception as e:
-                    print(f"加密失败 {filename}: {e}")
+
+    stats = process_directory(input_dir, output_dir, 'encrypt', workers=workers,
+                              force=force, progress=print_progress)
+    for file_path, error in stats['errors']:
+        print(f"加密失败 {file_path}: {error}")
+    return stats
 
 
 def main():
     """主函数"""
-    if len(sys.argv) < 3:
-        print("用法: python encrypt_data.py <输入目录> <输出目录>")
-        print("示例: python encrypt_data.py ./raw_images ./data/images")
-        sys.exit(1)
-    
-    input_dir = sys.argv[1]
-    output_dir = sys.argv[2]
-    
-    if not os.path.exists(input_dir):
-        print(f"错误: 输入目录不存在: {input_dir}")
+    parser = argparse.ArgumentParser(
+        description="批量加密图像文件",
+        epilog="示例: python encrypt_data.py ./raw_images ./data/images")
+    parser.add_argument('input_dir', help="输入目录")
+    parser.add_argument('output_dir', help="输出目录")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="并行进程数（默认CRYPTO_WORKERS或CPU核数）")
+    parser.add_argument('--force', action='store_true',
+                        help="重新加密所有文件，不跳过未变化的文件")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_dir):
+        print(f"错误: 输入目录不存在: {args.input_dir}")
         sys.exit(1)
-    
-    print(f"开始加密目录: {input_dir}")
-    print(f"输出目录: {output_dir}")
-    
-    encrypt_directory(input_dir, output_dir)
-    
+
+    print(f"开始加密目录: {args.input_dir}")
+    print(f"输出目录: {args.output_dir}")
+
+    encrypt_directory(args.input_dir, args.output_dir, args.workers, args.force)
+
     print("加密完成!")
 
 
 if __name__ == "__main__":
     main()
-
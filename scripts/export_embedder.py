@@ -0,0 +1,113 @@
+"""
+特征提取模型导出脚本
+将FaceNet导出为TFLite模型（可选int8量化），并与keras_facenet参考实现比较特征一致性
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+import numpy as np
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.embedders import (CompiledEmbedder, KerasEmbedder, TFLiteEmbedder,
+                           export_tflite, parity_check)
+from app.face_recognition import FaceRecognitionSystem
+from app.imaging import DecodedImage
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def load_crops(faces_dir: str, samples: int, seed: int) -> np.ndarray:
+    """
+    从图像目录检测并裁剪人脸，不足的部分用随机图像补齐
+
+    Args:
+        faces_dir: 图像目录（递归查找），为None时全部使用随机图像
+        samples: 需要的人脸数
+        seed: 随机种子
+
+    Returns:
+        形状为(samples, 160, 160, 3)的uint8人脸数组
+    """
+    crops = []
+    if faces_dir:
+        face_system = FaceRecognitionSystem()
+        for path in sorted(Path(faces_dir).rglob('*')):
+            if len(crops) >= samples:
+                break
+            if path.suffix.lower() not in IMAGE_EXTENSIONS:
+                continue
+            image = DecodedImage(path.read_bytes()).decode()
+            for face in face_system.detect_faces(image):
+                crop = face_system._crop_face(image.array, face)
+                if crop is not None:
+                    crops.append(crop)
+
+    if len(crops) < samples:
+        print(f"警告: 只找到 {len(crops)} 张人脸，其余使用随机图像"
+              "（int8校准建议提供真实人脸目录）")
+        rng = np.random.default_rng(seed)
+        random = rng.integers(0, 256, size=(samples - len(crops), 160, 160, 3))
+        crops.extend(random.astype(np.uint8))
+    return np.stack(crops[:samples])
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="导出FaceNet为TFLite模型并检查特征一致性")
+    parser.add_argument('--output', default=os.getenv('FACE_EMBEDDER_MODEL',
+                                                      'data/models/facenet.tflite'),
+                        help="输出的.tflite文件（默认FACE_EMBEDDER_MODEL）")
+    parser.add_argument('--quantize', choices=['none', 'dynamic', 'int8'],
+                        default='none',
+                        help="量化方式：none为float32，dynamic为int8权重，"
+                             "int8为权重与激活（默认none）")
+    parser.add_argument('--faces-dir', default=None,
+                        help="用于int8校准和一致性检查的人脸图像目录")
+    parser.add_argument('--samples', type=int, default=64,
+                        help="校准与一致性检查使用的人脸数（默认64）")
+    parser.add_argument('--min-cosine', type=float, default=0.99,
+                        help="与参考实现的最小余弦相似度，低于该值时失败（默认0.99）")
+    parser.add_argument('--check-compiled', action='store_true',
+                        help="同时检查tf_function后端的一致性")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    reference = KerasEmbedder()
+    facenet = reference.facenet
+    crops = load_crops(args.faces_dir, args.samples, args.seed)
+
+    print(f"导出TFLite模型 (quantize={args.quantize}) ...")
+    export_tflite(facenet.model, args.output,
+                  facenet.metadata.get('fixed_image_standardization', True),
+                  quantize=args.quantize, calibration=crops)
+    print(f"模型已写入: {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+    report = {'quantize': args.quantize,
+              'tflite': parity_check(reference, TFLiteEmbedder(args.output), crops)}
+    if args.check_compiled:
+        report['tf_function'] = parity_check(reference, CompiledEmbedder(facenet),
+                                             crops)
+
+    report_path = os.path.splitext(args.output)[0] + '.parity.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+    failed = [name for name, result in report.items()
+              if isinstance(result, dict) and result['min_cosine'] < args.min_cosine]
+    if failed:
+        print(f"错误: {', '.join(failed)} 与参考实现的余弦相似度低于 {args.min_cosine}")
+        sys.exit(1)
+    print("一致性检查通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+密钥轮换脚本
+用ENCRYPTION_KEY中的第一个（最新）密钥重新加密目录中的所有加密文件，
+中断后再次运行会从上次进度继续
+
+轮换步骤:
+    1. 生成新密钥，设置 ENCRYPTION_KEY=<新密钥>,<旧密钥> 并重启服务
+    2. 运行本脚本（或调用 POST /key_rotation）
+    3. 完成后从 ENCRYPTION_KEY 中移除旧密钥
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.encryption import EncryptionManager
+from app.key_rotation import KeyRotator
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def print_progress(stats: dict):
+    """打印批次进度"""
+    processed = stats['rotated'] + stats['failed']
+    rate = processed / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+    print(f"已轮换 {stats['rotated']} | 失败 {stats['failed']} | "
+          f"跳过 {stats['skipped']} | {rate:.1f} 个/秒")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="用最新密钥重新加密所有加密文件")
+    parser.add_argument('images_dir', nargs='?', default='data/images',
+                        help="加密图像目录（默认data/images）")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="并行线程数（默认KEY_ROTATION_WORKERS）")
+    parser.add_argument('--rate', type=float, default=None,
+                        help="每秒最多处理的文件数，0为不限速（默认KEY_ROTATION_RATE）")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="忽略进度日志，重新轮换所有文件")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.images_dir):
+        print(f"错误: 目录不存在: {args.images_dir}")
+        sys.exit(1)
+
+    manager = EncryptionManager()
+    if len(manager.keys) < 2:
+        print("提示: ENCRYPTION_KEY只配置了一个密钥，文件将用同一密钥重新加密")
+
+    rotator = KeyRotator(manager, workers=args.workers, rate=args.rate)
+    print(f"开始轮换: {args.images_dir} (目标密钥指纹 {manager.key_fingerprint})")
+
+    try:
+        stats = rotator.run(args.images_dir, resume=not args.no_resume,
+                            progress=print_progress)
+    except KeyboardInterrupt:
+        print("已中断，再次运行同一命令即可继续")
+        sys.exit(130)
+
+    print(f"轮换完成! 共轮换 {stats['rotated']} 个文件，失败 {stats['failed']} 个")
+    if stats['failed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,12 @@ let video = null;
 let canvas = null;
 let ctx = null;
 let isRecognizing = false;
-let recognitionInterval = null;
+let socket = null;
+let framesInFlight = 0;
+let captureCanvas = null;
+
+// 同时在途的最大帧数：下一帧的编码和传输与当前帧的推理重叠
+const MAX_FRAMES_IN_FLIGHT = 2;
 
 // 初始化
 document.addEventListener('DOMContentLoaded', async () => {
@@ -49,8 +54,8 @@ function toggleRecognition() {
     
     if (isRecognizing) {
         // 停止识别
-        clearInterval(recognitionInterval);
         isRecognizing = false;
+        closeSocket();
         btn.textContent = '开始识别';
         updateStatus('识别已停止');
         clearCanvas();
@@ -59,39 +64,74 @@ function toggleRecognition() {
         isRecognizing = true;
         btn.textContent = '停止识别';
         updateStatus('正在识别...');
-        recognitionInterval = setInterval(recognizeFaces, 1000);
+        openSocket();
     }
 }
 
-// 识别人脸
-async function recognizeFaces() {
-    if (!isRecognizing) return;
+// 建立识别用的WebSocket连接，帧以二进制JPEG发送
+function openSocket() {
+    const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
+    socket = new WebSocket(`${protocol}//${location.host}/ws/recognize`);
+    framesInFlight = 0;
 
-    try {
-        // 捕获当前帧
-        const imageData = captureFrame();
-        
-        // 发送到后端识别
-        const response = await fetch('/recognize_base64', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ image: imageData })
-        });
+    socket.addEventListener('open', () => {
+        for (let i = 0; i < MAX_FRAMES_IN_FLIGHT; i++) {
+            sendFrame();
+        }
+    });
 
-        const data = await response.json();
-        
-        // 显示结果
-        displayResults(data.results);
-        drawBoundingBoxes(data.results);
-        
-    } catch (error) {
-        console.error('识别错误:', error);
-        updateStatus('识别错误: ' + error.message);
+    socket.addEventListener('message', (event) => {
+        framesInFlight = Math.max(0, framesInFlight - 1);
+        const data = JSON.parse(event.data);
+
+        if (data.error) {
+            console.error('识别错误:', data.error);
+            updateStatus('识别错误: ' + data.error);
+        } else if (data.results && isRecognizing) {
+            // 显示结果
+            displayResults(data.results);
+            drawBoundingBoxes(data.results);
+        }
+        sendFrame();
+    });
+
+    socket.addEventListener('close', () => {
+        if (isRecognizing) {
+            updateStatus('连接已断开');
+            isRecognizing = false;
+            document.getElementById('toggleBtn').textContent = '开始识别';
+        }
+    });
+}
+
+// 关闭WebSocket连接
+function closeSocket() {
+    if (socket) {
+        socket.close();
+        socket = null;
     }
 }
 
+// 捕获一帧并以二进制发送，在途帧数达到上限时等待结果返回
+function sendFrame() {
+    if (!isRecognizing || !socket || socket.readyState !== WebSocket.OPEN) return;
+    if (framesInFlight >= MAX_FRAMES_IN_FLIGHT) return;
+
+    framesInFlight++;
+    const target = socket;
+    drawToCaptureCanvas().toBlob((blob) => {
+        // 连接已重建时计数已重置，不再处理旧连接的帧
+        if (target !== socket) return;
+        if (blob && target.readyState === WebSocket.OPEN) {
+            target.send(blob);
+            return;
+        }
+        // 编码失败（如视频尚未就绪）时归还在途名额，下一帧重试
+        framesInFlight = Math.max(0, framesInFlight - 1);
+        requestAnimationFrame(sendFrame);
+    }, 'image/jpeg', 0.8);
+}
+
 // 录入人脸
 async function enrollFace() {
     const nameInput = document.getElementById('nameInput');
@@ -138,14 +178,20 @@ async function enrollFace() {
     }
 }
 
+// 将当前视频帧绘制到复用的离屏画布
+function drawToCaptureCanvas() {
+    if (!captureCanvas) {
+        captureCanvas = document.createElement('canvas');
+    }
+    captureCanvas.width = video.videoWidth;
+    captureCanvas.height = video.videoHeight;
+    captureCanvas.getContext('2d').drawImage(video, 0, 0);
+    return captureCanvas;
+}
+
 // 捕获视频帧
 function captureFrame() {
-    const tempCanvas = document.createElement('canvas');
-    tempCanvas.width = video.videoWidth;
-    tempCanvas.height = video.videoHeight;
-    const tempCtx = tempCanvas.getContext('2d');
-    tempCtx.drawImage(video, 0, 0);
-    return tempCanvas.toDataURL('image/jpeg', 0.8);
+    return drawToCaptureCanvas().toDataURL('image/jpeg', 0.8);
 }
 
 // 显示识别结果
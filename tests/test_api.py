@@ -3,6 +3,7 @@ API端点测试
 """
 import pytest
 from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
 import os
 import sys
 import base64
@@ -15,6 +16,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 # 设置测试环境变量
 os.environ['ENCRYPTION_KEY'] = 'test-key-for-testing-only-32bytes='
 
+from app import main
 from app.main import app
 
 client = TestClient(app)
@@ -56,6 +58,7 @@ def test_health_check():
     assert "status" in data
     assert data["status"] == "healthy"
     assert "enrolled_faces" in data
+    assert "ready" in data
 
 
 def test_recognize_endpoint(sample_image_bytes):
@@ -82,6 +85,173 @@ def test_recognize_base64_endpoint(sample_image_base64):
     assert isinstance(data["results"], list)
 
 
+def test_metrics_endpoint(sample_image_bytes):
+    """测试/metrics以Prometheus文本格式导出各阶段耗时与队列深度"""
+    client.post("/recognize", files={"file": ("test.jpg", sample_image_bytes,
+                                              "image/jpeg")})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'face_stage_duration_seconds_count{stage="detect"}' in body
+    assert ('face_request_duration_seconds_count{route="/recognize",status="200"}'
+            in body)
+    assert 'face_faces_per_frame_bucket{le="+Inf"}' in body
+    assert "face_gallery_size " in body
+    assert "face_executor_pending " in body
+
+
+def test_recognize_profiling(sample_image_bytes, monkeypatch, tmp_path):
+    """测试携带令牌时返回分析报告，令牌错误时拒绝"""
+    monkeypatch.setattr(main.profiler, 'token', 'admin-secret')
+    monkeypatch.setattr(main.profiler, 'output_dir', str(tmp_path))
+    files = {"file": ("test.jpg", sample_image_bytes.getvalue(), "image/jpeg")}
+
+    response = client.post("/recognize", files=files,
+                           headers={"X-Profile-Token": "admin-secret"})
+    assert response.status_code == 200
+    report = response.json()["profile"]
+    assert "decode" in report["stages_ms"]
+    assert "detect" in report["stages_ms"]
+    assert report["top_functions"]
+    assert os.path.exists(report["path"])
+
+    response = client.post("/recognize?profile=wrong", files=files)
+    assert response.status_code == 403
+
+    response = client.post("/recognize", files=files)
+    assert "profile" not in response.json()
+
+
+def test_recognize_with_opencv_detector(sample_image_bytes):
+    """测试按请求选择OpenCV检测后端"""
+    files = {"file": ("test.jpg", sample_image_bytes, "image/jpeg")}
+    response = client.post("/recognize?detector=opencv", files=files)
+
+    assert response.status_code == 200
+    assert response.json()["results"] == []
+
+
+def test_recognize_with_unknown_detector(sample_image_base64):
+    """测试未知的检测后端返回400"""
+    response = client.post(
+        "/recognize_base64",
+        json={"image": sample_image_base64, "detector": "unknown"}
+    )
+
+    assert response.status_code == 400
+
+
+def test_recognize_stream_endpoint(sample_image_base64):
+    """测试视频流识别端点复用会话"""
+    response = client.post("/recognize_stream", json={"image": sample_image_base64})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["keyframe"] is True
+    assert isinstance(data["results"], list)
+
+    session_id = data["session_id"]
+    response = client.post("/recognize_stream", json={
+        "image": sample_image_base64, "session_id": session_id})
+    assert response.json()["session_id"] == session_id
+
+    response = client.delete(f"/recognize_stream/{session_id}")
+    assert response.json() == {"closed": True}
+
+
+def test_recognize_websocket(sample_image_bytes):
+    """测试WebSocket二进制帧识别按顺序返回结果"""
+    frame = sample_image_bytes.read()
+    with client.websocket_connect("/ws/recognize?detector=opencv") as websocket:
+        websocket.send_bytes(frame)
+        first = websocket.receive_json()
+        websocket.send_text("not an image")
+        error = websocket.receive_json()
+
+    assert first["frame"] == 0
+    assert first["keyframe"] is True
+    assert first["results"] == []
+    assert error["frame"] == 1
+    assert "error" in error
+
+
+def test_recognize_websocket_unknown_detector():
+    """测试WebSocket指定未知检测后端时拒绝连接"""
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect("/ws/recognize?detector=unknown") as websocket:
+            websocket.receive_json()
+    assert exc_info.value.code == 1008
+
+
+def test_recognize_batch_endpoint(sample_image_bytes):
+    """测试批量识别逐行返回NDJSON结果"""
+    import json
+    import zipfile
+
+    image = sample_image_bytes.read()
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('a.jpg', image)
+        zf.writestr('b.jpg', b'broken')
+    files = [
+        ("files", ("frame.jpg", image, "image/jpeg")),
+        ("files", ("frames.zip", archive.getvalue(), "application/zip")),
+    ]
+
+    response = client.post("/recognize_batch", files=files)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    by_name = {line["filename"]: line for line in lines}
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    assert by_name["frame.jpg"]["results"] == []
+    assert by_name["a.jpg"]["results"] == []
+    assert "error" in by_name["b.jpg"]
+
+
+def test_recognize_batch_limits_executor_share(sample_image_bytes, monkeypatch):
+    """测试批量识别合计在途数不超过准入上限，超大成员被拒绝"""
+    import json
+    import threading
+    import time
+    import zipfile
+    from app.executor import LowPriorityGate
+
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow_recognize(data, detector):
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+        return []
+
+    monkeypatch.setattr(main, '_recognize_bytes', slow_recognize)
+    monkeypatch.setattr(main, 'batch_gate', LowPriorityGate(main.executor, 2))
+    monkeypatch.setenv('BATCH_MAX_IMAGE_BYTES', '1000000')
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for i in range(6):
+            zf.writestr(f'{i}.jpg', b'frame')
+        zf.writestr('bomb.jpg', b'\0' * 2000000)
+
+    response = client.post("/recognize_batch",
+                           files=[("files", ("f.zip", archive.getvalue(),
+                                             "application/zip"))])
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sum('results' in line for line in lines) == 6
+    assert any('超过大小上限' in line.get('error', '') for line in lines)
+    assert max(peak) <= 2
+
+
 def test_enroll_endpoint(sample_image_bytes):
     """测试录入端点"""
     files = {"file": ("test.jpg", sample_image_bytes, "image/jpeg")}
@@ -104,6 +274,35 @@ def test_enroll_base64_endpoint(sample_image_base64):
     assert response.status_code in [200, 400]
 
 
+def test_enroll_bulk_rejects_outside_root(monkeypatch):
+    """测试批量录入拒绝BULK_ENROLL_ROOT之外的目录"""
+    monkeypatch.setattr(main, 'admin_token', 'admin-secret')
+    headers = {"X-Admin-Token": "admin-secret"}
+    response = client.post("/enroll_bulk", json={"directory": "../../etc"},
+                           headers=headers)
+    assert response.status_code == 400
+
+    response = client.get("/enroll_bulk/missing", headers=headers)
+    assert response.status_code == 404
+
+
+def test_admin_endpoints_require_token(monkeypatch):
+    """测试管理端点在未配置或令牌错误时拒绝"""
+    response = client.post("/key_rotation", json={},
+                           headers={"X-Admin-Token": ""})
+    assert response.status_code == 403
+
+    monkeypatch.setattr(main, 'admin_token', 'admin-secret')
+    response = client.post("/enroll_bulk", json={"directory": "."})
+    assert response.status_code == 403
+    response = client.post("/key_rotation", json={},
+                           headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == 403
+    response = client.delete("/key_rotation/missing",
+                             headers={"X-Admin-Token": "admin-secret"})
+    assert response.status_code == 404
+
+
 def test_enroll_without_name(sample_image_base64):
     """测试没有姓名的录入请求"""
     response = client.post(
@@ -0,0 +1,74 @@
+"""
+批量识别输入模块测试
+"""
+import io
+import os
+import sys
+import tarfile
+import zipfile
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.batch import ImageTooLargeError, is_archive, iter_uploads
+
+
+def _zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def _tar_bytes(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def test_is_archive():
+    """测试按扩展名识别压缩包"""
+    assert is_archive('footage.ZIP')
+    assert is_archive('footage.tar.gz')
+    assert not is_archive('frame.jpg')
+    assert not is_archive('')
+
+
+def test_iter_uploads_expands_archives():
+    """测试压缩包按成员展开，非图像成员被忽略"""
+    members = [('a/1.jpg', b'one'), ('readme.txt', b'skip'), ('b/2.png', b'two')]
+    uploads = [
+        ('single.jpg', io.BytesIO(b'zero')),
+        ('batch.zip', _zip_bytes(members)),
+        ('batch.tgz', _tar_bytes(members)),
+    ]
+
+    items = list(iter_uploads(uploads))
+
+    assert items == [
+        ('single.jpg', b'zero'),
+        ('a/1.jpg', b'one'), ('b/2.png', b'two'),
+        ('a/1.jpg', b'one'), ('b/2.png', b'two'),
+    ]
+
+
+def test_iter_uploads_rejects_oversized_members():
+    """测试超过大小上限的图像和压缩包成员被拒绝"""
+    bomb = [('ok.jpg', b'x' * 10), ('bomb.jpg', b'\0' * 4096)]
+    for archive in (_zip_bytes(bomb), _tar_bytes(bomb)):
+        name = 'frames.zip' if archive.getvalue()[:2] == b'PK' else 'frames.tgz'
+        items = iter_uploads([(name, archive)], max_bytes=100)
+        assert next(items) == ('ok.jpg', b'x' * 10)
+        with pytest.raises(ImageTooLargeError):
+            next(items)
+
+    with pytest.raises(ImageTooLargeError):
+        list(iter_uploads([('big.jpg', io.BytesIO(b'x' * 101))], max_bytes=100))
@@ -0,0 +1,59 @@
+"""
+性能基准测试
+以最小规模运行各项基准，确保基准套件本身可用
+"""
+import json
+import numpy as np
+import os
+import sys
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.benchmark import Benchmark, SyntheticDetector, SyntheticEmbedder, summarize
+
+
+def test_synthetic_models():
+    """测试合成检测器与特征模型的输出格式"""
+    faces = SyntheticDetector(5).detect(np.zeros((480, 640, 3), dtype=np.uint8))
+    assert len(faces) == 5
+    assert all(len(face['box']) == 4 and 'keypoints' in face for face in faces)
+
+    embeddings = SyntheticEmbedder(dim=16).embeddings(
+        np.ones((3, 160, 160, 3), dtype=np.uint8))
+    assert embeddings.shape == (3, 16)
+
+
+def test_summarize_percentiles():
+    """测试耗时统计"""
+    stats = summarize([0.001 * i for i in range(1, 101)])
+    assert stats['p50_ms'] == 50.5
+    assert stats['p95_ms'] == 95.0
+    assert stats['per_second'] > 0
+
+
+def test_benchmark_suite_produces_json(tmp_path):
+    """测试各项基准以小规模运行并输出可序列化的结果"""
+    bench = Benchmark(workdir=str(tmp_path))
+    threads_before = set(threading.enumerate())
+
+    results = {
+        'recognize_face': bench.recognize_face([100, 1000], queries=5),
+        'recognize_image': bench.recognize_image([1, 3], gallery_size=100, repeat=2),
+        'enrollment': bench.enrollment(count=3, gallery_size=100),
+        'database_load': bench.database_load(size=100, repeat=1),
+        'api': bench.api([2], requests=4, gallery_size=100),
+    }
+
+    assert set(results['recognize_face']) == {'100', '1000'}
+    assert results['recognize_image']['3']['faces_per_second'] > 0
+    assert results['enrollment']['throughput_per_second'] > 0
+    assert results['database_load']['file_bytes'] > 0
+    assert results['api']['2']['requests_per_second'] > 0
+    assert results['api']['2']['failed'] == 0
+    json.dumps(results)
+    # 各项基准结束后不遗留调度线程与图像写入线程
+    leaked = [thread.name for thread in set(threading.enumerate()) - threads_before
+              if thread.name.startswith(('inference-scheduler', 'image-writer'))]
+    assert leaked == []
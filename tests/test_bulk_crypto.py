@@ -0,0 +1,77 @@
+"""
+批量加解密模块测试
+"""
+import os
+import sys
+
+import pytest
+from cryptography.fernet import Fernet
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.bulk_crypto import process_directory
+
+
+@pytest.fixture
+def image_dir(tmp_path, monkeypatch):
+    """包含子目录和非图像文件的输入目录"""
+    monkeypatch.setenv('ENCRYPTION_KEY', Fernet.generate_key().decode())
+    root = tmp_path / "raw"
+    (root / "alice").mkdir(parents=True)
+    (root / "alice" / "1.jpg").write_bytes(os.urandom(3000))
+    (root / "alice" / "2.PNG").write_bytes(os.urandom(10))
+    (root / "bob.jpg").write_bytes(os.urandom(500))
+    (root / "notes.txt").write_text("ignored")
+    return root
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_encrypt_then_decrypt_directory(image_dir, tmp_path, workers):
+    """测试并行加密再解密后内容一致，目录结构保持不变"""
+    encrypted = tmp_path / "enc"
+    decrypted = tmp_path / "dec"
+
+    stats = process_directory(str(image_dir), str(encrypted), 'encrypt',
+                              workers=workers)
+    assert (stats['total'], stats['done'], stats['failed']) == (3, 3, 0)
+    assert (encrypted / "alice" / "1.jpg.enc").exists()
+
+    stats = process_directory(str(encrypted), str(decrypted), 'decrypt',
+                              workers=workers)
+    assert stats['done'] == 3
+    for name in ("alice/1.jpg", "alice/2.PNG", "bob.jpg"):
+        assert (decrypted / name).read_bytes() == (image_dir / name).read_bytes()
+
+
+def test_incremental_rerun_skips_unchanged(image_dir, tmp_path):
+    """测试重复运行只处理修改过的文件，force时全部重新处理"""
+    encrypted = tmp_path / "enc"
+    process_directory(str(image_dir), str(encrypted), 'encrypt', workers=1)
+
+    source = image_dir / "bob.jpg"
+    source.write_bytes(os.urandom(600))
+    os.utime(source, ns=(0, os.stat(source).st_mtime_ns + 10**9))
+    reports = []
+    stats = process_directory(str(image_dir), str(encrypted), 'encrypt', workers=1,
+                              progress=reports.append)
+
+    assert (stats['done'], stats['skipped']) == (1, 2)
+    assert reports[-1]['done'] == 1
+
+    stats = process_directory(str(image_dir), str(encrypted), 'encrypt', workers=1,
+                              force=True)
+    assert stats['done'] == 3
+
+
+def test_failures_are_reported(image_dir, tmp_path):
+    """测试无法解密的文件计入失败并返回原因"""
+    encrypted = tmp_path / "enc"
+    encrypted.mkdir()
+    (encrypted / "bad.jpg.enc").write_bytes(b"not a token")
+
+    stats = process_directory(str(encrypted), str(tmp_path / "dec"), 'decrypt',
+                              workers=1)
+
+    assert stats['failed'] == 1
+    assert stats['errors'][0][0].endswith("bad.jpg.enc")
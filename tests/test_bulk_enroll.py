@@ -0,0 +1,174 @@
+"""
+批量录入模块测试
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.bulk_enroll import BulkEnroller, BulkEnrollJob, iter_images
+from app.face_recognition import FaceRecognitionSystem
+
+
+@pytest.fixture
+def face_system(tmp_path, monkeypatch):
+    """检测结果固定的人脸识别系统，非白色图像视为包含一张人脸"""
+    os.environ['ENCRYPTION_KEY'] = 'test-key-for-testing-only-32bytes='
+    system = FaceRecognitionSystem(data_path=str(tmp_path / "db" / "faces.npz"),
+                                   images_dir=str(tmp_path / "images"))
+
+    def fake_detect(image, detector=None):
+        if np.asarray(image).min() == 255:
+            return []
+        return [{'box': [10, 10, 60, 60], 'confidence': 0.99}]
+
+    monkeypatch.setattr(system, 'detect_faces', fake_detect)
+    return system
+
+
+@pytest.fixture
+def photo_dir(tmp_path):
+    """目录结构为 <姓名>/<图像文件> 的样本目录"""
+    root = tmp_path / "photos"
+    for name, count in [('alice', 3), ('bob', 2)]:
+        (root / name).mkdir(parents=True)
+        for i in range(count):
+            pixels = np.random.randint(0, 200, (100, 100, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(root / name / f"{i}.jpg")
+    Image.new('RGB', (100, 100), 'white').save(root / 'bob' / 'blank.png')
+    (root / 'bob' / 'broken.jpg').write_bytes(b'not an image')
+    (root / 'bob' / 'notes.txt').write_text('ignored')
+    Image.new('RGB', (100, 100)).save(root / 'top_level.jpg')
+    return root
+
+
+def test_iter_images_uses_folder_name(photo_dir):
+    """测试按目录名确定姓名，并忽略非图像文件和顶层文件"""
+    items = list(iter_images(str(photo_dir)))
+
+    assert [name for name, _ in items] == ['alice'] * 3 + ['bob'] * 4
+    assert all(path.endswith(('.jpg', '.png')) for _, path in items)
+
+
+def test_bulk_enroll_batches(face_system, photo_dir):
+    """测试批量录入统计、特征库提交与加密图像写入"""
+    calls = []
+    enroller = BulkEnroller(face_system, batch_size=2, workers=2)
+    stats = enroller.run(str(photo_dir), progress=calls.append)
+
+    assert stats['enrolled'] == 5
+    assert stats['no_face'] == 1
+    assert stats['failed'] == 1
+    assert len(calls) == 4
+    assert sorted(face_system.gallery.names) == ['alice'] * 3 + ['bob'] * 2
+    assert len(os.listdir(face_system.images_dir)) == 5
+
+    reloaded = FaceRecognitionSystem(data_path=face_system.data_path,
+                                     images_dir=face_system.images_dir)
+    assert len(reloaded.gallery) == 5
+
+
+def test_bulk_enroll_resume(face_system, photo_dir):
+    """测试续传时跳过已处理的文件，失败的文件会重试"""
+    BulkEnroller(face_system, batch_size=4).run(str(photo_dir))
+
+    stats = BulkEnroller(face_system, batch_size=4).run(str(photo_dir))
+
+    assert stats['skipped'] == 6
+    assert stats['enrolled'] == 0
+    assert stats['failed'] == 1
+    assert len(face_system.gallery) == 5
+
+    # 不续传时重新处理所有文件，但内容已录入的图像不会再次写入特征库
+    stats = BulkEnroller(face_system).run(str(photo_dir), resume=False)
+    assert stats['enrolled'] == 0
+    assert stats['skipped'] == 5
+    assert len(face_system.gallery) == 5
+    assert len(os.listdir(face_system.images_dir)) == 5
+
+
+def test_bulk_enroll_crash_before_progress_log(face_system, photo_dir):
+    """测试特征库已提交但进度日志未写入时，续传不会重复录入"""
+    enroller = BulkEnroller(face_system, batch_size=4)
+    enroller.run(str(photo_dir))
+    # 模拟提交特征库后、写入进度日志前中断
+    os.remove(enroller.progress_path)
+
+    stats = BulkEnroller(face_system, batch_size=4).run(str(photo_dir))
+    assert stats['enrolled'] == 0
+    assert len(face_system.gallery) == 5
+
+    reloaded = FaceRecognitionSystem(data_path=face_system.data_path,
+                                     images_dir=face_system.images_dir)
+    assert len(reloaded.gallery) == 5
+
+
+def test_bulk_enroll_crash_before_gallery_commit(face_system, photo_dir):
+    """测试摘要已记录但特征库未提交时，这些图像在重新运行时仍会录入"""
+    enroller = BulkEnroller(face_system, batch_size=4)
+    enroller.run(str(photo_dir))
+    # 模拟数据库保存前中断：摘要记录指向不存在的行
+    os.remove(face_system.data_path)
+    empty = FaceRecognitionSystem(data_path=face_system.data_path,
+                                  images_dir=face_system.images_dir)
+    empty.detect_faces = face_system.detect_faces
+
+    stats = BulkEnroller(empty, batch_size=4).run(str(photo_dir), resume=False)
+    assert stats['enrolled'] == 5
+    assert len(empty.gallery) == 5
+
+
+def test_bulk_enroll_leaves_no_orphan_images(face_system, photo_dir, monkeypatch):
+    """测试重复内容与提交失败的批次不会留下加密图像文件"""
+    import shutil
+
+    (photo_dir / 'carol').mkdir()
+    shutil.copy(photo_dir / 'alice' / '0.jpg', photo_dir / 'carol' / 'copy.jpg')
+    stats = BulkEnroller(face_system, batch_size=16).run(str(photo_dir))
+    assert stats['enrolled'] == 5
+    assert len(os.listdir(face_system.images_dir)) == 5
+
+    (photo_dir / 'dave').mkdir()
+    Image.fromarray(np.random.randint(0, 200, (100, 100, 3), dtype=np.uint8)).save(
+        photo_dir / 'dave' / '0.jpg')
+
+    def failing_add(names, embeddings):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(face_system, 'add_faces', failing_add)
+    with pytest.raises(OSError):
+        BulkEnroller(face_system, batch_size=16).run(str(photo_dir))
+    assert len(os.listdir(face_system.images_dir)) == 5
+
+
+def test_bulk_enroll_through_submit(face_system, photo_dir):
+    """测试指定submit时解码、检测与特征提取都经由它执行"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    calls = []
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        def submit(fn, *args):
+            calls.append(fn.__name__)
+            return pool.submit(fn, *args)
+
+        stats = BulkEnroller(face_system, batch_size=4, submit=submit).run(
+            str(photo_dir))
+
+    assert stats['enrolled'] == 5
+    assert calls.count('_prepare') == 7
+    assert calls.count('_embed_crops') == 2
+
+
+def test_bulk_enroll_job(face_system, photo_dir):
+    """测试后台任务完成后报告统计信息"""
+    job = BulkEnrollJob(BulkEnroller(face_system), str(photo_dir))
+    job.join(timeout=30)
+
+    state = job.to_dict()
+    assert state['status'] == 'completed'
+    assert state['stats']['enrolled'] == 5
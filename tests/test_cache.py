@@ -0,0 +1,65 @@
+"""
+特征缓存模块测试
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.cache import CacheEntry, EmbeddingCache, image_key
+
+
+def _entry(faces=1):
+    return CacheEntry([{'box': [0, 0, 1, 1]}] * faces,
+                      np.zeros((faces, 128), dtype=np.float32), [], 0)
+
+
+def test_image_key_depends_on_content_and_context():
+    """测试缓存键随图像内容和检测参数变化"""
+    image = np.zeros((4, 4, 3), dtype=np.uint8)
+    other = image.copy()
+    other[0, 0, 0] = 1
+
+    assert image_key(image, 'mtcnn') == image_key(image.copy(), 'mtcnn')
+    assert image_key(image, 'mtcnn') != image_key(other, 'mtcnn')
+    assert image_key(image, 'mtcnn') != image_key(image, 'opencv')
+    assert image_key(image) != image_key(image.reshape(4, 12, 1))
+
+
+def test_lru_eviction_by_bytes():
+    """测试超出内存上限时淘汰最久未使用的项"""
+    size = _entry().size
+    cache = EmbeddingCache(max_bytes=size * 2, ttl=60)
+    cache.put('a', _entry())
+    cache.put('b', _entry())
+    assert cache.get('a') is not None
+    cache.put('c', _entry())
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['bytes'] == size * 2
+    assert (stats['hits'], stats['misses']) == (3, 1)
+
+    cache.put('big', _entry(faces=10))
+    assert cache.get('big') is None
+
+
+def test_ttl_expiry_and_disabled():
+    """测试过期项视为未命中，容量为0时禁用缓存"""
+    cache = EmbeddingCache(max_bytes=1 << 20, ttl=0.01)
+    cache.put('a', _entry())
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+    disabled = EmbeddingCache(max_bytes=0)
+    assert not disabled.enabled
+    disabled.put('a', _entry())
+    assert disabled.get('a') is None
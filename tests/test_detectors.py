@@ -0,0 +1,39 @@
+"""
+人脸检测后端测试
+"""
+import pytest
+import numpy as np
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.detectors import OpenCVDetector, create_detector
+
+
+def test_create_unknown_detector():
+    """测试未知后端名称会被拒绝"""
+    with pytest.raises(ValueError):
+        create_detector('unknown')
+
+
+def test_opencv_detector_on_blank_image():
+    """测试OpenCV检测器在空白图像上返回空列表"""
+    detector = create_detector('opencv')
+    faces = detector.detect(np.full((480, 640, 3), 255, dtype=np.uint8))
+
+    assert isinstance(detector, OpenCVDetector)
+    assert faces == []
+
+
+def test_estimated_keypoints_inside_box():
+    """测试估计的关键点与MTCNN格式一致且位于人脸框内"""
+    keypoints = OpenCVDetector.estimate_keypoints([100, 50, 80, 100])
+
+    assert set(keypoints) == {'left_eye', 'right_eye', 'nose',
+                              'mouth_left', 'mouth_right'}
+    for x, y in keypoints.values():
+        assert 100 <= x <= 180
+        assert 50 <= y <= 150
+    assert keypoints['left_eye'][0] < keypoints['right_eye'][0]
@@ -0,0 +1,93 @@
+"""
+特征提取后端测试
+"""
+import pytest
+import numpy as np
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.embedders import (CompiledEmbedder, KerasEmbedder, TFLiteEmbedder, _bucket,
+                           create_embedder, export_tflite, parity_check)
+
+tf = pytest.importorskip('tensorflow')
+
+
+class TinyFaceNet:
+    """与keras_facenet.FaceNet接口相同的小模型"""
+
+    def __init__(self):
+        tf.random.set_seed(0)
+        self.metadata = {'image_size': 160, 'fixed_image_standardization': True}
+        self.model = tf.keras.Sequential([
+            tf.keras.layers.Input((None, None, 3)),
+            tf.keras.layers.Conv2D(8, 5, strides=4, activation='relu'),
+            tf.keras.layers.GlobalAveragePooling2D(),
+            tf.keras.layers.Dense(16),
+        ])
+
+    def embeddings(self, images):
+        X = (np.float32(images) - 127.5) / 127.5
+        return self.model.predict(X, verbose=0)
+
+
+@pytest.fixture(scope='module')
+def facenet():
+    return TinyFaceNet()
+
+
+@pytest.fixture
+def crops():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(5, 160, 160, 3)).astype(np.uint8)
+
+
+def test_bucket():
+    """测试批大小补齐到2的幂"""
+    assert [_bucket(n, 32) for n in (1, 2, 3, 5, 17, 32)] == [1, 2, 4, 8, 32, 32]
+    assert _bucket(7, 6) == 6
+
+
+def test_compiled_embedder_matches_reference(facenet, crops):
+    """测试tf_function后端在补齐和分块后与参考实现一致"""
+    compiled = CompiledEmbedder(facenet, jit_compile=False, max_batch=4)
+    expected = KerasEmbedder(facenet).embeddings(crops)
+
+    np.testing.assert_allclose(compiled.embeddings(crops), expected, atol=1e-5)
+    np.testing.assert_allclose(compiled.embeddings(crops[:1]), expected[:1], atol=1e-5)
+    with pytest.raises(ValueError):
+        compiled.embeddings(np.zeros((1, 80, 80, 3), dtype=np.uint8))
+
+
+@pytest.mark.parametrize('quantize, min_cosine', [('none', 0.9999), ('int8', 0.95)])
+def test_tflite_export_parity(tmp_path, facenet, crops, quantize, min_cosine):
+    """测试导出的TFLite模型与参考实现的特征一致"""
+    path = export_tflite(facenet.model, str(tmp_path / 'facenet.tflite'),
+                         quantize=quantize, calibration=crops)
+    embedder = TFLiteEmbedder(path, threads=1)
+    report = parity_check(KerasEmbedder(facenet), embedder, crops)
+
+    assert report['samples'] == len(crops)
+    assert report['min_cosine'] >= min_cosine
+    # 批大小变化时重新分配张量
+    assert embedder.embeddings(crops[:2]).shape == (2, 16)
+
+
+def test_export_rejects_bad_options(tmp_path, facenet):
+    """测试量化参数校验"""
+    with pytest.raises(ValueError):
+        export_tflite(facenet.model, str(tmp_path / 'a.tflite'), quantize='int4')
+    with pytest.raises(ValueError):
+        export_tflite(facenet.model, str(tmp_path / 'a.tflite'), quantize='int8')
+
+
+def test_create_embedder(tmp_path, facenet, monkeypatch):
+    """测试按名称创建后端"""
+    assert isinstance(create_embedder('keras', facenet), KerasEmbedder)
+    with pytest.raises(ValueError):
+        create_embedder('onnx', facenet)
+    monkeypatch.setenv('FACE_EMBEDDER_MODEL', str(tmp_path / 'missing.tflite'))
+    with pytest.raises(FileNotFoundError):
+        create_embedder('tflite')
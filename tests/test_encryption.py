@@ -0,0 +1,125 @@
+"""
+加密模块测试
+"""
+import io
+import os
+import sys
+
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.encryption import CHUNK_MAGIC, EncryptionManager
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """使用随机密钥的加密管理器"""
+    monkeypatch.setenv('ENCRYPTION_KEY', Fernet.generate_key().decode())
+    return EncryptionManager()
+
+
+@pytest.mark.parametrize('size', [0, 1, 100, 256, 1000])
+def test_stream_roundtrip(manager, size):
+    """测试分块加密后可以完整解密，包括空数据和块边界"""
+    data = os.urandom(size)
+    encrypted = io.BytesIO()
+    manager.encrypt_stream(io.BytesIO(data), encrypted, chunk_size=100)
+
+    assert encrypted.getvalue().startswith(CHUNK_MAGIC)
+    assert manager.decrypt(encrypted.getvalue()) == data
+
+
+def test_decrypt_file_accepts_both_formats(manager, tmp_path):
+    """测试解密文件同时支持整体加密和分块格式"""
+    data = os.urandom(5000)
+    legacy = tmp_path / "legacy.enc"
+    legacy.write_bytes(manager.encrypt(data))
+    plain = tmp_path / "plain.bin"
+    plain.write_bytes(data)
+    chunked = tmp_path / "chunked.enc"
+    manager.encrypt_file(str(plain), str(chunked), chunk_size=1024)
+
+    for source in (legacy, chunked):
+        output = tmp_path / (source.name + ".out")
+        manager.decrypt_file(str(source), str(output))
+        assert output.read_bytes() == data
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_truncated_stream_is_rejected(manager, tmp_path):
+    """测试分块密文被截断时解密失败且不留下输出文件"""
+    encrypted = io.BytesIO()
+    manager.encrypt_stream(io.BytesIO(os.urandom(1000)), encrypted, chunk_size=100)
+    truncated = tmp_path / "truncated.enc"
+    truncated.write_bytes(encrypted.getvalue()[:-200])
+    output = tmp_path / "out.bin"
+
+    with pytest.raises(InvalidToken):
+        manager.decrypt_file(str(truncated), str(output))
+    assert not output.exists()
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_multiple_keys_decrypt_and_rotate(monkeypatch):
+    """测试多密钥时旧密钥的数据仍可解密，轮换后只需新密钥"""
+    old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+    monkeypatch.setenv('ENCRYPTION_KEY', old_key)
+    old = EncryptionManager()
+    legacy = old.encrypt(b'legacy')
+    chunked = io.BytesIO()
+    old.encrypt_stream(io.BytesIO(b'x' * 250), chunked, chunk_size=100)
+
+    monkeypatch.setenv('ENCRYPTION_KEY', f"{new_key}, {old_key}")
+    both = EncryptionManager()
+    assert both.keys == [new_key, old_key]
+    assert both.decrypt(legacy) == b'legacy'
+
+    monkeypatch.setenv('ENCRYPTION_KEY', new_key)
+    new = EncryptionManager()
+    assert new.decrypt(both.rotate(legacy)) == b'legacy'
+    assert new.decrypt(both.rotate(chunked.getvalue())) == b'x' * 250
+    assert new.key_fingerprint == both.key_fingerprint != old.key_fingerprint
+    with pytest.raises(InvalidToken):
+        new.decrypt(legacy)
+
+
+def test_rotate_rejects_truncated_stream(manager, tmp_path):
+    """测试轮换时在块边界处被截断的密文被拒绝，原文件保持不变"""
+    encrypted = io.BytesIO()
+    manager.encrypt_stream(io.BytesIO(os.urandom(1000)), encrypted, chunk_size=100)
+    data = encrypted.getvalue()
+    # 去掉最后一个完整的块，剩余部分在块边界上结束
+    last = len(data)
+    offset = len(CHUNK_MAGIC)
+    while offset < len(data):
+        last = offset
+        offset += 4 + int.from_bytes(data[offset:offset + 4], 'big')
+    path = tmp_path / "truncated.enc"
+    path.write_bytes(data[:last])
+
+    with pytest.raises(InvalidToken):
+        manager.rotate(data[:last])
+    with pytest.raises(InvalidToken):
+        manager.rotate_file(str(path))
+    assert path.read_bytes() == data[:last]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_concurrent_rotate_file(manager, tmp_path):
+    """测试多个线程同时轮换同一文件时使用各自的临时文件"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    data = os.urandom(20000)
+    plain = tmp_path / "plain.bin"
+    plain.write_bytes(data)
+    path = tmp_path / "image.enc"
+    manager.encrypt_file(str(plain), str(path), chunk_size=100)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: manager.rotate_file(str(path)), range(8)))
+
+    assert manager.decrypt(path.read_bytes()) == data
+    assert not list(tmp_path.glob("*.tmp"))
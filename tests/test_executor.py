@@ -0,0 +1,82 @@
+"""
+推理执行器测试
+"""
+import pytest
+import asyncio
+import os
+import sys
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.executor import ExecutorBusyError, InferenceExecutor, LowPriorityGate
+
+
+def test_run_returns_result():
+    """测试任务在线程池中执行并返回结果"""
+    executor = InferenceExecutor(max_workers=2, max_queue=0)
+    result = asyncio.run(executor.run(lambda a, b: a + b, 1, b=2))
+
+    assert result == 3
+    assert executor.pending == 0
+    executor.shutdown()
+
+
+def test_rejects_when_queue_full():
+    """测试执行中与排队任务达到上限时拒绝新任务"""
+    executor = InferenceExecutor(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        first = asyncio.ensure_future(executor.run(release.wait))
+        second = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        assert executor.pending == 2
+
+        with pytest.raises(ExecutorBusyError):
+            await executor.run(release.wait)
+
+        release.set()
+        await asyncio.gather(first, second)
+
+    asyncio.run(scenario())
+    assert executor.pending == 0
+    executor.shutdown()
+
+
+def test_low_priority_gate_waits_for_idle_worker():
+    """测试低优先级任务限制合计在途数，只在有空闲线程时提交且不轮询"""
+    executor = InferenceExecutor(max_workers=2, max_queue=4)
+    gate = LowPriorityGate(executor, max_inflight=2)
+    release = threading.Event()
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def task(i):
+        with lock:
+            running.append(i)
+            peak.append(len(running))
+        release.wait(timeout=5)
+        with lock:
+            running.remove(i)
+        return i
+
+    async def scenario():
+        # 交互式任务占用一个线程，低优先级任务只能使用剩下的一个
+        interactive = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.02)
+        batch = [asyncio.ensure_future(gate.run(task, i)) for i in range(5)]
+        await asyncio.sleep(0.05)
+        assert executor.pending == 2
+        assert len(running) == 1
+        release.set()
+        results = await asyncio.gather(*batch)
+        await interactive
+        return results
+
+    assert asyncio.run(scenario()) == list(range(5))
+    assert max(peak) <= 2
+    assert executor.pending == 0
+    executor.shutdown()
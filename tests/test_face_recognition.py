@@ -38,11 +38,28 @@ def sample_image():
 def test_face_system_initialization(face_system):
     """测试人脸识别系统初始化"""
     assert face_system is not None
-    assert face_system.names == []
-    assert face_system.embeddings == []
+    assert len(face_system.gallery) == 0
     assert face_system.threshold > 0
 
 
+def test_models_load_lazily(face_system):
+    """测试构造实例时不加载模型，首次使用时才加载"""
+    assert face_system.model_status == 'not_loaded'
+    assert not face_system.ready
+
+    face_system.detect_faces(Image.new('RGB', (64, 64)))
+
+    assert face_system.ready
+
+
+def test_warm_up_marks_ready(face_system):
+    """测试后台预热完成后报告就绪"""
+    face_system.start_warmup().join()
+
+    assert face_system.model_status == 'ready'
+    assert face_system.model_error is None
+
+
 def test_detect_faces_empty_image(face_system, sample_image):
     """测试在空白图像上检测人脸"""
     faces = face_system.detect_faces(sample_image)
@@ -50,14 +67,33 @@ def test_detect_faces_empty_image(face_system, sample_image):
     assert isinstance(faces, list)
 
 
+def test_map_faces_to_original_resolution(face_system):
+    """测试缩小图像上的检测框与关键点映射回原图坐标"""
+    faces = [{
+        'box': [10, 20, 30, 40],
+        'confidence': 0.99,
+        'keypoints': {'nose': (25, 40)}
+    }]
+
+    mapped = face_system._map_faces(faces, 4.0, 4.0)
+
+    assert mapped[0]['box'] == [40, 80, 120, 160]
+    assert mapped[0]['keypoints'] == {'nose': (100, 160)}
+    assert mapped[0]['confidence'] == 0.99
+    assert faces[0]['box'] == [10, 20, 30, 40]
+
+
+def test_detect_faces_downscaled(face_system):
+    """测试大图在缩小后检测"""
+    face_system.detection_max_side = 640
+    faces = face_system.detect_faces(Image.new('RGB', (3840, 2160), color='white'))
+    assert isinstance(faces, list)
+
+
 def test_database_save_and_load(face_system, tmp_path):
     """测试数据库保存和加载"""
     # 添加测试数据
-    face_system.names = ['Alice', 'Bob']
-    face_system.embeddings = [
-        np.random.rand(128),
-        np.random.rand(128)
-    ]
+    face_system.gallery.extend(['Alice', 'Bob'], np.random.rand(2, 128))
     
     # 保存
     face_system._save_database()
@@ -68,8 +104,54 @@ def test_database_save_and_load(face_system, tmp_path):
         images_dir=face_system.images_dir
     )
     
-    assert new_system.names == ['Alice', 'Bob']
-    assert len(new_system.embeddings) == 2
+    assert new_system.gallery.names.tolist() == ['Alice', 'Bob']
+    assert new_system.gallery.matrix.shape == (2, 128)
+
+
+def test_concurrent_add_faces(face_system):
+    """测试并发录入不丢失行，姓名与特征保持对齐"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def enroll(worker):
+        for i in range(100):
+            vector = np.zeros((1, 16))
+            vector[0, worker] = i + 1
+            face_system.add_faces([f'w{worker}_{i}'], vector)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(enroll, range(4)))
+
+    assert len(face_system.gallery) == 400
+    for name, row in zip(face_system.gallery.names, face_system.gallery.matrix):
+        assert int(np.argmax(row)) == int(name[1])
+    data = np.load(face_system.data_path)
+    assert len(data['names']) == 400
+
+
+def test_quantized_database_save_and_load(face_system, monkeypatch):
+    """测试int8量化数据库的保存、加载以及从float32数据库迁移"""
+    embeddings = np.random.rand(3, 128)
+    face_system.add_faces(['Alice', 'Bob', 'Carol'], embeddings)
+
+    monkeypatch.setenv('FACE_EMBEDDING_DTYPE', 'int8')
+    migrated = FaceRecognitionSystem(data_path=face_system.data_path,
+                                     images_dir=face_system.images_dir)
+    migrated.add_faces(['Dave'], np.random.rand(1, 128))
+    data = np.load(face_system.data_path)
+    assert data['embeddings'].dtype == np.int8
+    assert data['scales'].shape == (4,)
+
+    restored = FaceRecognitionSystem(data_path=face_system.data_path,
+                                     images_dir=face_system.images_dir)
+    assert restored.gallery.names.tolist() == ['Alice', 'Bob', 'Carol', 'Dave']
+    name, distance = restored.recognize_face(embeddings[1])
+    assert name == 'Bob'
+    assert distance < 1e-3
+
+    monkeypatch.setenv('FACE_EMBEDDING_DTYPE', 'float32')
+    reverted = FaceRecognitionSystem(data_path=face_system.data_path,
+                                     images_dir=face_system.images_dir)
+    assert reverted.recognize_face(embeddings[2])[0] == 'Carol'
 
 
 def test_recognize_face_empty_database(face_system):
@@ -85,8 +167,7 @@ def test_recognize_face_with_data(face_system):
     """测试在有数据的数据库中识别人脸"""
     # 添加已知人脸
     known_embedding = np.random.rand(128)
-    face_system.names = ['TestPerson']
-    face_system.embeddings = [known_embedding]
+    face_system.gallery.add('TestPerson', known_embedding)
     
     # 测试识别相同的embedding（距离应该为0）
     name, distance = face_system.recognize_face(known_embedding)
@@ -95,6 +176,77 @@ def test_recognize_face_with_data(face_system):
     # 注意：由于是随机embedding，可能无法准确识别
 
 
+def test_match_faces_top_k(face_system):
+    """测试批量检索返回按距离排序的前k个候选"""
+    embeddings = np.random.rand(5, 128)
+    face_system.gallery.extend(['A', 'B', 'C', 'D', 'E'], embeddings)
+
+    matches = face_system.match_faces(embeddings[[2, 4]], top_k=3)
+
+    assert len(matches) == 2
+    assert [len(m) for m in matches] == [3, 3]
+    assert matches[0][0]['name'] == 'C'
+    assert matches[1][0]['name'] == 'E'
+    distances = [m['distance'] for m in matches[0]]
+    assert distances == sorted(distances)
+
+
+def test_get_embeddings_batches_faces(face_system):
+    """测试一次批量提取多个人脸特征，并跳过无效边界框"""
+    image = Image.fromarray(
+        np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8))
+    faces = [
+        {'box': [10, 10, 100, 120]},
+        {'box': [700, 500, 50, 50]},  # 超出图像范围
+        {'box': [200, 150, 80, 90]},
+    ]
+
+    kept, embeddings = face_system.get_embeddings(image, faces)
+
+    assert kept == [faces[0], faces[2]]
+    assert embeddings.shape[0] == 2
+    np.testing.assert_allclose(
+        embeddings[1], face_system.get_embedding(image, faces[2]), atol=1e-5)
+
+
+def test_profiled_embeddings_capture_inference(face_system, tmp_path):
+    """测试被分析的请求在本线程推理，报告包含FaceNet耗时"""
+    from app.profiling import RequestProfiler
+
+    profiler = RequestProfiler(token='secret', output_dir=str(tmp_path), top=1000)
+    image = Image.fromarray(
+        np.random.randint(0, 255, (240, 320, 3), dtype=np.uint8))
+
+    (kept, embeddings), report = profiler.run(
+        face_system.get_embeddings, image, [{'box': [30, 40, 90, 110]}])
+
+    assert embeddings.shape[0] == 1
+    assert report['stages_ms']['inference'] > 0
+    assert any('_run_embedder' in entry['function']
+               for entry in report['top_functions'])
+    assert face_system.scheduler.pending == 0
+
+
+def test_decoded_image_matches_pil(face_system):
+    """测试由字节解码的图像与PIL图像裁剪出相同的人脸和特征"""
+    import io
+    from app.imaging import DecodedImage
+
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 255, (240, 320, 3), dtype=np.uint8)).save(
+        buffer, format='PNG')
+    decoded = DecodedImage(buffer.getvalue())
+    pil_image = Image.open(io.BytesIO(buffer.getvalue())).convert('RGB')
+    face = {'box': [30, 40, 90, 110]}
+
+    crop = face_system._crop_face(decoded.array, face)
+    region = np.asarray(pil_image)[40:150, 30:120]
+    np.testing.assert_array_equal(
+        crop, np.asarray(Image.fromarray(region).resize((160, 160))))
+    np.testing.assert_allclose(face_system.get_embedding(decoded, face),
+                               face_system.get_embedding(pil_image, face), atol=1e-6)
+
+
 def test_image_mode_conversion(face_system):
     """测试图像模式转换"""
     # 创建RGBA图像
@@ -109,3 +261,107 @@ def test_image_mode_conversion(face_system):
     faces = face_system.detect_faces(rgb_image)
     assert isinstance(faces, list)
 
+
+def test_recognize_frame_reuses_track_identity(face_system, monkeypatch):
+    """测试视频流非关键帧复用轨迹身份，只为新出现的人脸提取特征"""
+    from app.tracking import FaceTracker
+
+    face_system.gallery.add('Alice', np.ones(128))
+    frames = [
+        [{'box': [10, 10, 100, 120], 'confidence': 0.99}],
+        [{'box': [14, 12, 100, 120], 'confidence': 0.99}],
+        [{'box': [16, 12, 100, 120], 'confidence': 0.99},
+         {'box': [300, 150, 80, 90], 'confidence': 0.99}],
+    ]
+    detectors = []
+    embedded = []
+
+    def fake_detect(image, detector=None):
+        detectors.append(detector)
+        return frames[len(detectors) - 1]
+
+    def fake_embed(crops):
+        embedded.append(len(crops))
+        return np.ones((len(crops), 128), dtype=np.float32)
+
+    monkeypatch.setattr(face_system, 'detect_faces', fake_detect)
+    monkeypatch.setattr(face_system, '_embed_crops', fake_embed)
+
+    tracker = FaceTracker(keyframe_interval=10, track_detector='opencv')
+    image = Image.new('RGB', (640, 480))
+    flags = []
+    for _ in frames:
+        results, keyframe = face_system.recognize_frame(image, tracker)
+        flags.append(keyframe)
+
+    assert flags == [True, False, False]
+    assert detectors == [None, 'opencv', 'opencv']
+    assert embedded == [1, 1]
+    assert [r['track_id'] for r in results] == [1, 2]
+    assert results[0]['name'] == 'Alice'
+    assert results[0]['box'] == [16, 12, 100, 120]
+
+
+def test_enroll_face_keeps_original_jpeg(face_system, monkeypatch):
+    """测试录入时原始JPEG字节经后台写入队列原样加密保存"""
+    import io
+
+    image = Image.fromarray(
+        np.random.randint(0, 255, (200, 200, 3), dtype=np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=75)
+    original = buffer.getvalue()
+    monkeypatch.setattr(face_system, 'detect_faces',
+                        lambda img, detector=None: [{'box': [20, 20, 100, 100]}])
+
+    assert face_system.enroll_face(image, 'Alice', original)
+    face_system.image_writer.flush()
+
+    files = os.listdir(face_system.images_dir)
+    assert len(files) == 1 and files[0].startswith('Alice_')
+    with open(os.path.join(face_system.images_dir, files[0]), 'rb') as f:
+        assert face_system.encryption_manager.decrypt(f.read()) == original
+    assert list(face_system.gallery.names) == ['Alice']
+
+
+def test_enroll_same_name_writes_separate_files(face_system, monkeypatch):
+    """测试同一姓名快速连续录入时每张图像写入各自的文件且不残留临时文件"""
+    monkeypatch.setattr(face_system, 'detect_faces',
+                        lambda img, detector=None: [{'box': [20, 20, 100, 100]}])
+    image = Image.new('RGB', (200, 200), 'gray')
+
+    for _ in range(10):
+        assert face_system.enroll_face(image, 'Alice')
+    face_system.image_writer.flush()
+
+    files = os.listdir(face_system.images_dir)
+    assert len(files) == 10
+    assert all(name.startswith('Alice_') and name.endswith('.enc') for name in files)
+
+
+def test_recognize_image_uses_cache(face_system, monkeypatch):
+    """测试重复图像命中缓存，特征库变化后用缓存的特征重新匹配"""
+    calls = []
+
+    def fake_detect(image, detector=None):
+        calls.append('detect')
+        return [{'box': [10, 10, 100, 120], 'confidence': 0.99}]
+
+    def fake_embed(crops):
+        calls.append('embed')
+        return np.ones((len(crops), 128), dtype=np.float32)
+
+    monkeypatch.setattr(face_system, 'detect_faces', fake_detect)
+    monkeypatch.setattr(face_system, '_embed_crops', fake_embed)
+    image = Image.fromarray(
+        np.random.randint(0, 255, (240, 320, 3), dtype=np.uint8))
+
+    first = face_system.recognize_image(image)
+    assert first[0]['name'] == 'Unknown'
+
+    face_system.gallery.add('Alice', np.ones(128))
+    second = face_system.recognize_image(image.copy())
+
+    assert calls == ['detect', 'embed']
+    assert second[0]['name'] == 'Alice'
+    assert face_system.embedding_cache.stats()['hits'] == 1
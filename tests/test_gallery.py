@@ -0,0 +1,62 @@
+"""
+人脸特征库测试
+"""
+import pytest
+import numpy as np
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.gallery import EmbeddingGallery
+
+
+def test_empty_gallery_search():
+    """测试空特征库检索"""
+    gallery = EmbeddingGallery()
+    indices, distances = gallery.search(np.random.rand(128), k=3)
+
+    assert len(gallery) == 0
+    assert indices.shape == (1, 0)
+    assert distances.shape == (1, 0)
+
+
+def test_gallery_grows_beyond_capacity():
+    """测试超过初始容量时自动扩容"""
+    gallery = EmbeddingGallery(capacity=2)
+    embeddings = np.random.rand(5, 64)
+    gallery.extend([f'p{i}' for i in range(5)], embeddings)
+
+    assert len(gallery) == 5
+    assert gallery.matrix.dtype == np.float32
+    assert gallery.matrix.flags['C_CONTIGUOUS']
+    assert gallery.names.tolist() == ['p0', 'p1', 'p2', 'p3', 'p4']
+    np.testing.assert_allclose(np.linalg.norm(gallery.matrix, axis=1), 1.0, rtol=1e-5)
+
+
+def test_search_matches_brute_force():
+    """测试矩阵检索结果与逐个计算的欧氏距离一致"""
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(200, 128))
+    queries = rng.normal(size=(4, 128))
+    gallery = EmbeddingGallery()
+    gallery.extend([str(i) for i in range(200)], embeddings)
+
+    indices, distances = gallery.search(queries, k=5)
+
+    normed = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    for query, row, dist in zip(queries, indices, distances):
+        query = query / np.linalg.norm(query)
+        expected = np.linalg.norm(normed - query, axis=1)
+        np.testing.assert_array_equal(row, np.argsort(expected)[:5])
+        np.testing.assert_allclose(dist, np.sort(expected)[:5], atol=1e-4)
+
+
+def test_dimension_mismatch_rejected():
+    """测试维度不一致的特征会被拒绝"""
+    gallery = EmbeddingGallery()
+    gallery.add('Alice', np.random.rand(128))
+
+    with pytest.raises(ValueError):
+        gallery.add('Bob', np.random.rand(64))
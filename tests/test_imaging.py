@@ -0,0 +1,68 @@
+"""
+图像解码测试
+"""
+import io
+import pytest
+import numpy as np
+import os
+import sys
+from PIL import Image
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.imaging import DecodedImage, as_decoded
+
+
+def encode(image, format='JPEG'):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def jpeg_bytes():
+    """带渐变的2000x1000 JPEG"""
+    x = np.linspace(0, 255, 2000, dtype=np.uint8)
+    pixels = np.stack([np.tile(x, (1000, 1))] * 3, axis=-1)
+    return encode(Image.fromarray(pixels))
+
+
+def test_decode_once(jpeg_bytes):
+    """测试全分辨率数组只解码一次并在各处共享"""
+    image = DecodedImage(jpeg_bytes)
+    assert image.size == (2000, 1000) and not image.decoded
+
+    array = image.decode().array
+    assert array.shape == (1000, 2000, 3)
+    assert image.array is array and np.asarray(image) is array
+    assert not array.flags.writeable
+    assert as_decoded(image) is image
+
+
+def test_detection_array_uses_draft(jpeg_bytes):
+    """测试只需要检测分辨率时JPEG直接缩小解码，不生成全分辨率数组"""
+    image = DecodedImage(jpeg_bytes)
+    small, scale_x, scale_y = image.detection_array(500)
+
+    assert small.shape == (250, 500, 3)
+    assert (scale_x, scale_y) == (4.0, 4.0)
+    assert not image.decoded
+    assert image.detection_array(500)[0] is small
+
+    # 缩小解码与由全分辨率缩小的结果接近
+    full = DecodedImage(jpeg_bytes).decode()
+    reference, _, _ = full.detection_array(500)
+    assert np.abs(small.astype(int) - reference.astype(int)).mean() < 2
+    # 不需要缩小时直接使用全分辨率数组
+    assert full.detection_array(0)[0] is full.array
+
+
+def test_non_rgb_converted():
+    """测试非RGB图像解码后转换为RGB"""
+    image = DecodedImage(encode(Image.new('L', (64, 48), 128), format='PNG'))
+    assert image.array.shape == (48, 64, 3)
+    assert image.detection_array(32)[0].shape == (24, 32, 3)
+
+    wrapped = as_decoded(Image.new('RGBA', (10, 10)))
+    assert wrapped.data is None and wrapped.image.mode == 'RGB'
@@ -0,0 +1,226 @@
+"""
+人脸特征索引测试
+"""
+import pytest
+import numpy as np
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.gallery import EmbeddingGallery
+from app.identity import IdentityIndex
+from app.index import ExactIndex, HNSWIndex, IVFIndex, create_index
+
+
+def make_gallery(size, dim=64, seed=0):
+    """创建带有聚类结构的随机特征库"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(32, dim))
+    embeddings = centers[rng.integers(0, 32, size)] + 0.3 * rng.normal(size=(size, dim))
+    gallery = EmbeddingGallery()
+    gallery.extend([f'p{i}' for i in range(size)], embeddings)
+    return gallery, embeddings
+
+
+def test_create_index_backends(tmp_path):
+    """测试按名称创建索引后端"""
+    assert isinstance(create_index('exact'), ExactIndex)
+    assert isinstance(create_index('ivf', str(tmp_path / 'faces')), IVFIndex)
+    with pytest.raises(ValueError):
+        create_index('unknown')
+
+
+def test_ivf_falls_back_to_exact_before_training():
+    """测试特征数不足训练规模时返回精确结果"""
+    gallery, embeddings = make_gallery(100)
+    index = IVFIndex(min_train_size=1000)
+
+    indices, _ = index.search(gallery, embeddings[:5], k=3)
+
+    expected, _ = gallery.search(embeddings[:5], k=3)
+    np.testing.assert_array_equal(indices, expected)
+    assert index.centroids is None
+
+
+def test_ivf_recall_and_incremental_insert(tmp_path):
+    """测试IVF检索召回率、增量插入与持久化"""
+    gallery, embeddings = make_gallery(2000)
+    path = str(tmp_path / 'faces.ivf.npz')
+    index = IVFIndex(path=path, nprobe=8, min_train_size=1000)
+    index.sync(gallery)
+    index.wait_for_training()
+
+    indices, distances = index.search(gallery, embeddings[:50], k=1)
+    assert np.mean(indices[:, 0] == np.arange(50)) >= 0.95
+    assert np.all(np.diff(distances, axis=1) >= 0)
+
+    new_embedding = np.random.default_rng(1).normal(size=64)
+    gallery.add('newcomer', new_embedding)
+    indices, _ = index.search(gallery, new_embedding, k=1)
+    assert gallery.names_at(indices)[0, 0] == 'newcomer'
+
+    reloaded = IVFIndex(path=path, nprobe=8, min_train_size=1000)
+    assert reloaded.centroids is not None
+    indices, _ = reloaded.search(gallery, new_embedding, k=1)
+    assert indices[0, 0] == len(gallery) - 1
+
+
+def test_nprobe_trades_recall_for_work():
+    """测试探测全部簇时结果与精确检索一致"""
+    gallery, embeddings = make_gallery(1500)
+    index = IVFIndex(nprobe=10000, nlist=16, min_train_size=100)
+    index.sync(gallery)
+    index.wait_for_training()
+
+    indices, _ = index.search(gallery, embeddings[:20], k=5)
+    expected, _ = gallery.search(embeddings[:20], k=5)
+    np.testing.assert_array_equal(indices, expected)
+
+
+def test_hnsw_index(tmp_path):
+    """测试HNSW索引（未安装hnswlib时跳过）"""
+    pytest.importorskip('hnswlib')
+    gallery, embeddings = make_gallery(500)
+    index = HNSWIndex(path=str(tmp_path / 'faces.hnsw.bin'), ef=100)
+
+    indices, distances = index.search(gallery, embeddings[:20], k=3)
+
+    assert np.mean(indices[:, 0] == np.arange(20)) >= 0.95
+    expected, expected_distances = gallery.search(embeddings[:20], k=1)
+    np.testing.assert_allclose(distances[:, 0], expected_distances[:, 0], atol=1e-3)
+
+
+def make_identity_gallery(num_ids, templates, dim=64, seed=0):
+    """创建每个身份有多张模板的特征库，模板按随机顺序录入"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_ids, dim))
+    owners = rng.permutation(np.repeat(np.arange(num_ids), templates))
+    embeddings = centers[owners] + 0.3 * rng.normal(size=(len(owners), dim))
+    gallery = EmbeddingGallery()
+    gallery.extend([f'p{i}' for i in owners], embeddings)
+    return gallery, embeddings, owners
+
+
+def test_identity_index_groups_templates():
+    """测试模板按姓名聚合为身份，编号稳定且增量录入只更新对应身份"""
+    gallery, embeddings, owners = make_identity_gallery(20, 3)
+    index = create_index('identity')
+    assert isinstance(index, IdentityIndex)
+
+    index.sync(gallery)
+    assert len(index) == 20
+    assert {item['templates'] for item in index.identities()} == {3}
+    first = index.identity_id(f'p{owners[0]}')
+    assert first == 0
+
+    gallery.extend([f'p{owners[0]}', 'new'], embeddings[:2])
+    index.sync(gallery)
+    assert len(index) == 21
+    assert index.identity_id(f'p{owners[0]}') == first
+    assert index.identities()[first]['templates'] == 4
+    assert index.identity_id('new') == 20
+
+
+def test_identity_index_returns_one_template_per_identity():
+    """测试检索结果与精确检索的各身份最佳模板一致，且每个身份只出现一次"""
+    gallery, embeddings, owners = make_identity_gallery(200, 4)
+    index = IdentityIndex(candidates=16)
+    queries = embeddings[:50]
+
+    indices, distances = index.search(gallery, queries, k=5)
+
+    assert indices.shape == (50, 5)
+    assert np.all(np.diff(distances, axis=1) >= 0)
+    for row in owners[indices]:
+        assert len(set(row)) == 5
+    exact_indices, exact_distances = ExactIndex().search(gallery, queries, k=1)
+    np.testing.assert_array_equal(owners[indices[:, 0]], owners[exact_indices[:, 0]])
+    np.testing.assert_allclose(distances[:, 0], exact_distances[:, 0], atol=1e-3)
+
+
+def test_identity_index_reloaded_gallery():
+    """测试空库和特征库重新加载后的检索"""
+    index = IdentityIndex()
+    indices, _ = index.search(EmbeddingGallery(), np.ones(8), k=3)
+    assert indices.shape == (1, 0)
+
+    gallery, embeddings, _ = make_identity_gallery(10, 2)
+    index.search(gallery, embeddings[:1])
+    smaller, embeddings, owners = make_identity_gallery(4, 2, seed=1)
+    indices, _ = index.search(smaller, embeddings, k=10)
+    assert len(index) == 4
+    assert indices.shape == (8, 4)
+    np.testing.assert_array_equal(owners[indices[:, 0]], owners)
+
+
+def test_ivf_retrains_when_gallery_contents_change(tmp_path):
+    """测试特征库行数相同但内容不同时不沿用持久化的索引"""
+    path = str(tmp_path / 'faces.ivf.npz')
+    gallery, _ = make_gallery(1200)
+    index = IVFIndex(path=path, nlist=8, min_train_size=1000)
+    index.sync(gallery)
+    index.wait_for_training()
+    index.save()
+
+    same = IVFIndex(path=path, nlist=8, min_train_size=1000)
+    same.sync(gallery)
+    assert same.fingerprint == index.fingerprint
+    np.testing.assert_array_equal(same.centroids, index.centroids)
+
+    rebuilt, embeddings = make_gallery(1200, seed=3)
+    stale = IVFIndex(path=path, nlist=8, min_train_size=1000)
+    stale.sync(rebuilt)
+    stale.wait_for_training()
+    assert stale.fingerprint != index.fingerprint
+    indices, _ = stale.search(rebuilt, embeddings[:20], k=1)
+    assert np.mean(indices[:, 0] == np.arange(20)) >= 0.9
+
+
+def search_during_reloads(index, searched, other, queries):
+    """在另一线程反复切换特征库的同时检索，返回检索中出现的异常"""
+    import threading
+
+    errors = []
+    stop = threading.Event()
+
+    def reload():
+        while not stop.is_set():
+            index.sync(other)
+            index.sync(searched)
+
+    thread = threading.Thread(target=reload)
+    thread.start()
+    try:
+        for _ in range(200):
+            try:
+                index.search(searched, queries, k=3)
+            except Exception as e:
+                errors.append(e)
+    finally:
+        stop.set()
+        thread.join()
+    return errors
+
+
+def test_ivf_search_survives_concurrent_reload():
+    """测试IVF检索与特征库重新加载、后台训练并发时不出错"""
+    large, embeddings = make_gallery(1500)
+    small, _ = make_gallery(300, seed=1)
+    index = IVFIndex(nlist=8, min_train_size=200)
+
+    errors = search_during_reloads(index, large, small, embeddings[:4])
+
+    index.wait_for_training()
+    assert errors == []
+
+
+def test_identity_search_survives_concurrent_reload():
+    """测试身份检索与特征库重新加载并发时不出错"""
+    large, embeddings = make_gallery(1500)
+    small, _ = make_gallery(300, seed=1)
+
+    errors = search_during_reloads(IdentityIndex(), large, small, embeddings[:4])
+
+    assert errors == []
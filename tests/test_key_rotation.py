@@ -0,0 +1,104 @@
+"""
+密钥轮换模块测试
+"""
+import os
+import sys
+import time
+
+import pytest
+from cryptography.fernet import Fernet
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.encryption import EncryptionManager
+from app.key_rotation import KeyRotationJob, KeyRotator, RateLimiter
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    """生成新旧密钥，当前只配置旧密钥，返回(旧密钥, 新密钥)"""
+    old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+    monkeypatch.setenv('ENCRYPTION_KEY', old_key)
+    return old_key, new_key
+
+
+@pytest.fixture
+def images_dir(tmp_path, keys):
+    """用旧密钥加密的图像目录"""
+    manager = EncryptionManager()
+    root = tmp_path / "images"
+    (root / "sub").mkdir(parents=True)
+    for i in range(5):
+        (root / f"{i}.enc").write_bytes(manager.encrypt(f"image-{i}".encode()))
+    (root / "sub" / "5.enc").write_bytes(manager.encrypt(b"image-5"))
+    (root / "keep.txt").write_text("not encrypted")
+    return root
+
+
+def _use_keys(monkeypatch, *keys):
+    monkeypatch.setenv('ENCRYPTION_KEY', ','.join(keys))
+    return EncryptionManager()
+
+
+def test_rotate_directory(images_dir, keys, monkeypatch):
+    """测试轮换后所有文件只需新密钥即可解密，且保留修改时间"""
+    old_key, new_key = keys
+    mtime = os.stat(images_dir / "0.enc").st_mtime_ns
+    rotator = KeyRotator(_use_keys(monkeypatch, new_key, old_key), workers=3)
+
+    stats = rotator.run(str(images_dir))
+
+    assert (stats['rotated'], stats['failed']) == (6, 0)
+    assert os.stat(images_dir / "0.enc").st_mtime_ns == mtime
+    new_only = _use_keys(monkeypatch, new_key)
+    assert new_only.decrypt((images_dir / "sub" / "5.enc").read_bytes()) == b"image-5"
+    assert (images_dir / "keep.txt").read_text() == "not encrypted"
+
+
+def test_rotation_resumes(images_dir, keys, monkeypatch):
+    """测试中断后再次运行跳过已轮换的文件"""
+    old_key, new_key = keys
+    manager = _use_keys(monkeypatch, new_key, old_key)
+    progress_path = str(images_dir.parent / "rotation.log")
+    rotator = KeyRotator(manager, workers=1, progress_path=progress_path)
+    rotator.batch_size = 2
+    calls = []
+
+    def stop_after_first_batch(stats):
+        calls.append(stats)
+        rotator.cancel()
+
+    rotator.run(str(images_dir), progress=stop_after_first_batch)
+    assert len(calls) == 1
+    assert calls[0]['rotated'] == 2
+
+    stats = KeyRotator(manager, progress_path=progress_path).run(str(images_dir))
+    assert stats['skipped'] == calls[0]['rotated']
+    assert stats['skipped'] + stats['rotated'] == 6
+
+
+def test_rotation_job(images_dir, keys, monkeypatch):
+    """测试后台任务完成后报告状态"""
+    old_key, new_key = keys
+    job = KeyRotationJob(KeyRotator(_use_keys(monkeypatch, new_key, old_key)),
+                         str(images_dir))
+    job.join(timeout=30)
+
+    assert job.to_dict()['status'] == 'completed'
+    assert job.to_dict()['stats']['rotated'] == 6
+
+
+def test_rate_limiter():
+    """测试限速器按间隔放行"""
+    limiter = RateLimiter(50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+
+    unlimited = RateLimiter(0)
+    start = time.monotonic()
+    for _ in range(1000):
+        unlimited.acquire()
+    assert time.monotonic() - start < 0.1
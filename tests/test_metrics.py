@@ -0,0 +1,72 @@
+"""
+运行指标测试
+"""
+import numpy as np
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import metrics
+from app.metrics import Registry
+from app.scheduler import InferenceScheduler
+
+
+def test_histogram_renders_cumulative_buckets():
+    """测试直方图按累积分桶输出，并带有_sum和_count"""
+    registry = Registry()
+    histogram = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0),
+                                   labelnames=('stage',))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, 'detect')
+
+    lines = registry.render().splitlines()
+
+    assert '# TYPE latency_seconds histogram' in lines
+    assert 'latency_seconds_bucket{stage="detect",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="detect",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{stage="detect",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{stage="detect"} 4.05' in lines
+    assert 'latency_seconds_count{stage="detect"} 4' in lines
+
+
+def test_gauge_reads_callback_at_scrape_time():
+    """测试仪表在导出时读取当前值，回调失败时不输出样本"""
+    registry = Registry()
+    depth = [3]
+    registry.gauge('queue_depth', 'Queue depth', lambda: depth[0])
+    registry.gauge('broken', 'Broken', lambda: 1 / 0)
+    depth[0] = 5
+
+    text = registry.render()
+
+    assert 'queue_depth 5\n' in text
+    assert '# TYPE broken gauge' in text
+    assert '\nbroken ' not in text
+
+
+def test_stage_timer_and_batch_size():
+    """测试阶段计时与调度器的批大小记录"""
+    before = metrics.STAGE_SECONDS.count('inference')
+    batches = metrics.BATCH_SIZE.count()
+    scheduler = InferenceScheduler(lambda crops: np.zeros((len(crops), 4)),
+                                   max_wait_ms=0)
+
+    scheduler.embed(np.zeros((3, 2, 2, 3)))
+    scheduler.close()
+
+    assert metrics.STAGE_SECONDS.count('inference') == before + 1
+    assert metrics.BATCH_SIZE.count() == batches + 1
+
+
+def test_disabled_metrics_skip_recording(monkeypatch):
+    """测试关闭指标后不再记录"""
+    monkeypatch.setattr(metrics, 'enabled', False)
+    before = metrics.STAGE_SECONDS.count('decode')
+
+    with metrics.stage('decode'):
+        pass
+    metrics.observe(metrics.FACES_PER_FRAME, 2)
+
+    assert metrics.STAGE_SECONDS.count('decode') == before
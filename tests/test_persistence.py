@@ -0,0 +1,90 @@
+"""
+图像持久化模块测试
+"""
+import io
+import os
+import sys
+import threading
+
+import pytest
+from PIL import Image
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.persistence import JPEG_MAGIC, ImageWriter, image_filename, to_jpeg_bytes
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def test_to_jpeg_bytes_keeps_original_jpeg():
+    """测试JPEG原始字节原样保留，其他格式重新编码为JPEG"""
+    image = Image.new('RGB', (32, 32), 'red')
+    jpeg = _encode(image, 'JPEG')
+    assert to_jpeg_bytes(jpeg) is jpeg
+
+    png = _encode(Image.new('RGBA', (32, 32)), 'PNG')
+    assert to_jpeg_bytes(png).startswith(JPEG_MAGIC)
+    assert to_jpeg_bytes(image).startswith(JPEG_MAGIC)
+
+
+def test_queued_mode_returns_before_write():
+    """测试queued模式入队即返回，flush后写入完成"""
+    release = threading.Event()
+    written = []
+
+    def slow_write(filename, data, fsync):
+        release.wait(timeout=5)
+        written.append((filename, fsync))
+        return filename
+
+    writer = ImageWriter(slow_write, workers=1, max_queue=4, durability='queued')
+    future = writer.submit('alice', Image.new('RGB', (8, 8)))
+    assert not future.done()
+
+    release.set()
+    writer.flush()
+    assert future.result() == written[0][0]
+    assert written[0][0].startswith('alice_') and written[0][0].endswith('.enc')
+    assert written[0][1] is False
+    writer.close()
+
+
+def test_fsync_mode_waits_and_raises():
+    """测试fsync模式等待写入完成，写入失败时抛出异常并计数"""
+    def failing_write(filename, data, fsync):
+        assert fsync
+        raise OSError("disk full")
+
+    writer = ImageWriter(failing_write, workers=2, durability='fsync')
+    with pytest.raises(OSError):
+        writer.submit('bob', Image.new('RGB', (8, 8)))
+    assert writer.failed == 1
+    assert writer.last_error == "disk full"
+    writer.close()
+
+
+def test_unknown_durability_mode():
+    """测试未知的持久性模式"""
+    with pytest.raises(ValueError):
+        ImageWriter(lambda *args: None, durability='never')
+
+
+def test_filenames_assigned_at_submit():
+    """测试文件名在提交时生成，同一姓名的连续录入写入不同文件"""
+    written = []
+    writer = ImageWriter(lambda filename, data, fsync: written.append(filename),
+                         workers=2, durability='queued')
+    for _ in range(20):
+        writer.submit('alice', Image.new('RGB', (8, 8)))
+    writer.submit('bob', Image.new('RGB', (8, 8)), filename='bob_fixed.enc')
+    writer.flush()
+    writer.close()
+
+    assert len(set(written)) == 21
+    assert 'bob_fixed.enc' in written
+    assert image_filename('carol') != image_filename('carol')
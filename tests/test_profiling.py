@@ -0,0 +1,92 @@
+"""
+请求分析测试
+"""
+import pytest
+import os
+import sys
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import metrics
+from app.profiling import ProfilerBusyError, RequestProfiler
+
+
+def slow_pipeline():
+    """带两个计时阶段的示例流水线"""
+    with metrics.stage('detect'):
+        sum(range(10000))
+    with metrics.stage('match'):
+        sorted(range(1000), reverse=True)
+    return 'done'
+
+
+def test_authorize_requires_configured_token():
+    """测试未配置令牌时分析被禁用，令牌不匹配时拒绝"""
+    assert not RequestProfiler(token='').authorize('anything')
+    profiler = RequestProfiler(token='secret')
+    assert profiler.enabled
+    assert profiler.authorize('secret')
+    assert not profiler.authorize('wrong')
+
+
+def test_run_reports_stages_and_saves_profile(tmp_path):
+    """测试分析报告包含各阶段耗时、最耗时函数，并保存.prof文件"""
+    profiler = RequestProfiler(token='secret', output_dir=str(tmp_path), top=5)
+
+    result, report = profiler.run(slow_pipeline)
+
+    assert result == 'done'
+    assert set(report['stages_ms']) == {'detect', 'match'}
+    assert report['total_ms'] >= report['stages_ms']['detect']
+    assert 0 < len(report['top_functions']) <= 5
+    assert os.path.exists(report['path'])
+    assert not metrics.profiled_threads
+
+
+def test_stage_timings_only_for_profiled_thread(tmp_path):
+    """测试其他线程的阶段耗时不会计入被分析的请求"""
+    profiler = RequestProfiler(token='secret', output_dir=str(tmp_path))
+
+    def pipeline():
+        thread = threading.Thread(target=slow_pipeline)
+        thread.start()
+        thread.join()
+        with metrics.stage('decode'):
+            pass
+
+    _, report = profiler.run(pipeline)
+
+    assert set(report['stages_ms']) == {'decode'}
+
+
+def test_one_profile_at_a_time(tmp_path):
+    """测试同一时间只分析一个请求"""
+    profiler = RequestProfiler(token='secret', output_dir=str(tmp_path))
+
+    def nested():
+        return profiler.run(slow_pipeline)
+
+    with pytest.raises(ProfilerBusyError):
+        profiler.run(nested)
+    assert not metrics.profiled_threads
+
+
+def test_old_profiles_are_pruned(tmp_path):
+    """测试写入新的.prof文件时只保留最新的max_files个，并删除过期文件"""
+    profiler = RequestProfiler(token='secret', output_dir=str(tmp_path),
+                               max_files=3, max_age=3600)
+    stale = tmp_path / 'stale.prof'
+    stale.write_bytes(b'')
+    os.utime(stale, (0, 0))
+    other = tmp_path / 'notes.txt'
+    other.write_text('kept')
+
+    paths = [profiler.run(slow_pipeline)[1]['path'] for _ in range(5)]
+
+    remaining = sorted(str(path) for path in tmp_path.glob('*.prof'))
+    assert len(remaining) == 3
+    assert paths[-1] in remaining
+    assert not stale.exists()
+    assert other.exists()
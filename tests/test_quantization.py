@@ -0,0 +1,113 @@
+"""
+特征量化测试
+"""
+import pytest
+import numpy as np
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.gallery import EmbeddingGallery
+from app.quantization import QuantizedGallery, dequantize, quantize
+
+
+def make_embeddings(size, dim=128, seed=0):
+    """创建带有聚类结构的随机特征"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(64, dim))
+    return centers[rng.integers(0, 64, size)] + 0.3 * rng.normal(size=(size, dim))
+
+
+@pytest.mark.parametrize('dtype, tolerance', [('float16', 1e-3), ('int8', 2e-2)])
+def test_quantize_round_trip(dtype, tolerance):
+    """测试量化后还原的误差"""
+    vectors = EmbeddingGallery.normalize(make_embeddings(100))
+    codes, scales = quantize(vectors, dtype)
+
+    assert codes.dtype == np.dtype(dtype)
+    np.testing.assert_allclose(dequantize(codes, scales), vectors, atol=tolerance)
+    with pytest.raises(ValueError):
+        quantize(vectors, 'int4')
+
+
+@pytest.mark.parametrize('dtype, ratio', [('float16', 2), ('int8', 4)])
+def test_quantized_search_matches_exact(tmp_path, dtype, ratio):
+    """测试量化检索经重排后与float32精确检索结果一致，且内存按比例减少"""
+    embeddings = make_embeddings(2000)
+    names = [f'p{i}' for i in range(len(embeddings))]
+    exact = EmbeddingGallery()
+    exact.extend(names, embeddings)
+    gallery = QuantizedGallery(dtype, originals_path=str(tmp_path / 'faces.f32'))
+    gallery.extend(names[:1500], embeddings[:1500])
+    gallery.extend(names[1500:], embeddings[1500:])
+
+    queries = embeddings[::50] + 0.05
+    indices, distances = gallery.search(queries, k=5)
+    exact_indices, exact_distances = exact.search(queries, k=5)
+
+    np.testing.assert_array_equal(indices, exact_indices)
+    np.testing.assert_allclose(distances, exact_distances, atol=1e-5)
+    assert gallery.nbytes * ratio <= exact.matrix.nbytes * 1.05
+
+
+def test_load_reuses_originals_and_migrates_float32(tmp_path):
+    """测试从量化数据库恢复时沿用原始特征文件，从float32数据库加载时生成该文件"""
+    path = str(tmp_path / 'faces.f32')
+    embeddings = make_embeddings(300)
+    names = [f'p{i}' for i in range(300)]
+
+    migrated = QuantizedGallery('int8', originals_path=path)
+    migrated.load(names, embeddings.astype(np.float32))
+    assert os.path.getsize(path) == 300 * 128 * 4
+
+    restored = QuantizedGallery('int8', originals_path=path)
+    restored.load(migrated.names, migrated.codes, migrated.scales)
+    np.testing.assert_allclose(restored.vectors(np.arange(3)),
+                               EmbeddingGallery.normalize(embeddings[:3]), atol=1e-6)
+    restored.extend(['new'], embeddings[:1])
+    assert os.path.getsize(path) == 301 * 128 * 4
+
+    restored.clear()
+    assert not os.path.exists(path)
+
+
+def test_load_aligns_originals_with_database(tmp_path, caplog):
+    """测试加载时截断未提交的旁路文件尾部，行数不足时不重写并记录警告"""
+    path = str(tmp_path / 'faces.f32')
+    embeddings = make_embeddings(10)
+    names = [f'p{i}' for i in range(10)]
+    gallery = QuantizedGallery('int8', originals_path=path)
+    gallery.extend(names[:8], embeddings[:8])
+    codes, scales = gallery.codes.copy(), gallery.scales.copy()
+    # 旁路文件已追加、数据库尚未保存时中断
+    gallery.extend(names[8:], embeddings[8:])
+
+    restored = QuantizedGallery('int8', originals_path=path)
+    restored.load(names[:8], codes, scales)
+    assert os.path.getsize(path) == 8 * 128 * 4
+    np.testing.assert_allclose(restored.vectors(np.arange(8)),
+                               EmbeddingGallery.normalize(embeddings[:8]), atol=1e-6)
+
+    os.truncate(path, 5 * 128 * 4)
+    stale = QuantizedGallery('int8', originals_path=path)
+    with caplog.at_level('WARNING', logger='app.quantization'):
+        stale.load(names[:8], codes, scales)
+        stale.extend(['new'], embeddings[:1])
+    assert os.path.getsize(path) == 5 * 128 * 4
+    assert len([r for r in caplog.records if '反量化' in r.getMessage()]) == 1
+    np.testing.assert_allclose(stale.vectors(np.arange(8)),
+                               dequantize(stale.codes[:8], stale.scales[:8]))
+
+
+def test_rerank_without_originals_uses_dequantized():
+    """测试没有原始特征文件时用反量化特征重排"""
+    embeddings = make_embeddings(200)
+    gallery = QuantizedGallery('int8', rerank=8)
+    gallery.extend([f'p{i}' for i in range(200)], embeddings)
+
+    indices, distances = gallery.search(embeddings[:10], k=1)
+
+    np.testing.assert_array_equal(indices[:, 0], np.arange(10))
+    assert np.all(distances < 0.05)
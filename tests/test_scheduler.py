@@ -0,0 +1,75 @@
+"""
+推理调度器测试
+"""
+import pytest
+import numpy as np
+import os
+import sys
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.scheduler import InferenceScheduler
+
+
+class RecordingModel:
+    """记录每次推理批大小的模拟模型"""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, crops):
+        self.batch_sizes.append(len(crops))
+        # 用每个裁剪的均值作为"特征"，便于校验结果归属
+        return crops.reshape(len(crops), -1).mean(axis=1, keepdims=True)
+
+
+def test_concurrent_requests_share_one_batch():
+    """测试并发请求被合并为一次推理，且各自只拿到自己的结果"""
+    model = RecordingModel()
+    scheduler = InferenceScheduler(model, max_batch_size=64, max_wait_ms=200)
+    barrier = threading.Barrier(4)
+    results = {}
+
+    def worker(i):
+        crops = np.full((i + 1, 4, 4, 3), float(i))
+        barrier.wait()
+        results[i] = scheduler.embed(crops)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    scheduler.close()
+
+    assert sum(model.batch_sizes) == 1 + 2 + 3 + 4
+    assert len(model.batch_sizes) < 4
+    for i in range(4):
+        assert results[i].shape == (i + 1, 1)
+        assert np.all(results[i] == i)
+
+
+def test_flush_at_max_batch_size():
+    """测试达到最大批大小时立即推理而不等待超时"""
+    model = RecordingModel()
+    scheduler = InferenceScheduler(model, max_batch_size=2, max_wait_ms=10000)
+
+    futures = [scheduler.submit(np.zeros((1, 4, 4, 3))) for _ in range(4)]
+    for future in futures:
+        future.result(timeout=5)
+    scheduler.close()
+
+    assert all(size <= 2 for size in model.batch_sizes)
+
+
+def test_inference_error_propagates():
+    """测试推理异常会传递给所有调用者"""
+    def failing_model(crops):
+        raise RuntimeError("inference failed")
+
+    scheduler = InferenceScheduler(failing_model, max_wait_ms=0)
+    with pytest.raises(RuntimeError):
+        scheduler.embed(np.zeros((1, 4, 4, 3)))
+    scheduler.close()
@@ -0,0 +1,163 @@
+"""
+共享人脸特征库测试
+"""
+import pytest
+import numpy as np
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.shared_gallery import SharedGallery
+
+
+@pytest.fixture
+def gallery_path(tmp_path):
+    """共享特征库存储路径前缀"""
+    return str(tmp_path / "faces")
+
+
+def test_enrollment_visible_to_other_instances(gallery_path):
+    """测试一个实例录入后，另一个实例无需重建即可检索到"""
+    writer = SharedGallery(gallery_path)
+    reader = SharedGallery(gallery_path)
+    assert len(reader) == 0
+
+    embeddings = np.random.rand(3, 128)
+    writer.extend(['Alice', 'Bob', 'Carol'], embeddings)
+
+    assert len(reader) == 3
+    assert reader.names.tolist() == ['Alice', 'Bob', 'Carol']
+    indices, distances = reader.search(embeddings[1], k=1)
+    assert indices[0, 0] == 1
+    assert distances[0, 0] < 1e-3
+
+    reader.add('Dave', np.random.rand(128))
+    assert writer.names.tolist()[-1] == 'Dave'
+    assert isinstance(writer.matrix, np.memmap)
+
+
+def test_initialize_only_imports_once(gallery_path):
+    """测试多个进程启动时只导入一次已有数据库"""
+    embeddings = np.random.rand(2, 64)
+    first = SharedGallery(gallery_path)
+    second = SharedGallery(gallery_path)
+
+    assert first.initialize(['Alice', 'Bob'], embeddings)
+    assert not second.initialize(['Alice', 'Bob'], embeddings)
+    assert len(second) == 2
+
+
+def test_uncommitted_names_are_discarded(gallery_path):
+    """测试写入中断残留的姓名不会错位"""
+    gallery = SharedGallery(gallery_path)
+    gallery.add('Alice', np.random.rand(32))
+    with open(gallery.store.log_path, 'ab') as f:
+        f.write(b'"partial"\n')
+
+    gallery.add('Bob', np.random.rand(32))
+
+    reopened = SharedGallery(gallery_path)
+    assert reopened.names.tolist() == ['Alice', 'Bob']
+
+
+def test_compaction_keeps_names_aligned(gallery_path):
+    """测试姓名日志压缩为索引后，其他实例仍能正确对齐姓名"""
+    reader = SharedGallery(gallery_path)
+    writer = SharedGallery(gallery_path, compact_every=3)
+    embeddings = np.random.rand(7, 32)
+    for i in range(7):
+        writer.add(f'p{i}', embeddings[i])
+
+    assert writer.store.read_header()[4] == 2  # 已压缩两次
+    assert len(reader) == 7
+    assert reader.names.tolist() == [f'p{i}' for i in range(7)]
+    indices, _ = reader.search(embeddings[[1, 6]], k=1)
+    assert reader.names_at(indices[:, 0]).tolist() == ['p1', 'p6']
+
+
+def test_reopen_maps_without_copy(gallery_path):
+    """测试重新打开存储时直接映射文件"""
+    SharedGallery(gallery_path, compact_every=2).extend(
+        ['a', 'b', 'c'], np.random.rand(3, 16))
+
+    reopened = SharedGallery(gallery_path)
+
+    assert isinstance(reopened.matrix, np.memmap)
+    assert reopened.names.tolist() == ['a', 'b', 'c']
+
+
+def test_clear_starts_new_generation(gallery_path):
+    """测试清空后所有实例看到空库，之后的录入从头对齐"""
+    writer = SharedGallery(gallery_path, compact_every=2)
+    reader = SharedGallery(gallery_path)
+    writer.extend(['a', 'b', 'c'], np.random.rand(3, 16))
+    assert len(reader) == 3
+    version = reader.version
+
+    writer.clear()
+
+    assert len(reader) == 0 and reader.names.tolist() == []
+    embeddings = np.random.rand(3, 16)
+    writer.extend(['x', 'y', 'z'], embeddings)
+    assert reader.names.tolist() == ['x', 'y', 'z']
+    assert reader.version != version
+    indices, _ = reader.search(embeddings[2], k=1)
+    assert indices[0, 0] == 2
+
+
+def test_names_cached_until_log_grows(gallery_path):
+    """测试姓名数组只在日志新增姓名后重新拼接"""
+    gallery = SharedGallery(gallery_path)
+    gallery.extend(['a', 'b'], np.random.rand(2, 16))
+
+    first = gallery.names
+    assert gallery.names.base is first.base
+
+    gallery.add('c', np.random.rand(16))
+    assert gallery.names.tolist() == ['a', 'b', 'c']
+    assert gallery.names.base is not first.base
+
+
+def test_open_after_clear(gallery_path):
+    """测试清空后新打开的实例得到空库，并能继续录入"""
+    from app.storage import AppendOnlyStore
+
+    SharedGallery(gallery_path).extend(['a', 'b'], np.random.rand(2, 16))
+    AppendOnlyStore(gallery_path).clear()
+
+    reopened = SharedGallery(gallery_path)
+    assert len(reopened) == 0
+    assert reopened.names.tolist() == []
+    reopened.add('c', np.random.rand(16))
+    assert SharedGallery(gallery_path).names.tolist() == ['c']
+
+
+def test_refresh_reads_under_shared_lock(gallery_path):
+    """测试写入方持有写锁期间读取方不会读取文件头与姓名日志"""
+    import threading
+
+    writer = SharedGallery(gallery_path, compact_every=2)
+    reader = SharedGallery(gallery_path)
+    writer.add('a', np.random.rand(16))
+    entered = threading.Event()
+    done = threading.Event()
+
+    def hold_lock():
+        with writer.store.locked():
+            entered.set()
+            done.wait(timeout=5)
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    entered.wait(timeout=5)
+    result = []
+    refresher = threading.Thread(target=lambda: result.append(len(reader)))
+    refresher.start()
+    refresher.join(timeout=0.2)
+    assert refresher.is_alive()
+    done.set()
+    refresher.join(timeout=5)
+    holder.join()
+    assert result == [1]
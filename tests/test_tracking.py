@@ -0,0 +1,85 @@
+"""
+人脸跟踪模块测试
+"""
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.tracking import FaceTracker, StreamSessions, box_iou
+
+
+def _result(name, box):
+    return {'name': name, 'box': box, 'confidence': 0.9, 'matches': []}
+
+
+def test_box_iou():
+    """测试边界框交并比"""
+    assert box_iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1.0
+    assert box_iou([0, 0, 10, 10], [20, 20, 10, 10]) == 0.0
+    assert abs(box_iou([0, 0, 10, 10], [5, 0, 10, 10]) - 50 / 150) < 1e-9
+
+
+def test_associate_prefers_highest_iou():
+    """测试贪心关联优先匹配交并比最高的轨迹"""
+    tracker = FaceTracker(keyframe_interval=5)
+    faces = [{'box': [0, 0, 100, 100]}, {'box': [300, 0, 100, 100]}]
+    tracker.update(faces, [_result('A', f['box']) for f in faces], {})
+
+    moved = [{'box': [305, 5, 100, 100]}, {'box': [600, 0, 100, 100]},
+             {'box': [4, 2, 100, 100]}]
+    matched, unmatched = tracker.associate(moved)
+
+    assert matched[0].track_id == 2
+    assert matched[2].track_id == 1
+    assert unmatched == [1]
+
+
+def test_keyframe_schedule():
+    """测试按间隔触发关键帧，且空跟踪器总是关键帧"""
+    tracker = FaceTracker(keyframe_interval=3)
+    assert tracker.is_keyframe()
+
+    face = {'box': [0, 0, 100, 100]}
+    flags = []
+    for _ in range(6):
+        flags.append(tracker.is_keyframe())
+        matched, _ = tracker.associate([face])
+        tracker.update([face], [_result('A', face['box'])], matched)
+
+    assert flags == [True, False, False, True, False, False]
+    assert [t.track_id for t in tracker.tracks] == [1]
+
+
+def test_lost_track_forces_keyframe():
+    """测试轨迹丢失后下一帧重新做完整检测"""
+    tracker = FaceTracker(keyframe_interval=100, max_missed=1)
+    faces = [{'box': [0, 0, 100, 100]}, {'box': [300, 0, 100, 100]}]
+    tracker.update(faces, [_result('A', f['box']) for f in faces], {})
+
+    for _ in range(2):
+        matched, _ = tracker.associate(faces[:1])
+        tracker.update(faces[:1], [_result('A', faces[0]['box'])], matched)
+
+    assert len(tracker.tracks) == 1
+    assert tracker.is_keyframe()
+
+
+def test_sessions_reuse_and_expire():
+    """测试会话复用跟踪器，过期和超量时淘汰"""
+    sessions = StreamSessions(ttl=60, max_sessions=2)
+    session_id, tracker = sessions.get()
+    assert sessions.get(session_id)[1] is tracker
+
+    sessions.get('b')
+    sessions.get('c')
+    assert len(sessions) == 2
+    assert sessions.get(session_id)[1] is not tracker
+
+    assert sessions.close('c')
+    assert not sessions.close('c')
+
+    expiring = StreamSessions(ttl=-1)
+    _, tracker = expiring.get('a')
+    assert expiring.get('a')[1] is not tracker